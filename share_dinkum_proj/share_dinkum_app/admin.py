@@ -13,37 +13,42 @@ from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.forms import UserChangeForm
 
 from django.db import models
-from django.db.models import Model, ForeignKey, Min
+from django.db.models import Model, ForeignKey
 
 from django.db.models.fields.reverse_related import ManyToManyRel
-from django.db.models import ManyToManyRel, ManyToManyField
+from django.conf import settings
+from django.http import Http404, JsonResponse
 from django.template.response import TemplateResponse
-from django.urls import path
+from django.urls import path, reverse
+from django.views.decorators.gzip import gzip_page
 
 import share_dinkum_app
 
 import share_dinkum_app.admin
 import share_dinkum_app.models
 
+from share_dinkum_app import dashboardcache
+from share_dinkum_app import dashboardseries
+from share_dinkum_app import performance
+from share_dinkum_app import pricerollups
+from share_dinkum_app.reports import IncomeReport
 from share_dinkum_app.models import (
     AppUser,
     Account,
     Parcel,
-    Buy,
     Instrument,
-    Dividend,
-    Distribution,
-    InstrumentPriceHistory,
-    ExchangeRate,
-    CurrentExchangeRate,
-    Sell,
+    Security,
+    SecurityPriceHistory,
+    SecurityPriceRollup,
+    DataExport,
+    Job,
 )
 
 
 
-from collections import defaultdict
-from datetime import date, timedelta
+from datetime import date
 from decimal import Decimal, ROUND_HALF_UP
+from functools import partial
 import logging
 from types import MethodType
 
@@ -210,8 +215,45 @@ class AppUserAdmin(UserAdmin):
     )
 
 
+def _describe_job(job):
+    """The status of the latest job of a kind, for the page of the object it works on."""
+    if job is None:
+        return '-'
+    description = f'{job.get_status_display()} ({job.progress}%)'
+    if job.status == Job.STATUS_RUNNING and job.progress_message:
+        description += f' - {job.progress_message}'
+    return description
+
+
 class AccountAdmin(admin.ModelAdmin):
     search_fields = ('id', 'description')
+    readonly_fields = ('price_refresh_job',)
+
+    @admin.display(description='Latest price refresh')
+    def price_refresh_job(self, obj):
+        if obj is None or obj._state.adding:
+            return '-'
+        return _describe_job(Job.objects.filter(task='refresh_account', account=obj).first())
+
+
+class DataExportAdmin(GenericModelAdmin):
+
+    def get_fields(self, request, obj=None):
+        return [*super().get_fields(request, obj), 'export_job']
+
+    def get_readonly_fields(self, request, obj=None):
+        return [*super().get_readonly_fields(request, obj), 'export_job']
+
+    def get_list_display_fields(self, request=None, obj=None):
+        return [*super().get_list_display_fields(request, obj), 'export_job']
+
+    @admin.display(description='Export job')
+    def export_job(self, obj):
+        if obj is None or obj._state.adding:
+            return '-'
+        return _describe_job(
+            Job.objects.filter(task='generate_export', arguments__data_export=str(obj.pk)).first()
+        )
 
 
 def _select_account_for_user(user):
@@ -244,24 +286,210 @@ def _format_money(money):
     return f"{formatted_amount:,.2f}"
 
 
+def _dashboard_series(account):
+    instruments = list(
+        Instrument.objects.filter(account=account, is_active=True)
+        .select_related('market')
+        .order_by('name')
+    )
+    return dashboardseries.build(account, instruments)
+
+
+def _allocation_chart(account, start_date=None, end_date=None, resolution=None):
+    """Value held of each instrument: now, or at end_date from the value series."""
+    labels = []
+    values = []
+
+    if end_date is not None:
+        series = dashboardcache.get_or_compute(account, 'series', partial(_dashboard_series, account))
+        window = series.window(end_date=end_date) if series is not None else None
+        if window is not None and len(window.dates):
+            for label, value in zip(window.labels, window.values[-1].round(2).tolist()):
+                if value > 0:
+                    labels.append(label)
+                    values.append(value)
+        return {'labels': labels, 'values': values}
+
+    instruments = (
+        Instrument.objects.filter(account=account, is_active=True)
+        .select_related('market')
+        .order_by('name')
+    )
+    for instrument in instruments:
+        try:
+            converted_value = instrument.value_held_converted
+        except Exception as exc:  # pragma: no cover - defensive log
+            logger.warning(
+                'Skipping instrument %s for dashboard value calculation: %s',
+                instrument,
+                exc,
+                exc_info=True,
+            )
+            continue
+
+        if not converted_value:
+            continue
+
+        amount = getattr(converted_value, 'amount', None)
+        if amount is None or amount <= 0:
+            continue
+
+        labels.append(instrument.name)
+        values.append(_decimal_to_float(amount))
+
+    return {'labels': labels, 'values': values}
+
+
+def _income_chart(account, start_date=None, end_date=None, resolution=None):
+    """Dividends and distributions paid from start_date to end_date, totalled by fiscal year."""
+    income = IncomeReport(account).generate(start_date=start_date, end_date=end_date)
+    return {
+        'labels': income['fiscal_year'].tolist(),
+        'dividends': [_decimal_to_float(amount) for amount in income['dividends']],
+        'distributions': [_decimal_to_float(amount) for amount in income['distributions']],
+    }
+
+
+def _series_chart(account, start_date=None, end_date=None, resolution=None, matrix='quantities'):
+    """A window of the daily holdings or value series, as chart labels and one dataset per instrument."""
+    series = dashboardcache.get_or_compute(account, 'series', partial(_dashboard_series, account))
+    if series is None:
+        return {'labels': [], 'datasets': [], 'resolution': None}
+
+    window = series.window(
+        start_date, end_date, resolution=resolution, max_points=settings.DASHBOARD_CHART_MAX_POINTS,
+    )
+    data = window.quantities if matrix == 'quantities' else window.values.round(2)
+    return {'labels': window.date_labels(), 'datasets': window.datasets(data), 'resolution': window.resolution}
+
+
+def _price_chart(account, start_date=None, end_date=None, resolution=None):
+    """
+    Split-adjusted closes of each instrument held from start_date to end_date, one dataset per instrument.
+
+    Weekly and monthly prices are read from the security's rollups rather than its daily history.
+    Instruments on different markets can trade on different days, so a dataset has null on a date
+    only another traded on.
+    """
+    series = dashboardcache.get_or_compute(account, 'series', partial(_dashboard_series, account))
+    if series is None:
+        return {'labels': [], 'datasets': [], 'resolution': None}
+
+    start_date = start_date or series.dates[0].date()
+    end_date = end_date or date.today()
+    resolution = resolution or pricerollups.resolution_for(start_date, end_date, settings.DASHBOARD_CHART_MAX_POINTS)
+
+    instruments = (
+        Instrument.objects.filter(account=account, is_active=True, security__isnull=False)
+        .select_related('security')
+        .order_by('name')
+    )
+    closes = {}
+    for instrument in instruments:
+        _, prices = instrument.security.price_series(start_date, end_date, resolution=resolution)
+        if not prices.empty:
+            closes[instrument.name] = dict(zip(prices['date'], prices['adjusted_close']))
+
+    dates = sorted({day for by_date in closes.values() for day in by_date})
+    return {
+        'labels': [day.isoformat() for day in dates],
+        'datasets': [
+            {
+                'label': label,
+                'data': [_decimal_to_float(by_date[day]) if by_date.get(day) is not None else None for day in dates],
+            }
+            for label, by_date in closes.items()
+        ],
+        'resolution': resolution,
+    }
+
+
+def _performance_chart(account, start_date=None, end_date=None, resolution=None):
+    """Returns, volatility and drawdown of each instrument and the account from start_date to end_date."""
+    series = dashboardcache.get_or_compute(account, 'series', partial(_dashboard_series, account))
+    analytics = performance.build(account, series, start_date, end_date)
+    return {'rows': analytics.rows() if analytics is not None else []}
+
+
+DASHBOARD_CHARTS = {
+    'holdings': partial(_series_chart, matrix='quantities'),
+    'value': partial(_series_chart, matrix='values'),
+    'prices': _price_chart,
+    'income': _income_chart,
+    'allocation': _allocation_chart,
+    'performance': _performance_chart,
+}
+
+
+def _chart_date(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{name} must be a date in the form YYYY-MM-DD, not {value!r}')
+
+
+def _clamp_window(account, start_date, end_date):
+    """
+    start_date and end_date with either bound that reaches past the account's series replaced by None.
+
+    Every window covering the whole series then shares one cache entry, rather than one per date asked for.
+    """
+    if start_date is None and end_date is None:
+        return start_date, end_date
+    series = dashboardcache.get_or_compute(account, 'series', partial(_dashboard_series, account))
+    if series is None or not len(series.dates):
+        return start_date, end_date
+    if start_date is not None and start_date <= series.dates[0].date():
+        start_date = None
+    if end_date is not None and end_date >= series.dates[-1].date():
+        end_date = None
+    return start_date, end_date
+
+
+def dashboard_chart_view(request, chart):
+    """
+    One dashboard chart's data as JSON, for the window given by the start and end query parameters.
+
+    resolution is D, W or M for the holdings, value and price series; without it, the finest that
+    fits within DASHBOARD_CHART_MAX_POINTS.
+    """
+    if chart not in DASHBOARD_CHARTS:
+        raise Http404(f'No dashboard chart called {chart}')
+
+    try:
+        start_date = _chart_date(request, 'start')
+        end_date = _chart_date(request, 'end')
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    resolution = request.GET.get('resolution') or None
+    if resolution is not None and resolution not in pricerollups.POINTS_PER_YEAR:
+        return JsonResponse(
+            {'error': f'resolution must be one of {", ".join(pricerollups.POINTS_PER_YEAR)}'}, status=400,
+        )
+
+    account = _select_account_for_user(request.user)
+    if not account:
+        return JsonResponse({'error': 'No default account is associated with your user.'}, status=404)
+
+    start_date, end_date = _clamp_window(account, start_date, end_date)
+    name = f'{chart}:{start_date}:{end_date}:{resolution}'
+    payload = dashboardcache.get_or_compute(
+        account, name, partial(DASHBOARD_CHARTS[chart], account, start_date, end_date, resolution),
+    )
+    return JsonResponse(payload)
+
+
 def _prepare_dashboard_context(request, context):
     account = _select_account_for_user(request.user)
 
     dashboard_message = None
     dashboard_message_level = 'info'
     total_portfolio_value_display = None
-    parcel_labels = []
-    parcel_values = []
-    income_labels = []
-    dividend_series = []
-    distribution_series = []
-    area_chart_labels = []
-    area_chart_datasets = []
-    value_chart_labels = []
-    value_chart_datasets = []
     dashboard_currency = None
 
-
     if not account:
         dashboard_message = (
             'No default account is associated with your user. '
@@ -270,329 +498,15 @@ def _prepare_dashboard_context(request, context):
         dashboard_message_level = 'warning'
     else:
         dashboard_currency = str(account.currency)
-        instruments = list(
-            Instrument.objects.filter(account=account, is_active=True)
-            .select_related('market')
-            .order_by('name')
-        )
-
-        for instrument in instruments:
-            try:
-                converted_value = instrument.value_held_converted
-            except Exception as exc:  # pragma: no cover - defensive log
-                logger.warning(
-                    'Skipping instrument %s for dashboard value calculation: %s',
-                    instrument,
-                    exc,
-                    exc_info=True,
-                )
-                continue
-
-            if not converted_value:
-                continue
-
-            amount = getattr(converted_value, 'amount', None)
-            if amount is None or amount <= 0:
-                continue
-
-            parcel_labels.append(instrument.name)
-            parcel_values.append(_decimal_to_float(amount))
-
-        income_by_year = {}
-
-        dividends = Dividend.objects.filter(account=account, is_active=True)
-        for dividend in dividends:
-            fiscal_year = dividend.fiscal_year
-            if not fiscal_year:
-                continue
-
-            label = fiscal_year.name or fiscal_year.get_name()
-            year_key = fiscal_year.start_year
-            entry = income_by_year.setdefault(
-                year_key,
-                {'label': label, 'dividends': Decimal('0'), 'distributions': Decimal('0')},
-            )
-
-            total_money = dividend.total_dividend_converted or dividend.total_dividend
-            if total_money:
-                entry['dividends'] += Decimal(total_money.amount)
-
-        distributions = Distribution.objects.filter(account=account, is_active=True)
-        for distribution in distributions:
-            fiscal_year = distribution.fiscal_year
-            if not fiscal_year:
-                continue
-
-            label = fiscal_year.name or fiscal_year.get_name()
-            year_key = fiscal_year.start_year
-            entry = income_by_year.setdefault(
-                year_key,
-                {'label': label, 'dividends': Decimal('0'), 'distributions': Decimal('0')},
-            )
-
-            total_money = distribution.total_distribution_converted or distribution.total_distribution
-            if total_money:
-                entry['distributions'] += Decimal(total_money.amount)
-
-        sorted_years = sorted(income_by_year)
-        for year in sorted_years:
-            entry = income_by_year[year]
-            income_labels.append(entry['label'])
-            dividend_series.append(_decimal_to_float(entry['dividends']))
-            distribution_series.append(_decimal_to_float(entry['distributions']))
 
         total_portfolio_value = account.portfolio_value_converted
         if total_portfolio_value is not None:
             total_portfolio_value_display = _format_money(total_portfolio_value)
 
-        buy_records = list(
-            Buy.objects.filter(
-                account=account,
-                is_active=True,
-            ).values('instrument_id', 'date', 'quantity')
-        )
-
-        sell_records = list(
-            Sell.objects.filter(
-                account=account,
-                is_active=True,
-            ).values('instrument_id', 'date', 'quantity')
-        )
-
-        area_instrument_ids = sorted(
-            {
-                record['instrument_id']
-                for record in buy_records + sell_records
-            }
-        )
-
-        if area_instrument_ids:
-            trade_adjustments = defaultdict(dict)
-
-            for record in buy_records:
-                inst_id = record['instrument_id']
-                if inst_id not in area_instrument_ids:
-                    continue
-                trade_adjustments[record['date']].setdefault(inst_id, Decimal('0'))
-                trade_adjustments[record['date']][inst_id] += Decimal(record['quantity'])
-
-            for record in sell_records:
-                inst_id = record['instrument_id']
-                if inst_id not in area_instrument_ids:
-                    continue
-                trade_adjustments[record['date']].setdefault(inst_id, Decimal('0'))
-                trade_adjustments[record['date']][inst_id] -= Decimal(record['quantity'])
-
-            available_dates = set(trade_adjustments.keys())
-
-            if available_dates:
-                earliest_date = min(available_dates)
-                if earliest_date > date.min:
-                    baseline_date = earliest_date - timedelta(days=1)
-                    available_dates.add(baseline_date)
-                available_dates.add(date.today())
-
-                start_date = min(available_dates)
-                end_date = max(available_dates)
-                total_days = (end_date - start_date).days
-                sorted_dates = [
-                    start_date + timedelta(days=offset)
-                    for offset in range(total_days + 1)
-                ]
-
-
-                instrument_by_id = {instrument.id: instrument for instrument in instruments}
-                instrument_name_by_id = {inst_id: instrument.name for inst_id, instrument in instrument_by_id.items()}
-
-                missing_instrument_ids = [
-                    inst_id
-                    for inst_id in area_instrument_ids
-                    if inst_id not in instrument_name_by_id
-                ]
-                if missing_instrument_ids:
-                    for instrument_obj in Instrument.objects.filter(account=account, id__in=missing_instrument_ids):
-                        instrument_by_id[instrument_obj.id] = instrument_obj
-                        instrument_name_by_id[instrument_obj.id] = instrument_obj.name
-
-
-                ordered_instrument_ids = sorted(
-                    area_instrument_ids,
-                    key=lambda inst_id: instrument_name_by_id.get(inst_id, ''),
-                )
-
-                quantities_current = {inst_id: Decimal('0') for inst_id in ordered_instrument_ids}
-                dataset_values = {inst_id: [] for inst_id in ordered_instrument_ids}
-                quantities_by_date = {}
-
-                for date_key in sorted_dates:
-                    adjustments = trade_adjustments.get(date_key, {})
-                    for inst_id, delta in adjustments.items():
-                        quantities_current[inst_id] = (
-                            quantities_current[inst_id] + delta
-                        ).quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)
-
-                    quantities_by_date[date_key] = {
-                        inst_id: quantities_current[inst_id]
-                        for inst_id in ordered_instrument_ids
-                    }
-
-                    for inst_id in ordered_instrument_ids:
-                        dataset_values[inst_id].append(float(quantities_current[inst_id]))
-
-
-                area_chart_labels = [d.isoformat() for d in sorted_dates]
-                area_chart_datasets = [
-                    {
-                        'label': instrument_name_by_id.get(inst_id, str(inst_id)),
-                        'data': dataset_values[inst_id],
-                    }
-                    for inst_id in ordered_instrument_ids
-                ]
-
-                if sorted_dates:
-                    start_date = sorted_dates[0]
-                    end_date = sorted_dates[-1]
-
-                    price_history_map = defaultdict(dict)
-                    price_history_qs = (
-                        InstrumentPriceHistory.objects.filter(
-                            account=account,
-                            instrument_id__in=ordered_instrument_ids,
-                            date__range=(start_date, end_date),
-                        )
-                        .values('instrument_id', 'date', 'close')
-                    )
-                    for record in price_history_qs:
-                        price_history_map[record['instrument_id']][record['date']] = record['close']
-
-                    initial_prices = {}
-                    for inst_id in ordered_instrument_ids:
-                        prior_close = (
-                            InstrumentPriceHistory.objects.filter(
-                                account=account,
-                                instrument_id=inst_id,
-                                date__lt=start_date,
-                            )
-                            .order_by('-date')
-                            .values_list('close', flat=True)
-                            .first()
-                        )
-                        if prior_close is not None:
-                            initial_prices[inst_id] = prior_close
-
-                    account_currency = str(account.currency)
-                    instrument_currency_by_id = {}
-                    currencies_requiring_conversion = set()
-
-                    for inst_id in ordered_instrument_ids:
-                        instrument_obj = instrument_by_id.get(inst_id)
-                        if instrument_obj is None:
-                            continue
-                        currency_code = str(instrument_obj.currency)
-                        instrument_currency_by_id[inst_id] = currency_code
-                        if currency_code != account_currency:
-                            currencies_requiring_conversion.add(currency_code)
-
-                    exchange_rate_maps = {currency: {} for currency in currencies_requiring_conversion}
-                    initial_exchange_rates = {}
-
-                    if currencies_requiring_conversion:
-                        exchange_rate_qs = (
-                            ExchangeRate.objects.filter(
-                                account=account,
-                                convert_to=account.currency,
-                                convert_from__in=currencies_requiring_conversion,
-                                date__range=(start_date, end_date),
-                            )
-                            .values('convert_from', 'date', 'exchange_rate_multiplier')
-                        )
-
-                        for record in exchange_rate_qs:
-                            exchange_rate_maps.setdefault(record['convert_from'], {})[
-                                record['date']
-                            ] = record['exchange_rate_multiplier']
-
-                        for currency_code in currencies_requiring_conversion:
-                            prior_rate = (
-                                ExchangeRate.objects.filter(
-                                    account=account,
-                                    convert_from=currency_code,
-                                    convert_to=account.currency,
-                                    date__lt=start_date,
-                                )
-                                .order_by('-date')
-                                .values_list('exchange_rate_multiplier', flat=True)
-                                .first()
-                            )
-                            if prior_rate is not None:
-                                initial_exchange_rates[currency_code] = prior_rate
-                            else:
-                                current_rate = CurrentExchangeRate.get_or_create(
-                                    account=account,
-                                    convert_from=currency_code,
-                                    convert_to=account.currency,
-                                )
-                                if current_rate:
-                                    initial_exchange_rates[currency_code] = current_rate.exchange_rate_multiplier
-
-                    price_state = {inst_id: initial_prices.get(inst_id) for inst_id in ordered_instrument_ids}
-                    exchange_state = {
-                        currency: initial_exchange_rates.get(currency)
-                        for currency in currencies_requiring_conversion
-                    }
-
-                    value_series_by_instrument = {inst_id: [] for inst_id in ordered_instrument_ids}
-
-                    for date_key in sorted_dates:
-                        for inst_id in ordered_instrument_ids:
-                            instrument_prices = price_history_map.get(inst_id, {})
-                            if date_key in instrument_prices:
-                                price_state[inst_id] = instrument_prices[date_key]
-
-                        for currency_code in currencies_requiring_conversion:
-                            rate_map = exchange_rate_maps.get(currency_code, {})
-                            if date_key in rate_map:
-                                exchange_state[currency_code] = rate_map[date_key]
-
-                        quantities_snapshot = quantities_by_date.get(date_key, {})
-                        for inst_id in ordered_instrument_ids:
-                            quantity = quantities_snapshot.get(inst_id, Decimal('0'))
-                            if not quantity:
-                                value_series_by_instrument[inst_id].append(Decimal('0'))
-                                continue
-
-                            price = price_state.get(inst_id)
-                            if price is None:
-                                value_series_by_instrument[inst_id].append(Decimal('0'))
-                                continue
-
-                            price_decimal = price if isinstance(price, Decimal) else Decimal(price)
-                            value = (quantity * price_decimal).quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)
-
-                            currency_code = instrument_currency_by_id.get(inst_id)
-                            if currency_code and currency_code != account_currency:
-                                rate = exchange_state.get(currency_code)
-                                if rate is None:
-                                    value_series_by_instrument[inst_id].append(Decimal('0'))
-                                    continue
-                                rate_decimal = rate if isinstance(rate, Decimal) else Decimal(rate)
-                                value = (value * rate_decimal).quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)
-
-                            value_series_by_instrument[inst_id].append(value)
-
-                    if value_series_by_instrument:
-                        value_chart_labels = [d.isoformat() for d in sorted_dates]
-                        value_chart_datasets = [
-                            {
-                                'label': instrument_name_by_id.get(inst_id, str(inst_id)),
-                                'data': [_decimal_to_float(amount) for amount in series],
-                            }
-                            for inst_id, series in value_series_by_instrument.items()
-                        ]
-
-
-
-        if not parcel_labels:
+        # The charts are fetched from dashboard_chart_view once the page has loaded.
+        if not Instrument.objects.filter(
+            account=account, is_active=True, calculated_value_held_converted__gt=0,
+        ).exists():
             dashboard_message = (
                 f'No active parcels with a remaining value were found for {account.description}.'
             )
@@ -605,15 +519,9 @@ def _prepare_dashboard_context(request, context):
             'dashboard_message': dashboard_message,
             'dashboard_message_level': dashboard_message_level,
             'dashboard_portfolio_value_display': total_portfolio_value_display,
-            'parcel_chart_labels': parcel_labels,
-            'parcel_chart_values': parcel_values,
-            'income_chart_labels': income_labels,
-            'income_chart_dividends': dividend_series,
-            'income_chart_distributions': distribution_series,
-            'area_chart_labels': area_chart_labels,
-            'area_chart_datasets': area_chart_datasets,
-            'value_chart_labels': value_chart_labels,
-            'value_chart_datasets': value_chart_datasets,
+            'dashboard_chart_urls': {
+                chart: reverse('admin:dashboard_chart', args=[chart]) for chart in DASHBOARD_CHARTS
+            } if account else {},
         }
     )
 
@@ -642,6 +550,11 @@ if not getattr(admin.site, '_dashboard_url_included', False):
         urls = original_get_urls()
         custom_urls = [
             path('dashboard/', admin.site.admin_view(dashboard_view), name='dashboard'),
+            path(
+                'dashboard/charts/<str:chart>/',
+                admin.site.admin_view(gzip_page(dashboard_chart_view)),
+                name='dashboard_chart',
+            ),
         ]
         return custom_urls + urls
 
@@ -676,10 +589,15 @@ if not getattr(admin.site, '_dashboard_index_overridden', False):
 model_admin_map = {
 
     Account : AccountAdmin,
+    DataExport : DataExportAdmin,
     AppUser : AppUserAdmin,
     Group : HiddenModelAdmin,
     ContentType : HiddenModelAdmin,
     Parcel : GenericModelAdminWithoutAdd,
+    Job : GenericModelAdminWithoutAdd,
+    Security : GenericModelAdminWithoutAdd,
+    SecurityPriceHistory : GenericModelAdminWithoutAdd,
+    SecurityPriceRollup : GenericModelAdminWithoutAdd,
 
 }
 
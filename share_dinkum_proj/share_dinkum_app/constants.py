@@ -1,3 +1,17 @@
 DEFAULT_CURRENCY = 'AUD'
 CGT_DISCOUNT_RATE = 0.5 # 50% discount
-CGT_DISCOUNT_THRESHOLD_DAYS = 365 # 365 days
\ No newline at end of file
+CGT_DISCOUNT_THRESHOLD_DAYS = 365 # 365 days
+# Trading sessions of well known markets, by Market.code: (time zone, open, close) in local time.
+# A market created with one of these codes starts with its hours filled in.
+MARKET_SESSIONS = {
+    'ASX': ('Australia/Sydney', '10:00', '16:00'),
+    'NZX': ('Pacific/Auckland', '10:00', '16:45'),
+    'NYSE': ('America/New_York', '09:30', '16:00'),
+    'NASDAQ': ('America/New_York', '09:30', '16:00'),
+    'LSE': ('Europe/London', '08:00', '16:30'),
+    'TSX': ('America/Toronto', '09:30', '16:00'),
+    'XETRA': ('Europe/Berlin', '09:00', '17:30'),
+    'HKEX': ('Asia/Hong_Kong', '09:30', '16:00'),
+    'TSE': ('Asia/Tokyo', '09:00', '15:30'),
+    'SGX': ('Asia/Singapore', '09:00', '17:00'),
+}
@@ -0,0 +1,58 @@
+"""Computed dashboard payloads, cached per account and data version.
+
+Building the dashboard values every instrument, totals income by fiscal year and builds daily
+holdings and value series, which is a lot of work to repeat on every visit to the admin index when
+nothing has changed. So each payload is cached under the account's data_version, a counter bumped
+whenever anything the dashboard reads changes: trades, income, share splits, instruments, price
+history and exchange rates. A bump makes the old entries unreachable rather than deleting them,
+so nothing has to know which payloads exist, and they expire after DASHBOARD_CACHE_TTL seconds.
+
+The signal receivers bump the version for ordinary saves and deletes. Bulk writes send no signals,
+so they call bump() or bump_for_securities() themselves.
+"""
+
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def cache_key(account, name, today=None):
+    """The key of a payload for an account as its data stands now."""
+    today = today or date.today()
+    # Series run to today, and values are in the account's currency.
+    return f'dashboard:{account.pk}:{account.data_version}:{account.currency}:{today.isoformat()}:{name}'
+
+
+def get_or_compute(account, name, compute, today=None):
+    """The cached payload called name for an account, computing it with compute() on a miss."""
+    key = cache_key(account, name, today=today)
+    payload = cache.get(key)
+    if payload is None:
+        logger.debug('Computing dashboard %s for account %s', name, account.pk)
+        payload = compute()
+        cache.set(key, payload, settings.DASHBOARD_CACHE_TTL)
+    return payload
+
+
+def bump(account_ids):
+    """Move the accounts on to a new data version, so their cached payloads are no longer read."""
+    from share_dinkum_app.models import Account
+
+    if not isinstance(account_ids, (list, tuple, set)):
+        account_ids = [account_ids]
+    # An UPDATE rather than save(), so concurrent bumps all count and no Account signals fire.
+    Account.objects.filter(pk__in=account_ids).update(data_version=F('data_version') + 1)
+
+
+def bump_for_securities(security_ids):
+    """Bump every account holding an instrument on one of the securities."""
+    from share_dinkum_app.models import Instrument
+
+    bump(set(
+        Instrument.objects.filter(security_id__in=security_ids).values_list('account_id', flat=True)
+    ))
@@ -0,0 +1,260 @@
+"""Daily holdings and value series for the dashboard charts, built as date x instrument matrices.
+
+Every series runs daily from the day before an account's first trade to today. Holdings are the
+cumulative sum of each day's net trades. Prices are each instrument's close carried forward over
+days without one, starting from the last close before the range, and exchange rates are carried
+forward the same way. The value of every holding on every day is then one multiplication of the
+three matrices, rather than a loop over days and instruments. Closes are read through pricestore,
+so with the price store on they come from its memory maps rather than the table.
+
+compute() does the arithmetic on plain frames and arrays, so it can be exercised without a
+database; build() loads an account's data and calls it. DashboardSeries.window() cuts a series
+down to a date range, sampled daily, weekly or monthly, for the chart endpoints.
+"""
+
+from collections import defaultdict
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from share_dinkum_app import fxservice
+from share_dinkum_app import pricerollups
+from share_dinkum_app import pricestore
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+QUANTITY_DECIMAL_PLACES = 4
+VALUE_DECIMAL_PLACES = 4
+
+
+class DashboardSeries:
+    """Holdings and values by day (rows) and instrument (columns), with the instruments' chart labels."""
+
+    def __init__(self, dates, instrument_ids, labels, quantities, values, resolution=pricerollups.RESOLUTION_DAY):
+        self.dates = dates
+        self.instrument_ids = instrument_ids
+        self.labels = labels
+        self.quantities = quantities
+        self.values = values
+        self.resolution = resolution
+
+    def datasets(self, matrix):
+        return [
+            {'label': label, 'data': matrix[:, column].tolist()}
+            for column, label in enumerate(self.labels)
+        ]
+
+    def date_labels(self):
+        return [day.isoformat() for day in self.dates.date]
+
+    def window(self, start_date=None, end_date=None, resolution=None, max_points=None):
+        """
+        The series from start_date to end_date inclusive, at a pricerollups resolution.
+
+        Weekly and monthly series hold the last day of each period, as holdings and values are a
+        position at a point in time. With no resolution, the finest that fits within max_points.
+        """
+        mask = np.ones(len(self.dates), dtype=bool)
+        if start_date is not None:
+            mask &= self.dates >= pd.Timestamp(start_date)
+        if end_date is not None:
+            mask &= self.dates <= pd.Timestamp(end_date)
+        dates = self.dates[mask]
+
+        rows = {pricerollups.RESOLUTION_DAY: np.arange(len(dates))}
+        for period, frequency in pricerollups.PERIODS.items():
+            periods = pd.Series(dates.to_period(frequency))
+            rows[period] = np.flatnonzero(~periods.duplicated(keep='last').to_numpy())
+        if resolution is None:
+            resolution = next(
+                (candidate for candidate in pricerollups.POINTS_PER_YEAR
+                 if max_points is None or len(rows[candidate]) <= max_points),
+                pricerollups.RESOLUTION_MONTH,
+            )
+
+        selected = rows[resolution]
+        return DashboardSeries(
+            dates=dates[selected],
+            instrument_ids=self.instrument_ids,
+            labels=self.labels,
+            quantities=self.quantities[mask][selected],
+            values=self.values[mask][selected],
+            resolution=resolution,
+        )
+
+
+def calendar(trade_dates, today=None):
+    """Every day from the day before the first trade to today."""
+    today = today or date.today()
+    start_date = min(trade_dates)
+    if start_date > date.min:
+        start_date -= timedelta(days=1)
+    return pd.date_range(start_date, max(today, max(trade_dates)), freq='D')
+
+
+def holdings(dates, trades, instrument_ids):
+    """
+    Quantity held of each instrument at the end of each day, as a float matrix.
+
+    trades has instrument_id, date and quantity columns, sales negative.
+    """
+    if trades.empty:
+        return np.zeros((len(dates), len(instrument_ids)))
+    deltas = trades.pivot_table(index='date', columns='instrument_id', values='quantity', aggfunc='sum')
+    deltas.index = pd.DatetimeIndex(deltas.index)
+    deltas = deltas.reindex(index=dates, columns=instrument_ids).fillna(0.0)
+    return deltas.cumsum().round(QUANTITY_DECIMAL_PLACES).to_numpy()
+
+
+def carried_forward(dates, observations, keys, initial=None):
+    """
+    A float matrix of each key's latest observation on or before each date, NaN before the first.
+
+    observations has key, date and value columns. initial is {key: value} in force before the
+    first date.
+    """
+    matrix = pd.DataFrame(np.nan, index=dates, columns=keys)
+    if not observations.empty:
+        observed = observations.pivot_table(index='date', columns='key', values='value', aggfunc='last')
+        observed.index = pd.DatetimeIndex(observed.index)
+        matrix = observed.reindex(index=dates, columns=keys)
+    if initial:
+        first = matrix.iloc[0]
+        matrix.iloc[0] = first.fillna(pd.Series(initial, dtype='float64').reindex(keys))
+    return matrix.ffill().to_numpy(dtype='float64')
+
+
+def exchange_rates(dates, series, fallback=None):
+    """
+    The rate in force on each date, as an array, from (dates, rates) of stored history.
+
+    Each date takes the latest rate on or before it; dates before the first take fallback.
+    """
+    history_dates, history_rates = series
+    result = np.full(len(dates), np.nan if fallback is None else float(fallback))
+    if len(history_dates):
+        positions = np.searchsorted(
+            np.asarray(history_dates, dtype='datetime64[D]'), dates.to_numpy(dtype='datetime64[D]'), side='right',
+        )
+        rates = np.asarray(history_rates, dtype='float64')
+        known = positions > 0
+        result[known] = rates[positions[known] - 1]
+    return result
+
+
+def compute(dates, instrument_ids, trades, prices, initial_prices=None, currencies=None, rates=None):
+    """
+    Holdings and values of every instrument on every date.
+
+    prices has instrument_id, date and close columns; initial_prices is {instrument_id: close}
+    before the first date. currencies is {instrument_id: currency} for instruments held in a
+    currency other than the account's, and rates is {currency: array of rates by date}. A value is
+    0 on days without a price, or without a rate for a foreign instrument.
+    """
+    quantities = holdings(dates, trades, instrument_ids)
+    closes = carried_forward(
+        dates, prices.rename(columns={'instrument_id': 'key', 'close': 'value'}), instrument_ids, initial_prices,
+    )
+
+    conversion = np.ones((len(dates), len(instrument_ids)))
+    for column, instrument_id in enumerate(instrument_ids):
+        currency = (currencies or {}).get(instrument_id)
+        if currency is not None:
+            conversion[:, column] = rates[currency]
+
+    values = np.nan_to_num(quantities * closes * conversion).round(VALUE_DECIMAL_PLACES)
+    return quantities, values
+
+
+def build(account, instruments, today=None):
+    """
+    The dashboard series for an account, or None if it has no trades.
+
+    instruments are the account's instruments already loaded; any other instrument traded is
+    loaded here.
+    """
+    from share_dinkum_app.models import Buy, CurrentExchangeRate, Instrument, Sell
+
+    trades = pd.DataFrame.from_records(
+        [
+            *Buy.objects.filter(account=account, is_active=True).values('instrument_id', 'date', 'quantity'),
+            *(
+                {**sell, 'quantity': -sell['quantity']}
+                for sell in Sell.objects.filter(account=account, is_active=True).values('instrument_id', 'date', 'quantity')
+            ),
+        ],
+        columns=['instrument_id', 'date', 'quantity'],
+    )
+    if trades.empty:
+        return None
+    trades['quantity'] = trades['quantity'].astype('float64')
+
+    instrument_by_id = {instrument.id: instrument for instrument in instruments}
+    missing = set(trades['instrument_id']) - set(instrument_by_id)
+    if missing:
+        instrument_by_id.update(
+            (instrument.id, instrument) for instrument in Instrument.objects.filter(account=account, id__in=missing)
+        )
+    instrument_ids = sorted(
+        set(trades['instrument_id']),
+        key=lambda instrument_id: getattr(instrument_by_id.get(instrument_id), 'name', ''),
+    )
+    dates = calendar(set(trades['date']), today=today)
+    start_date, end_date = dates[0].date(), dates[-1].date()
+
+    # Price history is held per security; map it back onto this account's instruments.
+    instrument_ids_by_security = defaultdict(list)
+    for instrument_id in instrument_ids:
+        instrument = instrument_by_id.get(instrument_id)
+        if instrument is not None and instrument.security_id is not None:
+            instrument_ids_by_security[instrument.security_id].append(instrument_id)
+
+    # Each security's closes up to the end of the range, from the columnar price store where it is
+    # on. The last close before the range seeds the carry-forward.
+    frames = []
+    initial_prices = {}
+    for security_id, history in pricestore.read_many(list(instrument_ids_by_security), end_date=end_date).items():
+        first = int(np.searchsorted(history['date'], np.datetime64(start_date, 'D')))
+        for instrument_id in instrument_ids_by_security[security_id]:
+            if first:
+                initial_prices[instrument_id] = float(history['close'][first - 1])
+            frames.append(pd.DataFrame({
+                'instrument_id': instrument_id, 'date': history['date'][first:], 'close': history['close'][first:],
+            }))
+    prices = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['instrument_id', 'date', 'close'])
+
+    account_currency = str(account.currency)
+    currencies = {
+        instrument_id: str(instrument_by_id[instrument_id].currency)
+        for instrument_id in instrument_ids
+        if instrument_id in instrument_by_id and str(instrument_by_id[instrument_id].currency) != account_currency
+    }
+    rates = {}
+    for currency in set(currencies.values()):
+        series = fxservice.get_series(account, currency, account.currency)
+        fallback = None
+        if series.as_of(start_date) is None:
+            current_rate = CurrentExchangeRate.get_or_create(
+                account=account, convert_from=currency, convert_to=account.currency,
+            )
+            if current_rate:
+                fallback = current_rate.exchange_rate_multiplier
+        rates[currency] = exchange_rates(dates, (series.dates, series.rates), fallback=fallback)
+
+    quantities, values = compute(
+        dates, instrument_ids, trades, prices,
+        initial_prices=initial_prices, currencies=currencies, rates=rates,
+    )
+    return DashboardSeries(
+        dates=dates,
+        instrument_ids=instrument_ids,
+        labels=[
+            instrument_by_id[instrument_id].name if instrument_id in instrument_by_id else str(instrument_id)
+            for instrument_id in instrument_ids
+        ],
+        quantities=quantities,
+        values=values,
+    )
@@ -0,0 +1,337 @@
+"""As-of lookups of historical exchange rates, served from memory.
+
+Each (account, convert_from, convert_to) series is read from ExchangeRate once and held as sorted
+lists of dates and multipliers, so answering "what was the rate on this date" is a bisect instead of
+a query, and a date with no row of its own (a weekend, a holiday) resolves to the nearest prior
+trading day without going to the network. Anything that writes ExchangeRate rows must call
+invalidate() afterwards; the signal receivers do this for ordinary saves and deletes, and bulk
+writes call it themselves because bulk_create sends no signals. That only clears this process's
+cache, so a series is also reloaded once it is FX_SERIES_CACHE_TTL seconds old, which bounds how
+long another worker's writes go unseen.
+
+Exchange rates are market data, so a pair one account has fetched is as good for any other. A
+pair that has not been fetched is derived, where possible, from pairs that have: read backwards
+(AUD to USD from USD to AUD), or through a pivot currency (GBP to AUD as GBP to USD to AUD). Only
+fetched rates are ever used as legs, so derived rates never compound.
+"""
+
+from bisect import bisect_right
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# (account, convert_from, convert_to) -> (monotonic time loaded, ExchangeRateSeries)
+_series_cache = {}
+_cache_lock = threading.Lock()
+
+# Current rates are refreshed one at a time on a single background thread, so a page full of stale
+# rates queues a few quick fetches rather than opening a connection per rate.
+_refresh_executor = None
+_refresh_pending = set()
+_refresh_lock = threading.Lock()
+
+
+def _account_key(account):
+    return getattr(account, 'pk', account)
+
+
+def _series_key(account, convert_from, convert_to):
+    return (_account_key(account), str(convert_from), str(convert_to))
+
+
+class ExchangeRateSeries:
+    """The stored history of one currency pair for one account, sorted by date."""
+
+    def __init__(self, dates, rates, continuous_start=None, continuous_end=None):
+        self.dates = dates
+        self.rates = rates
+        self.continuous_start = continuous_start
+        self.continuous_end = continuous_end
+
+    def __len__(self):
+        return len(self.dates)
+
+    def as_of(self, as_of_date):
+        """(date, multiplier) of the latest stored rate on or before as_of_date, or None."""
+        index = bisect_right(self.dates, as_of_date)
+        if index == 0:
+            return None
+        return self.dates[index - 1], self.rates[index - 1]
+
+    def rate_as_of(self, as_of_date):
+        found = self.as_of(as_of_date)
+        return found[1] if found else None
+
+    def covers(self, as_of_date):
+        """True when as_of_date falls inside the continuously fetched history.
+
+        Only then does a missing date mean the market was shut. Outside that range the nearest
+        stored row may be a one-off lookup from months earlier, which is no answer at all.
+        """
+        if self.continuous_start is None:
+            return False
+        return self.continuous_start <= as_of_date <= self.continuous_end
+
+
+    def inverted(self):
+        return ExchangeRateSeries(
+            dates=self.dates,
+            rates=[1 / rate if rate else rate for rate in self.rates],
+            continuous_start=self.continuous_start,
+            continuous_end=self.continuous_end,
+        )
+
+
+def _load_series(account, convert_from, convert_to):
+    """Stored rows for one account, or with account=None, fetched rows pooled across all accounts."""
+    from share_dinkum_app.models import ExchangeRate
+
+    rows = ExchangeRate.objects.filter(convert_from=convert_from, convert_to=convert_to)
+    if account is None:
+        rows = rows.filter(source=ExchangeRate.SOURCE_MARKET)
+    else:
+        rows = rows.filter(account=_account_key(account))
+    rows = rows.order_by('date').values_list('date', 'exchange_rate_multiplier', 'is_continuous_history')
+
+    dates = []
+    rates = []
+    continuous_dates = []
+    for row_date, multiplier, is_continuous in rows:
+        # Pooled accounts may each hold the same day; the first is as good as any.
+        if dates and dates[-1] == row_date:
+            continue
+        dates.append(row_date)
+        rates.append(multiplier)
+        if is_continuous:
+            continuous_dates.append(row_date)
+
+    return ExchangeRateSeries(
+        dates=dates,
+        rates=rates,
+        continuous_start=continuous_dates[0] if continuous_dates else None,
+        continuous_end=continuous_dates[-1] if continuous_dates else None,
+    )
+
+
+def get_series(account, convert_from, convert_to):
+    """The cached series for a pair, loading it from the database on first use.
+
+    account=None gives the fetched history of the pair across all accounts.
+    """
+    key = _series_key(account, convert_from, convert_to)
+    with _cache_lock:
+        cached = _series_cache.get(key)
+    if cached is not None and time.monotonic() - cached[0] < settings.FX_SERIES_CACHE_TTL:
+        return cached[1]
+
+    series = _load_series(account, convert_from, convert_to)
+    logger.debug('Loaded %s exchange rates for %s to %s', len(series), convert_from, convert_to)
+
+    with _cache_lock:
+        # Another thread may have loaded it meanwhile; either copy is equally current.
+        _series_cache[key] = (time.monotonic(), series)
+    return series
+
+
+def rate_as_of(account, convert_from, convert_to, as_of_date):
+    """The multiplier in force on as_of_date, from stored history only. None if nothing precedes it."""
+    if str(convert_from) == str(convert_to):
+        return None
+    return get_series(account, convert_from, convert_to).rate_as_of(as_of_date)
+
+
+def invalidate(account=None, convert_from=None, convert_to=None):
+    """Drop cached series so the next lookup reloads them.
+
+    With no arguments everything is dropped; otherwise only the series matching every argument
+    given.
+    """
+    account_key = _account_key(account) if account is not None else None
+
+    with _cache_lock:
+        for key in list(_series_cache):
+            key_account, key_from, key_to = key
+            # Pooled series (account None) contain every account's rows.
+            if account_key is not None and key_account not in (account_key, None):
+                continue
+            if convert_from is not None and key_from != str(convert_from):
+                continue
+            if convert_to is not None and key_to != str(convert_to):
+                continue
+            del _series_cache[key]
+
+
+def _pivot_order(currencies):
+    """Candidate pivots: the configured ones first, then any other currency with stored rates."""
+    pivots = [str(c) for c in getattr(settings, 'FX_PIVOT_CURRENCIES', ['USD'])]
+    return pivots + sorted(set(currencies) - set(pivots))
+
+
+def _find_path(convert_from, convert_to, has_leg, currencies):
+    """[from, to] or [from, pivot, to] using legs for which has_leg(a, b) holds, else None."""
+    convert_from, convert_to = str(convert_from), str(convert_to)
+    if has_leg(convert_from, convert_to):
+        return [convert_from, convert_to]
+    for pivot in _pivot_order(currencies):
+        if pivot in (convert_from, convert_to):
+            continue
+        if has_leg(convert_from, pivot) and has_leg(pivot, convert_to):
+            return [convert_from, pivot, convert_to]
+    return None
+
+
+def _stored_pairs():
+    """(from, to) of every pair with fetched continuous history, in any account."""
+    from share_dinkum_app.models import ExchangeRate
+
+    pairs = (
+        ExchangeRate.objects.filter(source=ExchangeRate.SOURCE_MARKET, is_continuous_history=True)
+        .values_list('convert_from', 'convert_to')
+        .distinct()
+    )
+    return {(str(a), str(b)) for a, b in pairs}
+
+
+def _market_leg(convert_from, convert_to, stored_pairs):
+    """Pooled fetched history for a leg, read backwards if only the reverse pair is stored."""
+    if (convert_from, convert_to) in stored_pairs:
+        return get_series(None, convert_from, convert_to)
+    if (convert_to, convert_from) in stored_pairs:
+        return get_series(None, convert_to, convert_from).inverted()
+    return None
+
+
+def describe_path(path):
+    """Provenance text recorded on derived rows, e.g. 'GBP>USD>AUD'."""
+    return '>'.join(path)
+
+
+def derive_history(convert_from, convert_to, start_date, end_date=None):
+    """Derive a pair's daily history from stored fetched pairs, without going to the network.
+
+    Returns (path, [(date, multiplier), ...]) over the dates where every leg has history, or None
+    if no path exists. Each leg is taken as of each date, so a day one leg traded and another did
+    not still gets a rate, which keeps thinly traded crosses free of gaps.
+    """
+    stored_pairs = _stored_pairs()
+    currencies = {currency for pair in stored_pairs for currency in pair}
+    path = _find_path(convert_from, convert_to, lambda a, b: _market_leg(a, b, stored_pairs) is not None, currencies)
+    if path is None:
+        return None
+
+    legs = [_market_leg(a, b, stored_pairs) for a, b in zip(path, path[1:])]
+    first = max([start_date] + [leg.continuous_start for leg in legs])
+    last = min([end_date or date.max] + [leg.continuous_end for leg in legs])
+
+    dates = sorted({d for leg in legs for d in leg.dates if first <= d <= last})
+    rows = []
+    for row_date in dates:
+        multiplier = 1
+        for leg in legs:
+            multiplier *= leg.rate_as_of(row_date)
+        rows.append((row_date, multiplier))
+    return path, rows
+
+
+def derive_rate(convert_from, convert_to, as_of_date):
+    """(path, multiplier) on one date from stored fetched pairs, or None if no path covers it."""
+    stored_pairs = _stored_pairs()
+    currencies = {currency for pair in stored_pairs for currency in pair}
+
+    def has_leg(a, b):
+        leg = _market_leg(a, b, stored_pairs)
+        return leg is not None and leg.covers(as_of_date)
+
+    path = _find_path(convert_from, convert_to, has_leg, currencies)
+    if path is None:
+        return None
+
+    multiplier = 1
+    for a, b in zip(path, path[1:]):
+        multiplier *= _market_leg(a, b, stored_pairs).rate_as_of(as_of_date)
+    return path, multiplier
+
+
+def derive_current_rate(convert_from, convert_to, account=None):
+    """(path, multiplier, rate_timestamp) from fresh fetched current rates of any account, or None.
+
+    The timestamp is that of the oldest leg, so a derived rate is never reported as fresher than
+    what it was made from. The account's own row for the pair is left out: it is the one being
+    refreshed.
+    """
+    from share_dinkum_app.models import CurrentExchangeRate
+
+    currents = CurrentExchangeRate.objects.filter(source=CurrentExchangeRate.SOURCE_MARKET)
+    if account is not None:
+        currents = currents.exclude(account=_account_key(account), convert_from=convert_from, convert_to=convert_to)
+
+    fresh = {}
+    for current in currents:
+        if not current.is_stale:
+            key = (str(current.convert_from), str(current.convert_to))
+            fresh.setdefault(key, (current.exchange_rate_multiplier, current.rate_timestamp))
+
+    def leg(a, b):
+        if (a, b) in fresh:
+            return fresh[(a, b)]
+        if (b, a) in fresh and fresh[(b, a)][0]:
+            multiplier, rate_timestamp = fresh[(b, a)]
+            return 1 / multiplier, rate_timestamp
+        return None
+
+    currencies = {currency for pair in fresh for currency in pair}
+    path = _find_path(convert_from, convert_to, lambda a, b: leg(a, b) is not None, currencies)
+    if path is None:
+        return None
+
+    legs = [leg(a, b) for a, b in zip(path, path[1:])]
+    multiplier = 1
+    for leg_multiplier, _ in legs:
+        multiplier *= leg_multiplier
+    return path, multiplier, min(rate_timestamp for _, rate_timestamp in legs)
+
+
+def _refresh_current_rate(key):
+    from share_dinkum_app.models import Account, CurrentExchangeRate
+
+    account_id, convert_from, convert_to = key
+    try:
+        account = Account.objects.get(pk=account_id)
+        CurrentExchangeRate.refresh(account=account, convert_from=convert_from, convert_to=convert_to)
+    except Exception as e:
+        logger.error(f'Background refresh of {convert_from} to {convert_to} failed: {e}', exc_info=True)
+    finally:
+        with _refresh_lock:
+            _refresh_pending.discard(key)
+        # This thread outlives any request, so nothing else will close its connection.
+        connection.close()
+
+
+def schedule_current_rate_refresh(account, convert_from, convert_to):
+    """Refresh a current rate on the background thread, returning immediately.
+
+    Requests for a pair that is already queued are dropped. Disabled with
+    FX_BACKGROUND_REFRESH=False, in which case stale rates wait for the next explicit refresh.
+    """
+    global _refresh_executor
+
+    if not getattr(settings, 'FX_BACKGROUND_REFRESH', True):
+        return
+
+    key = _series_key(account, convert_from, convert_to)
+    with _refresh_lock:
+        if key in _refresh_pending:
+            return
+        _refresh_pending.add(key)
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='fx-refresh')
+
+    _refresh_executor.submit(_refresh_current_rate, key)
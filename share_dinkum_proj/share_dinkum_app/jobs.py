@@ -0,0 +1,258 @@
+"""A small job queue kept in the database, for work too slow to do inside a request.
+
+Callers queue work with enqueue() and return at once. `python manage.py run_jobs` claims queued
+jobs one at a time and runs them, recording status and progress on the Job row as it goes, which
+the admin shows. A job that raises is queued again after JOB_RETRY_DELAY seconds, doubling each
+time, until it has been tried JOB_MAX_ATTEMPTS times, and is then marked failed with the
+traceback. Jobs are claimed with a conditional update, so several workers can share one queue
+without running a job twice, even on SQLite.
+
+With JOBS_EAGER (the default under test) a job runs as soon as it is queued, on the caller's thread.
+With JOBS_IN_PROCESS (the default otherwise), queueing a job also starts a worker on a daemon thread
+of the queueing process, so jobs run even when no `run_jobs` worker has been started. It claims jobs
+in the same way, so it can share the queue with one.
+"""
+
+from datetime import datetime, timedelta, UTC
+import os
+import socket
+import threading
+import time
+import traceback
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.temp import NamedTemporaryFile
+from django.db import connection
+from django.db.models import F
+
+from share_dinkum_app import excelinterface
+from share_dinkum_app import loading
+from share_dinkum_app.models import Account, DataExport, Job, Security, SecurityPriceHistory, SecurityPriceRollup
+from share_dinkum_app.reports import IncomeReport, RealisedCapitalGainReport
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+TASKS = {}
+
+_worker_thread = None
+_worker_lock = threading.Lock()
+
+
+def task(name):
+    """Register a function as the task called name. It is called as func(job, **job.arguments)."""
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(task_name, account, unique=False, **arguments):
+    """
+    Queue a task for an account and return its Job.
+
+    With unique, a job for the same task, account and arguments that is still waiting is returned
+    instead of queueing another. The arguments are stored as JSON.
+    """
+    if task_name not in TASKS:
+        raise ValueError(f'Unknown job task: {task_name}')
+
+    if unique:
+        waiting = Job.objects.filter(
+            task=task_name, account=account, arguments=arguments, status=Job.STATUS_QUEUED,
+        ).first()
+        if waiting is not None:
+            return waiting
+
+    job = Job.objects.create(task=task_name, account=account, arguments=arguments)
+    logger.info('Queued job %s', job)
+
+    if settings.JOBS_EAGER:
+        if claim(job, worker='eager'):
+            run(job)
+    elif settings.JOBS_IN_PROCESS:
+        start_background_worker()
+    return job
+
+
+def start_background_worker():
+    """Start the worker thread of this process, unless it is already running."""
+    global _worker_thread
+
+    with _worker_lock:
+        if _worker_thread is not None and _worker_thread.is_alive():
+            return
+        _worker_thread = threading.Thread(
+            target=_work_in_background, name='job-worker', daemon=True,
+        )
+        _worker_thread.start()
+
+
+def _work_in_background():
+    try:
+        work(worker=f'{default_worker_name()}:thread')
+    except Exception:
+        # The next job queued starts another.
+        logger.error('Background job worker stopped', exc_info=True)
+    finally:
+        connection.close()
+
+
+def claim(job, worker):
+    """Mark a queued job as running on this worker. False if another worker claimed it first."""
+    now = datetime.now(UTC)
+    claimed = Job.objects.filter(pk=job.pk, status=Job.STATUS_QUEUED).update(
+        status=Job.STATUS_RUNNING, worker=worker, started_at=now, finished_at=None, attempts=F('attempts') + 1,
+    )
+    if claimed:
+        job.refresh_from_db()
+    return bool(claimed)
+
+
+def claim_next(worker):
+    """Claim the queued job that has been due longest, or return None if none is due."""
+    now = datetime.now(UTC)
+    due = Job.objects.filter(status=Job.STATUS_QUEUED, run_after__lte=now).order_by('run_after', 'id')
+    for job in due[:10]:
+        if claim(job, worker):
+            return job
+    return None
+
+
+def run(job):
+    """Run a claimed job, recording success, or failure and any retry."""
+    logger.info('Running job %s (attempt %s of %s)', job, job.attempts, job.max_attempts)
+    try:
+        TASKS[job.task](job, **job.arguments)
+    except Exception:
+        error = traceback.format_exc()
+        now = datetime.now(UTC)
+        if job.attempts < job.max_attempts:
+            delay = settings.JOB_RETRY_DELAY * (2 ** (job.attempts - 1))
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.STATUS_QUEUED, run_after=now + timedelta(seconds=delay), error=error,
+            )
+            logger.warning('Job %s failed; retrying in %ss', job, delay, exc_info=True)
+        else:
+            Job.objects.filter(pk=job.pk).update(status=Job.STATUS_FAILED, finished_at=now, error=error)
+            logger.error('Job %s failed after %s attempts', job, job.attempts, exc_info=True)
+    else:
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.STATUS_SUCCEEDED, finished_at=datetime.now(UTC), progress=100, error='',
+        )
+        logger.info('Job %s succeeded', job)
+    job.refresh_from_db()
+    return job
+
+
+def requeue_abandoned():
+    """Queue again any job that has been running for longer than JOB_TIMEOUT, its worker presumed gone."""
+    cutoff = datetime.now(UTC) - timedelta(seconds=settings.JOB_TIMEOUT)
+    abandoned = Job.objects.filter(status=Job.STATUS_RUNNING, started_at__lt=cutoff)
+    count = abandoned.update(status=Job.STATUS_QUEUED, run_after=datetime.now(UTC), worker='')
+    if count:
+        logger.warning('Requeued %s abandoned jobs', count)
+    return count
+
+
+def default_worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def work(worker=None, burst=False, poll_interval=None):
+    """
+    Run jobs until stopped. With burst, return once nothing is due, giving the number of jobs run.
+    """
+    worker = worker or default_worker_name()
+    poll_interval = poll_interval or settings.JOB_POLL_INTERVAL
+    ran = 0
+
+    while True:
+        requeue_abandoned()
+        job = claim_next(worker)
+        if job is None:
+            if burst:
+                return ran
+            time.sleep(poll_interval)
+            continue
+        run(job)
+        ran += 1
+
+
+# --- Tasks ---
+
+
+@task('refresh_account')
+def refresh_account(job):
+    """Refresh an account's exchange rates and then its prices, and clear its update_price_history flag."""
+    account = Account.objects.get(pk=job.account_id)
+
+    # Exchange rates must be refreshed first. Saving an instrument stores its value converted at
+    # whatever the current rate is at that moment, and nothing re-converts it afterwards, so
+    # refreshing the rate second leaves every holding valued at the previous rate.
+    job.set_progress(0, 'Refreshing exchange rates')
+    account.update_all_exchange_rate_history()
+    job.set_progress(50, 'Refreshing prices')
+    account.update_all_price_history()
+
+    # Mark flag as cleared
+    account.update_price_history = False
+    account.save(update_fields=['update_price_history'])
+
+
+@task('generate_export')
+def generate_export(job, data_export):
+    """Build the workbook for a DataExport and attach it."""
+    instance = DataExport.objects.get(pk=data_export)
+    if instance.file:
+        return  # already has a file
+    logger.info('Starting data export process.')
+
+    models = [
+        model for model in apps.get_app_config('share_dinkum_app').get_models()
+        if model not in (Job, SecurityPriceRollup)
+        and not (model in (Security, SecurityPriceHistory) and not instance.include_price_history)
+    ]
+
+    with NamedTemporaryFile(suffix='.xlsx') as temp_file:
+        gen = excelinterface.ExcelGen(title='Data Export')
+        for number, model in enumerate(models):
+
+            logger.info('    - %s', model.__name__)
+            job.set_progress(100 * number / (len(models) + 2), f'Exporting {model.__name__}')
+
+            if model is Security:
+                # Shared across accounts: only the securities this account holds.
+                queryset = model.objects.filter(instruments__account=instance.account).distinct()
+            elif model is SecurityPriceHistory:
+                queryset = model.objects.filter(security__instruments__account=instance.account).distinct()
+            elif 'account' in [f.name for f in model._meta.get_fields()]:
+                queryset = loading.model_to_queryset(model=model, account=instance.account)
+            else:
+                queryset = loading.model_to_queryset(model=model)
+
+            df = loading.queryset_to_df(queryset)
+            desc = getattr(model, 'MODEL_DESCRIPTION', 'No description available')
+            if not df.empty:
+                gen.add_table(df, table_name=model.__name__, description=desc)
+
+        logger.info('    - Realised Capital Gains Report')
+        job.set_progress(100 * len(models) / (len(models) + 2), 'Exporting realised capital gains')
+        rcg_report = RealisedCapitalGainReport(account=instance.account)
+
+        df_realised_capital_gains = rcg_report.generate()
+
+        gen.add_table(df_realised_capital_gains, table_name="RealisedCapitalGains", description="Report of realised capital gains per sale allocation.")
+
+        logger.info('    - Income Report')
+        job.set_progress(100 * (len(models) + 1) / (len(models) + 2), 'Exporting income')
+        df_income = IncomeReport(account=instance.account).generate()
+        gen.add_table(df_income, table_name="Income", description="Report of dividends and distributions per fiscal year.")
+
+        gen.save(temp_file.name)
+        new_name = f'Export_{instance.account.description}.xlsx'
+        instance.file.save(new_name, ContentFile(open(temp_file.name, 'rb').read()))
+        logger.info('Data export process completed successfully.')
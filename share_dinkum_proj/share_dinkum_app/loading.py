@@ -1,12 +1,11 @@
 import pandas as pd
 
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 import shutil
 import sqlite3
 from tqdm import tqdm
 from pathlib import Path
 
-from django.apps import apps
 from django.db.models import DecimalField, FileField
 from django.db import connections, transaction
 from django.core.exceptions import ObjectDoesNotExist
@@ -14,14 +13,13 @@ from django.conf import settings
 from django.core.management import call_command
 
 
-from djmoney.money import Money
-
 import share_dinkum_app
 from share_dinkum_app import excelinterface
-from share_dinkum_app import yfinanceinterface
+from share_dinkum_app import fxservice
+from share_dinkum_app import marketcache
+from share_dinkum_app import priceadjust
 import share_dinkum_app.models as app_models
 from share_dinkum_app.utils import convert_to_decimal_field, save_with_logging, process_filefield
-from share_dinkum_app.utils.signal_helpers import disconnect_app_signals, reconnect_app_signals
 
 
 import logging
@@ -108,7 +106,6 @@ class DataLoader():
             'ExchangeRate': share_dinkum_app.models.ExchangeRate,
             'Market': share_dinkum_app.models.Market,
             'Instrument': share_dinkum_app.models.Instrument,
-            'InstrumentPriceHistory': share_dinkum_app.models.InstrumentPriceHistory,
             'Buy': share_dinkum_app.models.Buy,
             'Sell': share_dinkum_app.models.Sell,
             'Parcel': share_dinkum_app.models.Parcel,
@@ -128,6 +125,9 @@ class DataLoader():
 
         model_load_order = self.get_model_load_order()
 
+        # Every foreign currency row would otherwise look up its own rate as it is saved.
+        self.prefetch_exchange_rates()
+
         for model in model_load_order:
             table_name = model.__name__
 
@@ -139,6 +139,9 @@ class DataLoader():
                 logger.info(f"Loading {table_name}")
                 self.load_table_to_model(model=model, df=df)
 
+        # Once the instruments and share splits exist, which the securities and adjustments follow.
+        self.load_price_history()
+
 
     def load_table_to_model(self, model, df):
 
@@ -147,7 +150,9 @@ class DataLoader():
         # Legacy data import template has a column 'copy_from_path' which is used to load files.
         # Now, can just use 'file' as the column name, so the export template can be used for importing data also.
         df = df.rename(columns={'copy_from_path': 'file'}, errors='ignore')
-        cols_to_drop = ['created_at', 'updated_at', '_creation_handled']
+        # An instrument's security is exported by id, which means nothing in another database.
+        # It is set from the ticker as each instrument is saved.
+        cols_to_drop = ['created_at', 'updated_at', '_creation_handled', 'security_id']
         cols_to_drop += [col for col in df.columns if col.startswith('calculated_')]
         df = df.drop(columns=cols_to_drop, errors='ignore')
 
@@ -245,21 +250,133 @@ class DataLoader():
                 save_with_logging(obj=obj, context="Creating new object without provided ID")
 
 
+    def load_price_history(self):
+        """
+        Store the price history sheets against each security.
+
+        Exports hold it in Security and SecurityPriceHistory sheets, as traded, keyed by the
+        exported security id. Exports from before history was shared by ticker hold it per
+        instrument in an InstrumentPriceHistory sheet, as Yahoo Finance adjusted it for splits.
+        """
+        history = self.mapping.get('SecurityPriceHistory')
+        securities = self.mapping.get('Security')
+        if history is not None and not history.empty and securities is not None:
+            tickers = dict(zip(securities['id'].astype(str), securities['ticker_code']))
+            for security_id, rows in history.groupby(history['security_id'].astype(str)):
+                ticker_code = tickers.get(security_id)
+                if ticker_code is None:
+                    logger.warning(f'No Security row for price history of security {security_id}; skipped')
+                    continue
+                logger.info(f'Loading price history for {ticker_code}')
+                security = app_models.Security.for_ticker(ticker_code)
+                security.ingest_price_history(self.price_history_frame(rows), split_adjusted=False)
+
+        legacy = self.mapping.get('InstrumentPriceHistory')
+        if legacy is not None and not legacy.empty:
+            for name, rows in legacy.groupby('instrument__name'):
+                instrument = self.get_related_obj_by_name(
+                    related_model=app_models.Instrument, account=self.account, filters={'name': name},
+                )
+                logger.info(f'Loading legacy price history for {instrument.security}')
+                rows = priceadjust.restore_as_traded(self.price_history_frame(rows))
+                instrument.security.ingest_price_history(rows, split_adjusted=False)
+
+
+    @staticmethod
+    def price_history_frame(rows):
+        """Sheet rows as the frame Security.ingest_price_history takes."""
+        frame = rows[['date', 'open', 'high', 'low', 'close', 'volume', 'stock_splits']].copy()
+        frame['date'] = pd.to_datetime(frame['date']).dt.date
+        for column in ['open', 'high', 'low', 'close']:
+            frame[column] = pd.to_numeric(frame[column], errors='coerce')
+        for column in ['volume', 'stock_splits']:
+            frame[column] = pd.to_numeric(frame[column], errors='coerce').fillna(0)
+        return frame.reset_index(drop=True)
+
+
+    def get_exchange_rate_requirements(self):
+        """
+        Scan the workbook for every foreign currency amount that will need converting.
+
+        Returns a dict of {currency: set of dates}, covering each table whose model carries an
+        exchange rate.
+        """
+        requirements = {}
+        account_currency = str(self.account.currency)
+
+        for model in self.get_model_load_order():
+            field_names = {f.name for f in model._meta.fields}
+            if 'exchange_rate' not in field_names:
+                continue
+
+            df = self.mapping.get(model.__name__)
+            if df is None or df.empty:
+                continue
+
+            date_column = next((col for col in ('date', 'financial_year_end_date') if col in df.columns), None)
+            if date_column is None:
+                continue
+
+            dates = pd.to_datetime(df[date_column], errors='coerce').dt.date
+            currency_columns = [col for col in df.columns if col.endswith('_currency')]
+            for col in currency_columns:
+                for currency, exchange_date in zip(df[col], dates):
+                    if not currency or pd.isna(exchange_date) or str(currency) == account_currency:
+                        continue
+                    requirements.setdefault(str(currency), set()).add(exchange_date)
+
+        return requirements
+
+
+    @marketcache.report('Exchange rate prefetch')
+    def prefetch_exchange_rates(self):
+        """
+        Load one continuous history per foreign currency before any rows are saved.
+
+        The per-row lookups made while saving then find a stored rate, or the prior trading day's
+        rate inside the stored history, instead of each making its own network request.
+        """
+        convert_to = self.account.currency
+
+        for convert_from, dates in self.get_exchange_rate_requirements().items():
+            series = fxservice.get_series(self.account, convert_from, convert_to)
+            missing = sorted(d for d in dates if not series.covers(d))
+            if not missing:
+                continue
+
+            # The fetched range has to join up with any history already stored, because every
+            # date between the first and last continuous rows is trusted to have no gaps. If the
+            # stored history already reaches the latest date needed, only the stretch before it is
+            # missing; otherwise fetch through to today.
+            start_date = missing[0]
+            end_date = None
+            if series.continuous_start is not None:
+                if missing[-1] < series.continuous_start:
+                    end_date = series.continuous_start - timedelta(days=1)
+                elif start_date > series.continuous_end:
+                    start_date = series.continuous_end
+
+            logger.info(f'Prefetching {convert_from} to {convert_to} exchange rates from {start_date} for {len(dates)} dates')
+            app_models.ExchangeRate.load_history(
+                account=self.account,
+                convert_from=convert_from,
+                convert_to=convert_to,
+                start_date=start_date,
+                end_date=end_date,
+            )
+
+
     def get_or_create_exchange_rate(self, convert_from, exchange_date):
         convert_to = self.account.currency
         if convert_from == convert_to:
             return None
-        
-        exchange_rate_multiplier = yfinanceinterface.get_exchange_rate(convert_from=convert_from, convert_to=convert_to, exchange_date=exchange_date)
-        record = {
-            'account' : self.account,
-            'date' : date.fromisoformat(str(exchange_date)),
-            'convert_from' : convert_from,
-            'convert_to' : convert_to,
-            'exchange_rate_multiplier' : exchange_rate_multiplier
-            }
-        exchange_rate, created = app_models.ExchangeRate.objects.get_or_create(**{'convert_from': convert_from, 'convert_to' : convert_to, 'date' : exchange_date}, defaults=record)
-        return exchange_rate
+
+        return app_models.ExchangeRate.get_or_create(
+            account=self.account,
+            convert_from=convert_from,
+            convert_to=convert_to,
+            exchange_date=date.fromisoformat(str(exchange_date)),
+        )
 
 
     def get_available_parcels(self, legacy_id):
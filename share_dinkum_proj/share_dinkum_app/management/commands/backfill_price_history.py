@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from share_dinkum_app.models import Account
+from share_dinkum_app.reports import PriceCoverageReport
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Fetch the gaps in stored price history against each market\'s trading calendar, for every '
+        'account or those given with --account. With --report, only list the instruments with gaps.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--account', action='append', default=None, help='Id of an account to backfill. May be repeated.')
+        parser.add_argument('--report', action='store_true', help='List incomplete coverage without fetching anything.')
+
+    def handle(self, *args, **options):
+        accounts = Account.objects.all()
+        if options['account']:
+            accounts = accounts.filter(id__in=options['account'])
+
+        for account in accounts:
+            if not options['report']:
+                fetched = account.backfill_price_history()
+                logger.info('Backfilled price history for %s with %s fetches.', account, fetched)
+
+            coverage = PriceCoverageReport(account=account).generate()
+            if coverage.empty:
+                logger.info('Price history for %s is complete.', account)
+                continue
+            logger.info('Incomplete price history for %s:\n%s', account, coverage.to_string(index=False))
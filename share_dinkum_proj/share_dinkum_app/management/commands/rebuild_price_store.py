@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from share_dinkum_app import pricerollups
+from share_dinkum_app import pricestore
+from share_dinkum_app.models import Security
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the columnar price store and the weekly and monthly rollups from SecurityPriceHistory, '
+        'for every security or those given with --security.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--security', action='append', default=None, help='Id of a security to rebuild. May be repeated.')
+
+    def handle(self, *args, **options):
+        securities = Security.objects.all()
+        if options['security']:
+            securities = securities.filter(id__in=options['security'])
+
+        rows = 0
+        rollups = 0
+        security_ids = list(securities.values_list('id', flat=True))
+        for security_id in security_ids:
+            rows += pricestore.rebuild(security_id)
+            rollups += pricerollups.rebuild(security_id)
+        logger.info('Rebuilt the price store for %s securities, %s rows, %s rollups.', len(security_ids), rows, rollups)
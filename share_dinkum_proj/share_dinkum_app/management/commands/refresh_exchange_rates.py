@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from share_dinkum_app.models import CurrentExchangeRate
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Keep current exchange rates warm by refreshing any older than CurrentExchangeRate.MAX_AGE. '
+        'Runs once, or every --interval minutes until stopped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None, help='Minutes between refreshes. Omit to run once.')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+
+        while True:
+            refreshed = CurrentExchangeRate.refresh_stale()
+            logger.info('Refreshed %s stale current exchange rates.', refreshed)
+
+            if not interval:
+                return
+            time.sleep(interval * 60)
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from share_dinkum_app import marketrefresh
+from share_dinkum_app.models import Account
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Refresh exchange rates and prices for every account, or those given with --account. '
+        'With --async, all the accounts\' fetches are gathered concurrently before anything is written.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--async', action='store_true', dest='use_async', help='Fetch for all accounts concurrently.')
+        parser.add_argument('--account', action='append', default=None, help='Id of an account to refresh. May be repeated.')
+        parser.add_argument('--concurrency', type=int, default=None, help='Most fetches in flight at once, with --async.')
+
+    def handle(self, *args, **options):
+        accounts = Account.objects.all()
+        if options['account']:
+            accounts = accounts.filter(id__in=options['account'])
+        accounts = list(accounts)
+
+        if options['use_async']:
+            fetched = marketrefresh.refresh_accounts(accounts, concurrency=options['concurrency'])
+            logger.info('Refreshed market data for %s accounts with %s fetches.', len(accounts), fetched)
+            return
+
+        for account in accounts:
+            account.update_all_exchange_rate_history()
+            account.update_all_price_history()
+        logger.info('Refreshed market data for %s accounts.', len(accounts))
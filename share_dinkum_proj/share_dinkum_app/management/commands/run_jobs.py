@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from share_dinkum_app import jobs
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued background jobs, such as account refreshes and data exports. '
+        'Runs until stopped, or with --burst until nothing is left to do.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is due.')
+        parser.add_argument('--worker', default=None, help='Name recorded on the jobs this worker runs. Defaults to host:pid.')
+        parser.add_argument('--poll-interval', type=float, default=None, help='Seconds to wait when the queue is empty.')
+
+    def handle(self, *args, **options):
+        ran = jobs.work(worker=options['worker'], burst=options['burst'], poll_interval=options['poll_interval'])
+        logger.info('Ran %s jobs.', ran)
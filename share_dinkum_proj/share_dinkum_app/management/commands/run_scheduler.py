@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from share_dinkum_app import scheduler
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Refresh prices and current exchange rates wherever a market has traded since the last refresh, '
+        'following each market\'s hours and holidays. Runs once, or every --interval minutes until stopped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None, help='Minutes between refreshes. Omit to run once.')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+
+        while True:
+            try:
+                scheduler.run_once()
+            except Exception as e:
+                # One failed run should not stop the schedule.
+                logger.error(f'Scheduled market data refresh failed: {e}', exc_info=True)
+
+            if not interval:
+                return
+            time.sleep(interval * 60)
@@ -0,0 +1,196 @@
+"""On-disk cache of market data responses.
+
+Each response is stored under MARKET_DATA_CACHE_DIR, keyed by (ticker, interval, start, end), as
+JSON: a header line with the key and expiry, then the frame in pandas' table format, which keeps
+the dtypes and the timezone of the index. Unlike a pickle, reading an entry cannot run code. A
+range that ends before today is settled history and is kept until evicted; a range reaching today
+is still moving, and expires after MARKET_DATA_CACHE_TTL seconds.
+
+Once the cache holds more than MARKET_DATA_CACHE_MAX_BYTES, the least recently used entries are
+deleted. The directory is only listed for that when the bytes written since the last listing could
+have taken it over the limit, not on every write.
+
+Off under test (MARKET_DATA_CACHE=False), where every response is a mock.
+"""
+
+from contextlib import contextmanager
+from datetime import date
+import hashlib
+import json
+import os
+from pathlib import Path
+import threading
+import time
+
+import pandas as pd
+from django.conf import settings
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+_stats = {'hits': 0, 'misses': 0, 'bytes_saved': 0}
+_stats_lock = threading.Lock()
+_evict_lock = threading.Lock()
+# Bytes in each cache directory as of its last listing, plus those written since.
+_sizes = {}
+
+
+def is_enabled():
+    return getattr(settings, 'MARKET_DATA_CACHE', False)
+
+
+def _directory():
+    return Path(settings.MARKET_DATA_CACHE_DIR)
+
+
+def _key(ticker, interval, start, end):
+    """The key of a response. Dates become ISO strings, so a date and its string share an entry and the key is JSON."""
+    return tuple(
+        part.isoformat() if isinstance(part, date) else part
+        for part in (ticker, interval, start, end)
+    )
+
+
+def _path(key):
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()
+    return _directory() / f'{digest}.json'
+
+
+def _is_closed(end):
+    """True when the range ends before today. yfinance treats end as exclusive."""
+    if end is None:
+        return False
+    return date.fromisoformat(str(end)[:10]) <= date.today()
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def get(ticker, interval, start, end):
+    """The cached response for the key, or None if it is missing or has expired."""
+    if not is_enabled():
+        return None
+
+    key = _key(ticker, interval, start, end)
+    path = _path(key)
+    try:
+        with open(path, encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            value = pd.read_json(f, orient='table')
+    except FileNotFoundError:
+        _count('misses')
+        return None
+    except Exception as e:
+        logger.warning('Discarding unreadable market data cache entry %s: %s', path.name, e)
+        path.unlink(missing_ok=True)
+        _count('misses')
+        return None
+
+    expires_at = header['expires_at']
+    if tuple(header['key']) != key or (expires_at is not None and expires_at < time.time()):
+        _count('misses')
+        return None
+
+    # The modification time doubles as the last use, which is what eviction goes by.
+    os.utime(path)
+    _count('hits')
+    _count('bytes_saved', path.stat().st_size)
+    return value
+
+
+def put(ticker, interval, start, end, value):
+    """
+    Store a response. Ranges reaching today expire after the TTL; closed ranges never do.
+
+    A response that cannot be written is logged and left uncached.
+    """
+    if not is_enabled():
+        return
+
+    key = _key(ticker, interval, start, end)
+    expires_at = None if _is_closed(end) else time.time() + settings.MARKET_DATA_CACHE_TTL
+
+    path = _path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to the side and rename, so a reader on another thread never sees half a file.
+    temp_path = path.with_suffix(f'.{threading.get_ident()}.tmp')
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'key': key, 'expires_at': expires_at}) + '\n')
+            f.write(value.to_json(orient='table', date_unit='ns'))
+        size = temp_path.stat().st_size
+        os.replace(temp_path, path)
+    except Exception as e:
+        # Failing to cache a response must not lose it: the caller still has it.
+        logger.warning('Could not cache market data for %s: %s', key, e)
+        temp_path.unlink(missing_ok=True)
+        return
+
+    # An overwritten entry is counted twice, which only brings the next listing forward.
+    directory = str(path.parent)
+    with _evict_lock:
+        written = _sizes.get(directory)
+        if written is not None:
+            _sizes[directory] = written + size
+    if written is None or written + size > settings.MARKET_DATA_CACHE_MAX_BYTES:
+        evict()
+
+
+def evict():
+    """Delete least recently used entries until the cache is within MARKET_DATA_CACHE_MAX_BYTES."""
+    directory = _directory()
+    if not directory.exists():
+        return
+
+    with _evict_lock:
+        # Entries written as pickles before the cache moved to JSON are never read again.
+        for path in directory.glob('*.pickle'):
+            path.unlink(missing_ok=True)
+
+        entries = []
+        for path in directory.glob('*.json'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= settings.MARKET_DATA_CACHE_MAX_BYTES:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        _sizes[str(directory)] = total
+
+
+def clear():
+    for path in _directory().glob('*.json'):
+        path.unlink(missing_ok=True)
+    _sizes.pop(str(_directory()), None)
+
+
+def stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+@contextmanager
+def report(description):
+    """Log the hits, misses and bytes saved by the cache during the block."""
+    before = stats()
+    try:
+        yield
+    finally:
+        if is_enabled():
+            after = stats()
+            logger.info(
+                '%s: market data cache %s hits, %s misses, %.1f KB saved',
+                description,
+                after['hits'] - before['hits'],
+                after['misses'] - before['misses'],
+                (after['bytes_saved'] - before['bytes_saved']) / 1024,
+            )
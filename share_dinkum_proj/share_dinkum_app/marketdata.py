@@ -0,0 +1,231 @@
+"""Market data providers: where prices and exchange rates come from.
+
+Models ask get_provider() rather than calling yfinance directly. The provider is chosen with the
+MARKET_DATA_PROVIDER setting:
+
+    yfinance  live data from Yahoo Finance (the default)
+    file      CSV files in MARKET_DATA_DIR, for running offline, in tests and benchmarks
+    a dotted path to any MarketDataProvider subclass
+
+Every provider returns data in the shapes yfinanceinterface does, so callers need not know which
+one they have.
+"""
+
+from abc import ABC, abstractmethod
+from datetime import date, datetime, time, timedelta, UTC
+from pathlib import Path
+import threading
+
+import pandas as pd
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from share_dinkum_app import yfinanceinterface
+from share_dinkum_app.utils import convert_to_decimal, convert_series_to_decimal
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class MarketDataProvider(ABC):
+    """Interface for a source of price and exchange rate data. A subclass must implement every method."""
+
+    @abstractmethod
+    def get_instrument_price_history(self, instrument, start_date, end_date=None):
+        """Daily prices for one instrument, as a frame with instrument, date, open, high, low, close, volume, stock_splits."""
+
+    @abstractmethod
+    def get_price_history_batch(self, instruments, start_date, end_date=None):
+        """Daily prices for many instruments, in long format with an added ticker column."""
+
+    @abstractmethod
+    def get_current_price(self, instrument):
+        """Latest price for an instrument as a Decimal, or None."""
+
+    @abstractmethod
+    def get_current_quotes(self, instruments):
+        """{ticker code: (price, quote time in UTC)} for many instruments at once, leaving out any without a price."""
+
+    @abstractmethod
+    def get_exchange_rate_history(self, convert_from, convert_to, start_date, end_date=None):
+        """Daily rates, as a frame with convert_from, convert_to, date, exchange_rate_multiplier, is_continuous_history."""
+
+    @abstractmethod
+    def get_exchange_rate(self, convert_from, convert_to, exchange_date=None):
+        """The rate on a date (or the first trading day after it) as a Decimal, or None."""
+
+    @abstractmethod
+    def get_current_exchange_rate(self, convert_from, convert_to):
+        """(multiplier, quote time in UTC) for the latest rate, or None."""
+
+
+class YFinanceProvider(MarketDataProvider):
+    """Live data from Yahoo Finance, through yfinanceinterface."""
+
+    def get_instrument_price_history(self, instrument, start_date, end_date=None):
+        return yfinanceinterface.get_instrument_price_history(instrument=instrument, start_date=start_date, end_date=end_date)
+
+    def get_price_history_batch(self, instruments, start_date, end_date=None):
+        return yfinanceinterface.get_price_history_batch(instruments=instruments, start_date=start_date, end_date=end_date)
+
+    def get_current_price(self, instrument):
+        return yfinanceinterface.get_current_price(instrument)
+
+    def get_current_quotes(self, instruments):
+        return yfinanceinterface.get_current_quotes([instrument.yfinance_ticker_code for instrument in instruments])
+
+    def get_exchange_rate_history(self, convert_from, convert_to, start_date, end_date=None):
+        return yfinanceinterface.get_exchange_rate_history(
+            convert_from=convert_from, convert_to=convert_to, start_date=start_date, end_date=end_date,
+        )
+
+    def get_exchange_rate(self, convert_from, convert_to, exchange_date=None):
+        return yfinanceinterface.get_exchange_rate(convert_from=convert_from, convert_to=convert_to, exchange_date=exchange_date)
+
+    def get_current_exchange_rate(self, convert_from, convert_to):
+        return yfinanceinterface.get_current_exchange_rate(convert_from=convert_from, convert_to=convert_to)
+
+
+class FileProvider(MarketDataProvider):
+    """
+    Data read from files named by Yahoo ticker in one directory, e.g. BHP.AX.csv or USDAUD=X.csv.
+
+    Each file holds daily rows with a date column and at least a close column; open, high, low,
+    volume and stock_splits are optional. Column names are matched as yfinance writes them too,
+    so the output of Ticker.history().to_csv() can be used as it is. Files are read once and kept
+    in memory until they change on disk. A ticker with no file has no data, exactly as an unknown
+    ticker would from Yahoo.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def _path(self, ticker_code):
+        path = self.directory / f'{ticker_code}.csv'
+        return path if path.exists() else None
+
+    def _read(self, ticker_code):
+        """The whole file for a ticker, sorted by date, or an empty frame."""
+        path = self._path(ticker_code)
+        if path is None:
+            logger.warning('No market data file for %s in %s', ticker_code, self.directory)
+            return pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close', 'volume', 'stock_splits'])
+
+        modified = path.stat().st_mtime
+        with self._lock:
+            cached = self._frames.get(path)
+        if cached is not None and cached[0] == modified:
+            return cached[1]
+
+        frame = pd.read_csv(path)
+        frame.columns = [yfinanceinterface.to_snake_case(str(col)) for col in frame.columns]
+
+        # The trading date as written, before any UTC offset: 00:00+11:00 is still that day on the ASX.
+        frame['date'] = pd.to_datetime(frame['date'].astype(str).str[:10]).dt.date
+        for column in ['open', 'high', 'low', 'volume', 'stock_splits']:
+            if column not in frame.columns:
+                frame[column] = frame['close'] if column in ('open', 'high', 'low') else 0
+        for column in ['open', 'high', 'low', 'close', 'volume', 'stock_splits']:
+            frame[column] = pd.to_numeric(frame[column], errors='coerce')
+        frame = frame.dropna(subset=['close']).sort_values('date').reset_index(drop=True)
+
+        with self._lock:
+            self._frames[path] = (modified, frame)
+        return frame
+
+    def _between(self, ticker_code, start_date, end_date=None):
+        frame = self._read(ticker_code)
+        start_date = yfinanceinterface.as_date(start_date, 'start_date')
+        mask = frame['date'] >= start_date
+        if end_date is not None:
+            mask &= frame['date'] <= yfinanceinterface.as_date(end_date, 'end_date')
+        return frame[mask]
+
+    def get_instrument_price_history(self, instrument, start_date, end_date=None):
+        if start_date is None:
+            return pd.DataFrame([])
+        price_history = self._between(instrument.yfinance_ticker_code, start_date, end_date).copy()
+        price_history['instrument'] = instrument
+        return price_history[['instrument', 'date', 'open', 'high', 'low', 'close', 'volume', 'stock_splits']]
+
+    def get_price_history_batch(self, instruments, start_date, end_date=None):
+        frames = []
+        for instrument in instruments:
+            price_history = self.get_instrument_price_history(instrument, start_date, end_date)
+            if not price_history.empty:
+                frames.append(price_history.assign(ticker=instrument.yfinance_ticker_code))
+        if not frames:
+            return pd.DataFrame([])
+        price_history = pd.concat(frames, ignore_index=True)
+        return price_history[['ticker', 'instrument', 'date', 'open', 'high', 'low', 'close', 'volume', 'stock_splits']]
+
+    def get_current_price(self, instrument):
+        quote = self.get_current_quotes([instrument]).get(instrument.yfinance_ticker_code)
+        return quote[0] if quote else None
+
+    def get_current_quotes(self, instruments):
+        quotes = {}
+        for instrument in instruments:
+            frame = self._between(instrument.yfinance_ticker_code, date.min, date.today())
+            if not frame.empty:
+                latest = frame.iloc[-1]
+                quotes[instrument.yfinance_ticker_code] = (
+                    convert_to_decimal(latest['close'], 16, 6),
+                    datetime.combine(latest['date'], time.min, tzinfo=UTC),
+                )
+        return quotes
+
+    def get_exchange_rate_history(self, convert_from, convert_to, start_date, end_date=None):
+        rates = self._between(f'{convert_from}{convert_to}=X', start_date, end_date)
+        return pd.DataFrame({
+            'convert_from': convert_from,
+            'convert_to': convert_to,
+            'date': rates['date'],
+            'exchange_rate_multiplier': convert_series_to_decimal(rates['close'], 16, 6),
+            'is_continuous_history': True,
+        })
+
+    def get_exchange_rate(self, convert_from, convert_to, exchange_date=None):
+        exchange_date = yfinanceinterface.as_date(exchange_date or date.today(), 'exchange_date')
+        # As with Yahoo, the first close in the three days from the date.
+        rates = self._between(f'{convert_from}{convert_to}=X', exchange_date, exchange_date + timedelta(days=2))
+        if rates.empty:
+            return None
+        return convert_to_decimal(rates['close'].iloc[0], 16, 6)
+
+    def get_current_exchange_rate(self, convert_from, convert_to):
+        rates = self._between(f'{convert_from}{convert_to}=X', date.min, date.today())
+        if rates.empty:
+            return None
+        latest = rates.iloc[-1]
+        return convert_to_decimal(latest['close'], 16, 6), datetime.combine(latest['date'], time.min, tzinfo=UTC)
+
+
+PROVIDERS = {
+    'yfinance': YFinanceProvider,
+    'file': FileProvider,
+}
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider():
+    """The provider named by MARKET_DATA_PROVIDER, created once per configuration."""
+    name = getattr(settings, 'MARKET_DATA_PROVIDER', 'yfinance')
+    directory = getattr(settings, 'MARKET_DATA_DIR', None)
+
+    with _providers_lock:
+        provider = _providers.get((name, directory))
+        if provider is None:
+            provider_class = PROVIDERS[name] if name in PROVIDERS else import_string(name)
+            if provider_class is FileProvider:
+                if not directory:
+                    raise ValueError('MARKET_DATA_DIR must be set to use the file market data provider.')
+                provider = provider_class(directory)
+            else:
+                provider = provider_class()
+            _providers[(name, directory)] = provider
+        return provider
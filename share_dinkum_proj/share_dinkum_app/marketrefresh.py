@@ -0,0 +1,110 @@
+"""Refresh market data for several accounts in one pass, with every network fetch in flight together.
+
+The refresh runs in three stages:
+
+    plan    read the database to work out what each account needs: exchange rate history and a
+            current rate for each foreign currency, and price history and quotes for each
+            instrument due. Whatever stored pairs can derive is derived here, off the network,
+            and a pair derived through a pivot waits for its legs rather than being fetched.
+    fetch   gather every request concurrently with asyncio, within the PRICE_REFRESH_WORKERS and
+            PRICE_REFRESH_RATE limits. Nothing in this stage touches the database.
+    write   store the results synchronously. Exchange rates go first, since an instrument is
+            valued at the current rate when it is saved, then prices. Pairs waiting on their
+            legs are derived again once the legs are stored.
+
+Accounts sharing a currency pair share one current rate fetch, and accounts holding the same
+ticker share one price fetch, since its history is stored once on the Security.
+"""
+
+import asyncio
+from datetime import date
+from functools import partial
+
+from share_dinkum_app import marketcache
+from share_dinkum_app import marketdata
+from share_dinkum_app import pricerefresh
+from share_dinkum_app.models import CurrentExchangeRate, ExchangeRate, Instrument
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+@marketcache.report('Market data refresh')
+def refresh_accounts(accounts, concurrency=None, rate=None, now=None):
+    """Refresh exchange rates and prices for all the accounts at once. Returns how many fetches were made."""
+    provider = marketdata.get_provider()
+    end_date = date.today()
+
+    fx_plans = []
+    fx_current = []
+    current_pairs = {}
+    start_dates = {}
+    fetches = []
+
+    for account in accounts:
+        for convert_from in account.foreign_currencies():
+            pair = (account, convert_from, account.currency)
+
+            start_date = ExchangeRate.history_start_date(*pair)
+            if start_date is not None:
+                path, _, fetch_ranges = ExchangeRate.prepare_history(*pair, start_date)
+                fx_plans.append((pair, start_date, path, fetch_ranges))
+
+            if CurrentExchangeRate.refresh_derived(*pair) is None:
+                fx_current.append(pair)
+                currencies = (str(convert_from), str(account.currency))
+                if currencies not in current_pairs:
+                    current_pairs[currencies] = len(fetches)
+                    fetches.append(partial(provider.get_current_exchange_rate, *currencies))
+
+        start_dates.update(account.plan_price_refresh(end_date, now=now))
+
+    # Pairs fetched up to today in this pass. A pair derived through a pivot whose legs are all
+    # among them is derived again after the write instead, so it is not fetched twice over.
+    refreshed_legs = set()
+    for (account, convert_from, convert_to), _, path, fetch_ranges in fx_plans:
+        currencies = (str(convert_from), str(convert_to))
+        if any(fetch_end is None for _, fetch_end in fetch_ranges) and (path is None or len(path) == 2):
+            refreshed_legs.update((currencies, currencies[::-1]))
+
+    fx_history = []
+    fx_rederive = []
+    for pair, start_date, path, fetch_ranges in fx_plans:
+        if path is not None and len(path) > 2 and all(leg in refreshed_legs for leg in zip(path, path[1:])):
+            fx_rederive.append((pair, start_date))
+            fetch_ranges = [fetch_range for fetch_range in fetch_ranges if fetch_range[1] is not None]
+        for fetch_start, fetch_end in fetch_ranges:
+            fx_history.append((pair, len(fetches)))
+            fetches.append(partial(
+                provider.get_exchange_rate_history,
+                convert_from=pair[1], convert_to=pair[2],
+                start_date=fetch_start, end_date=fetch_end,
+            ))
+
+    # Prices are planned across all the accounts, so each ticker is fetched once.
+    batches = []
+    first_price_fetch = len(fetches)
+    if start_dates:
+        batches, price_fetches = Instrument.price_refresh_fetches(start_dates, end_date)
+        fetches.extend(price_fetches)
+
+    logger.info('Refreshing market data for %s accounts with %s fetches', len(accounts), len(fetches))
+    results = asyncio.run(pricerefresh.gather_all(fetches, concurrency=concurrency, rate=rate))
+
+    for pair, index in fx_history:
+        history = results[index]
+        if history is not None and not history.empty:
+            ExchangeRate.store_history(*pair, history)
+
+    for pair, start_date in fx_rederive:
+        ExchangeRate.load_derived_history(*pair, start_date)
+
+    for account, convert_from, convert_to in fx_current:
+        quote = results[current_pairs[(str(convert_from), str(convert_to))]]
+        CurrentExchangeRate.store_quote(account=account, convert_from=convert_from, convert_to=convert_to, quote=quote)
+
+    if start_dates:
+        *batch_results, quotes = results[first_price_fetch:]
+        Instrument.store_price_refresh(start_dates, batches, batch_results, quotes, end_date)
+
+    return len(fetches)
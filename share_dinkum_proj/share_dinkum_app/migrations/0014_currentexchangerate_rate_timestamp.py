@@ -0,0 +1,18 @@
+# Generated by Django 6.1.2 on 2026-10-19 05:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('share_dinkum_app', '0013_instrumentpricehistory_instrument_date_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='currentexchangerate',
+            name='rate_timestamp',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.1.2 on 2026-10-19 06:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('share_dinkum_app', '0014_currentexchangerate_rate_timestamp'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='currentexchangerate',
+            name='derivation',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='currentexchangerate',
+            name='source',
+            field=models.CharField(choices=[('MARKET', 'Fetched from market data'), ('DERIVED', 'Derived from other stored pairs')], default='MARKET', editable=False, max_length=7),
+        ),
+        migrations.AddField(
+            model_name='exchangerate',
+            name='derivation',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='exchangerate',
+            name='source',
+            field=models.CharField(choices=[('MARKET', 'Fetched from market data'), ('DERIVED', 'Derived from other stored pairs')], default='MARKET', editable=False, max_length=7),
+        ),
+    ]
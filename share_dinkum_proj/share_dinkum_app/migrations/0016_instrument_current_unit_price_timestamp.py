@@ -0,0 +1,18 @@
+# Generated by Django 6.1.2 on 2026-10-19 06:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('share_dinkum_app', '0015_exchangerate_provenance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='instrument',
+            name='current_unit_price_timestamp',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
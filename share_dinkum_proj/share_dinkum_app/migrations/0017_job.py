@@ -0,0 +1,45 @@
+# Generated by Django 6.1.2 on 2026-10-19 06:26
+
+import django.db.models.deletion
+import share_dinkum_app.models
+import share_dinkum_app.uuid_future
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('share_dinkum_app', '0016_instrument_current_unit_price_timestamp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.UUIDField(default=share_dinkum_app.uuid_future.uuid7, editable=False, primary_key=True, serialize=False)),
+                ('legacy_id', models.CharField(blank=True, editable=False, max_length=36, null=True)),
+                ('description', models.CharField(blank=True, max_length=255, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_active', models.BooleanField(default=True, editable=False)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('task', models.CharField(editable=False, max_length=64)),
+                ('arguments', models.JSONField(blank=True, default=dict, editable=False)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', editable=False, max_length=9)),
+                ('progress', models.PositiveSmallIntegerField(default=0, editable=False, help_text='Percent complete')),
+                ('progress_message', models.CharField(blank=True, default='', editable=False, max_length=255)),
+                ('attempts', models.PositiveSmallIntegerField(default=0, editable=False)),
+                ('max_attempts', models.PositiveSmallIntegerField(default=share_dinkum_app.models.default_max_attempts, editable=False)),
+                ('run_after', models.DateTimeField(editable=False, help_text='Not started before this time')),
+                ('started_at', models.DateTimeField(blank=True, editable=False, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, editable=False, null=True)),
+                ('worker', models.CharField(blank=True, default='', editable=False, max_length=255)),
+                ('error', models.TextField(blank=True, default='', editable=False)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='share_dinkum_app.account')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='share_dinku_status_572431_idx')],
+            },
+        ),
+    ]
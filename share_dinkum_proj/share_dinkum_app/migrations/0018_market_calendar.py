@@ -0,0 +1,70 @@
+# Generated by Django 6.1.2 on 2026-10-19 06:29
+
+import django.db.models.deletion
+import share_dinkum_app.uuid_future
+from datetime import time
+
+from django.db import migrations, models
+
+from share_dinkum_app.constants import MARKET_SESSIONS
+
+
+def fill_market_sessions(apps, schema_editor):
+    Market = apps.get_model('share_dinkum_app', 'Market')
+    for market in Market.objects.filter(timezone=''):
+        session = MARKET_SESSIONS.get(market.code.upper())
+        if session:
+            market.timezone = session[0]
+            market.open_time = time.fromisoformat(session[1])
+            market.close_time = time.fromisoformat(session[2])
+            market.save(update_fields=['timezone', 'open_time', 'close_time'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('share_dinkum_app', '0017_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='market',
+            name='close_time',
+            field=models.TimeField(blank=True, help_text='Local time the market closes', null=True),
+        ),
+        migrations.AddField(
+            model_name='market',
+            name='open_time',
+            field=models.TimeField(blank=True, help_text='Local time the market opens', null=True),
+        ),
+        migrations.AddField(
+            model_name='market',
+            name='timezone',
+            field=models.CharField(blank=True, default='', help_text='IANA time zone, eg Australia/Sydney', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='market',
+            name='trading_weekdays',
+            field=models.CharField(default='01234', help_text='Days the market trades, Monday being 0', max_length=7),
+        ),
+        migrations.CreateModel(
+            name='MarketHoliday',
+            fields=[
+                ('id', models.UUIDField(default=share_dinkum_app.uuid_future.uuid7, editable=False, primary_key=True, serialize=False)),
+                ('legacy_id', models.CharField(blank=True, editable=False, max_length=36, null=True)),
+                ('description', models.CharField(blank=True, max_length=255, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_active', models.BooleanField(default=True, editable=False)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('date', models.DateField()),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='share_dinkum_app.account')),
+                ('market', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holidays', to='share_dinkum_app.market')),
+            ],
+            options={
+                'ordering': ['date'],
+                'constraints': [models.UniqueConstraint(fields=('market', 'date'), name='market_holiday_keys')],
+            },
+        ),
+        migrations.RunPython(fill_market_sessions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 6.1.2 on 2026-10-19 06:42
+
+import django.db.models.deletion
+import share_dinkum_app.uuid_future
+from django.db import migrations, models
+
+
+def copy_price_history(apps, schema_editor):
+    Instrument = apps.get_model('share_dinkum_app', 'Instrument')
+    InstrumentPriceHistory = apps.get_model('share_dinkum_app', 'InstrumentPriceHistory')
+    Security = apps.get_model('share_dinkum_app', 'Security')
+    SecurityPriceHistory = apps.get_model('share_dinkum_app', 'SecurityPriceHistory')
+
+    for instrument in Instrument.objects.select_related('market'):
+        suffix = instrument.market.suffix.replace('.', '') if instrument.market.suffix else ''
+        ticker_code = f'{instrument.name}.{suffix}' if suffix else instrument.name
+        instrument.security, _ = Security.objects.get_or_create(ticker_code=ticker_code)
+        instrument.save(update_fields=['security'])
+
+        # Accounts holding the same ticker have the same bars; the first one copied is kept.
+        rows = InstrumentPriceHistory.objects.filter(instrument=instrument).order_by('date')
+        for start in range(0, rows.count(), 2000):
+            SecurityPriceHistory.objects.bulk_create(
+                [
+                    SecurityPriceHistory(
+                        id=row.id,
+                        security=instrument.security,
+                        date=row.date,
+                        open=row.open,
+                        high=row.high,
+                        low=row.low,
+                        close=row.close,
+                        volume=row.volume,
+                        stock_splits=row.stock_splits,
+                    )
+                    for row in rows[start:start + 2000]
+                ],
+                ignore_conflicts=True,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('share_dinkum_app', '0018_market_calendar'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Security',
+            fields=[
+                ('id', models.UUIDField(default=share_dinkum_app.uuid_future.uuid7, editable=False, primary_key=True, serialize=False)),
+                ('ticker_code', models.CharField(editable=False, max_length=32, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['ticker_code'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SecurityPriceHistory',
+            fields=[
+                ('id', models.UUIDField(default=share_dinkum_app.uuid_future.uuid7, editable=False, primary_key=True, serialize=False)),
+                ('date', models.DateField(editable=False)),
+                ('open', models.DecimalField(decimal_places=6, editable=False, max_digits=16)),
+                ('high', models.DecimalField(decimal_places=6, editable=False, max_digits=16)),
+                ('low', models.DecimalField(decimal_places=6, editable=False, max_digits=16)),
+                ('close', models.DecimalField(decimal_places=6, editable=False, max_digits=16)),
+                ('volume', models.BigIntegerField(editable=False)),
+                ('stock_splits', models.DecimalField(decimal_places=6, editable=False, max_digits=16)),
+            ],
+            options={
+                'ordering': ['date'],
+            },
+        ),
+        migrations.AddField(
+            model_name='instrument',
+            name='security',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='instruments', to='share_dinkum_app.security'),
+        ),
+        migrations.AddField(
+            model_name='securitypricehistory',
+            name='security',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='share_dinkum_app.security'),
+        ),
+        migrations.AddConstraint(
+            model_name='securitypricehistory',
+            constraint=models.UniqueConstraint(fields=('security', 'date'), name='security_price_history_keys'),
+        ),
+        migrations.RunPython(copy_price_history, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='instrumentpricehistory',
+            name='instrument_date_idx',
+        ),
+        migrations.RemoveConstraint(
+            model_name='instrumentpricehistory',
+            name='instrument_price_history_keys',
+        ),
+        migrations.RemoveField(
+            model_name='instrumentpricehistory',
+            name='account',
+        ),
+        migrations.RemoveField(
+            model_name='instrumentpricehistory',
+            name='instrument',
+        ),
+        migrations.DeleteModel(
+            name='InstrumentPriceHistory',
+        ),
+    ]
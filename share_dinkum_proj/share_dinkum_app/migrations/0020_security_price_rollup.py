@@ -0,0 +1,96 @@
+# Generated by Django 6.1.2 on 2026-10-19 06:52
+
+import django.db.models.deletion
+import pandas as pd
+import share_dinkum_app.uuid_future
+from django.db import migrations, models
+
+
+# The helpers below are copies of pricerollups as it stood when this migration was written, so
+# later changes to that module cannot change what it does.
+
+COLUMNS = ['date', 'open', 'high', 'low', 'close', 'volume']
+
+ROLLUP_PERIODS = {
+    'W': 'W-SUN',
+    'M': 'M',
+}
+
+
+def aggregate(price_history, period):
+    """Weekly or monthly OHLCV rollups of daily rows, with the start and trading days of each period."""
+    frame = price_history.sort_values('date')
+    starts = pd.to_datetime(pd.Series(list(frame['date']))).dt.to_period(ROLLUP_PERIODS[period]).dt.start_time.dt.date
+    frame = frame.assign(start=starts.to_numpy())
+    rollups = frame.groupby('start', sort=True).agg(
+        date=('date', 'last'),
+        open=('open', 'first'),
+        high=('high', 'max'),
+        low=('low', 'min'),
+        close=('close', 'last'),
+        volume=('volume', 'sum'),
+        days=('date', 'size'),
+    )
+    return rollups.reset_index()
+
+
+def build_rollups(apps, schema_editor):
+    Security = apps.get_model('share_dinkum_app', 'Security')
+    SecurityPriceHistory = apps.get_model('share_dinkum_app', 'SecurityPriceHistory')
+    SecurityPriceRollup = apps.get_model('share_dinkum_app', 'SecurityPriceRollup')
+
+    for security in Security.objects.all():
+        daily = pd.DataFrame.from_records(
+            SecurityPriceHistory.objects.filter(security=security).order_by('date').values(*COLUMNS),
+            columns=COLUMNS,
+        )
+        if daily.empty:
+            continue
+        for period in ROLLUP_PERIODS:
+            SecurityPriceRollup.objects.bulk_create([
+                SecurityPriceRollup(
+                    security=security,
+                    period=period,
+                    start=row.start,
+                    date=row.date,
+                    open=row.open,
+                    high=row.high,
+                    low=row.low,
+                    close=row.close,
+                    volume=row.volume,
+                    days=row.days,
+                )
+                for row in aggregate(daily, period).itertuples(index=False)
+            ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('share_dinkum_app', '0019_security_price_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecurityPriceRollup',
+            fields=[
+                ('id', models.UUIDField(default=share_dinkum_app.uuid_future.uuid7, editable=False, primary_key=True, serialize=False)),
+                ('period', models.CharField(choices=[('W', 'Week'), ('M', 'Month')], editable=False, max_length=1)),
+                ('start', models.DateField(editable=False, help_text='First calendar day of the period')),
+                ('date', models.DateField(editable=False, help_text='Last trading day of the period')),
+                ('open', models.DecimalField(decimal_places=6, editable=False, max_digits=16)),
+                ('high', models.DecimalField(decimal_places=6, editable=False, max_digits=16)),
+                ('low', models.DecimalField(decimal_places=6, editable=False, max_digits=16)),
+                ('close', models.DecimalField(decimal_places=6, editable=False, max_digits=16)),
+                ('volume', models.BigIntegerField(editable=False)),
+                ('days', models.PositiveSmallIntegerField(editable=False, help_text='Trading days in the period')),
+                ('security', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='price_rollups', to='share_dinkum_app.security')),
+            ],
+            options={
+                'ordering': ['period', 'start'],
+                'indexes': [models.Index(fields=['security', 'period', 'date'], name='security_rollup_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('security', 'period', 'start'), name='security_price_rollup_keys')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,174 @@
+# Generated by Django 6.1.2 on 2026-10-19 06:56
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+import numpy as np
+import pandas as pd
+
+
+# The helpers below are copies of priceadjust and pricerollups as they stood when this migration
+# was written, so later changes to those modules cannot change what it does.
+
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'adjusted_close']
+
+ROLLUP_PERIODS = {
+    'W': 'W-SUN',
+    'M': 'M',
+}
+
+
+def later_factors(dates, splits):
+    """For each date, the product of the factors of the splits after it."""
+    dates = np.asarray(pd.to_datetime(pd.Series(list(dates))).to_numpy(dtype='datetime64[D]'))
+    if not splits:
+        return np.ones(len(dates))
+
+    split_dates = np.array(sorted(splits), dtype='datetime64[D]')
+    factors = np.array([float(splits[split_date]) for split_date in sorted(splits)])
+    after = np.append(np.cumprod(factors[::-1])[::-1], 1.0)
+    return after[np.searchsorted(split_dates, dates, side='right')]
+
+
+def reported_splits(price_history):
+    """{date: factor} for the split dates flagged in a frame's stock_splits column."""
+    factors = pd.to_numeric(price_history['stock_splits'], errors='coerce').fillna(0).astype('float64')
+    flagged = price_history.loc[(factors > 0) & (factors != 1), 'date']
+    return dict(zip(flagged, factors[flagged.index]))
+
+
+def restore_as_traded(price_history):
+    """Multiply back up the rows before each split that Yahoo Finance had divided by its factor."""
+    price_history = price_history.sort_values('date').reset_index(drop=True)
+    closes = pd.to_numeric(price_history['close'], errors='coerce').astype('float64').to_numpy()
+    factors = pd.to_numeric(price_history['stock_splits'], errors='coerce').fillna(0).astype('float64').to_numpy()
+
+    multiplier = np.ones(len(price_history))
+    for index in np.flatnonzero((factors > 0) & (factors != 1)):
+        if index == 0 or not closes[index] or not closes[index - 1]:
+            continue
+        move = closes[index - 1] / closes[index]
+        if abs(np.log(move)) < abs(np.log(move / factors[index])):
+            multiplier[:index] *= factors[index]
+
+    if np.all(multiplier == 1):
+        return price_history
+    prices = {
+        column: pd.to_numeric(price_history[column], errors='coerce').astype('float64') * multiplier
+        for column in ['open', 'high', 'low', 'close']
+    }
+    volume = (pd.to_numeric(price_history['volume'], errors='coerce').fillna(0) / multiplier).round()
+    return price_history.assign(**prices, volume=volume)
+
+
+def adjusted_closes(price_history, splits):
+    closes = pd.to_numeric(price_history['close'], errors='coerce').astype('float64').to_numpy()
+    return closes / later_factors(price_history['date'], splits)
+
+
+def aggregate(price_history, period):
+    """Weekly or monthly OHLCV rollups of daily rows, with the start and trading days of each period."""
+    frame = price_history.sort_values('date')
+    starts = pd.to_datetime(frame['date']).dt.to_period(ROLLUP_PERIODS[period]).dt.start_time.dt.date
+    frame = frame.assign(start=starts.to_numpy())
+    rollups = frame.groupby('start', sort=True).agg(
+        date=('date', 'last'),
+        open=('open', 'first'),
+        high=('high', 'max'),
+        low=('low', 'min'),
+        close=('close', 'last'),
+        volume=('volume', 'sum'),
+        days=('date', 'size'),
+    )
+    return rollups.reset_index()
+
+
+def to_decimals(values):
+    """A column quantised to the six decimal places of the price fields, with None for missing values."""
+    quantum = Decimal('0.000001')
+    return [
+        None if pd.isna(value) else Decimal(repr(float(value))).quantize(quantum, rounding=ROUND_HALF_UP)
+        for value in values
+    ]
+
+
+def adjust_history(apps, schema_editor):
+    Security = apps.get_model('share_dinkum_app', 'Security')
+    SecurityPriceHistory = apps.get_model('share_dinkum_app', 'SecurityPriceHistory')
+    SecurityPriceRollup = apps.get_model('share_dinkum_app', 'SecurityPriceRollup')
+    ShareSplit = apps.get_model('share_dinkum_app', 'ShareSplit')
+
+    for security in Security.objects.all():
+        stored = pd.DataFrame.from_records(
+            SecurityPriceHistory.objects.filter(security=security).order_by('date').values(
+                'id', 'date', 'open', 'high', 'low', 'close', 'volume', 'stock_splits',
+            )
+        )
+        if stored.empty:
+            continue
+
+        # History stored until now is as Yahoo Finance returned it, adjusted for the splits it knew of then.
+        history = restore_as_traded(stored)
+        restored = not history['close'].equals(stored['close'])
+        splits = {
+            share_split.date: share_split.quantity_after / share_split.quantity_before
+            for share_split in ShareSplit.objects.filter(instrument__security=security)
+            if share_split.quantity_before
+        }
+        splits.update(reported_splits(history))
+        history = history.assign(adjusted_close=adjusted_closes(history, splits))
+        history = history.assign(**{
+            column: to_decimals(history[column]) for column in PRICE_COLUMNS
+        }, volume=history['volume'].astype('int64'))
+
+        SecurityPriceHistory.objects.bulk_update(
+            [
+                SecurityPriceHistory(
+                    id=row.id,
+                    open=row.open,
+                    high=row.high,
+                    low=row.low,
+                    close=row.close,
+                    adjusted_close=row.adjusted_close,
+                    volume=row.volume,
+                )
+                for row in history.itertuples(index=False)
+            ],
+            [*PRICE_COLUMNS, 'volume'],
+            batch_size=500,
+        )
+
+        if restored:
+            SecurityPriceRollup.objects.filter(security=security).delete()
+            for period in ROLLUP_PERIODS:
+                SecurityPriceRollup.objects.bulk_create([
+                    SecurityPriceRollup(
+                        security=security,
+                        period=period,
+                        start=row.start,
+                        date=row.date,
+                        open=row.open,
+                        high=row.high,
+                        low=row.low,
+                        close=row.close,
+                        volume=row.volume,
+                        days=row.days,
+                    )
+                    for row in aggregate(history, period).itertuples(index=False)
+                ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('share_dinkum_app', '0020_security_price_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='securitypricehistory',
+            name='adjusted_close',
+            field=models.DecimalField(blank=True, decimal_places=6, editable=False, max_digits=16, null=True),
+        ),
+        migrations.RunPython(adjust_history, migrations.RunPython.noop),
+    ]
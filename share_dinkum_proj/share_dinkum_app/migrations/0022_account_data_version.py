@@ -0,0 +1,18 @@
+# Generated by Django 6.1.2 on 2026-10-19 07:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('share_dinkum_app', '0021_adjusted_close'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='data_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 6.1.2 on 2026-10-19 07:58
+
+from django.db import migrations, models
+import pandas as pd
+
+
+# A copy of how pricerollups dated periods when this migration was written, so later changes to
+# that module cannot change what it does.
+
+ROLLUP_PERIODS = {
+    'W': 'W-SUN',
+    'M': 'M',
+}
+
+
+def fill_adjusted_closes(apps, schema_editor):
+    Security = apps.get_model('share_dinkum_app', 'Security')
+    SecurityPriceHistory = apps.get_model('share_dinkum_app', 'SecurityPriceHistory')
+    SecurityPriceRollup = apps.get_model('share_dinkum_app', 'SecurityPriceRollup')
+
+    for security in Security.objects.all():
+        daily = pd.DataFrame.from_records(
+            SecurityPriceHistory.objects.filter(security=security).order_by('date').values('date', 'adjusted_close'),
+            columns=['date', 'adjusted_close'],
+        )
+        if daily.empty:
+            continue
+        for period, frequency in ROLLUP_PERIODS.items():
+            starts = pd.to_datetime(pd.Series(list(daily['date']))).dt.to_period(frequency).dt.start_time.dt.date
+            last_closes = daily.assign(start=starts.to_numpy()).groupby('start')['adjusted_close'].last()
+            rollups = list(SecurityPriceRollup.objects.filter(security=security, period=period))
+            for rollup in rollups:
+                rollup.adjusted_close = last_closes.get(rollup.start)
+            SecurityPriceRollup.objects.bulk_update(rollups, ['adjusted_close'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('share_dinkum_app', '0022_account_data_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='securitypricerollup',
+            name='adjusted_close',
+            field=models.DecimalField(blank=True, decimal_places=6, editable=False, max_digits=16, null=True),
+        ),
+        migrations.RunPython(fill_adjusted_closes, migrations.RunPython.noop),
+    ]
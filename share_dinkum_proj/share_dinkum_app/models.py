@@ -1,9 +1,15 @@
 # Standard library imports
-from datetime import date, timedelta, datetime, UTC
+from datetime import date, time, timedelta, datetime, UTC
 from decimal import Decimal, ROUND_HALF_UP
 import copy
+from functools import cached_property, partial
+from zoneinfo import ZoneInfo
+
+# Third party imports
+import pandas as pd
 
 # Django imports
+from django.conf import settings
 from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.apps import apps
@@ -21,12 +27,19 @@ from djmoney.settings import CURRENCY_CHOICES
 from djmoney.money import Money
 
 # Local app imports
-from share_dinkum_app import yfinanceinterface
-from share_dinkum_app.utils import convert_to_decimal_field
+from share_dinkum_app import dashboardcache
+from share_dinkum_app import marketdata
+from share_dinkum_app import marketcache
+from share_dinkum_app import fxservice
+from share_dinkum_app import pricerefresh
+from share_dinkum_app import priceadjust
+from share_dinkum_app import pricerollups
+from share_dinkum_app import pricestore
+from share_dinkum_app.utils import convert_to_decimal_field, convert_series_to_decimal_field, latest_before
 from share_dinkum_app.utils.currency import add_currencies
 from share_dinkum_app.utils.filefield_operations import user_directory_path
 from share_dinkum_app.decorators import safe_property
-from share_dinkum_app.constants import DEFAULT_CURRENCY
+from share_dinkum_app.constants import DEFAULT_CURRENCY, MARKET_SESSIONS
 
 
 # Local but to be replaced in future
@@ -158,6 +171,8 @@ class Account(models.Model):
     owner = models.ForeignKey(AppUser, on_delete=models.PROTECT)
     fiscal_year_type = models.ForeignKey(FiscalYearType, on_delete=models.PROTECT)
     update_price_history = models.BooleanField(default=False)
+    # Bumped whenever data the dashboard reads changes; see dashboardcache.
+    data_version = models.PositiveBigIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f'{self.description} | {self.currency}'
@@ -168,67 +183,135 @@ class Account(models.Model):
     def portfolio_value_converted(self):
         return Instrument.objects.filter(account=self, is_active=True).aggregate(models.Sum('calculated_value_held_converted'))['calculated_value_held_converted__sum'] or Money(0, self.currency)
 
+    @marketcache.report('Price history refresh')
     def update_all_price_history(self):
         """
         Update price history for instruments held in this account.
 
         Instruments with an open position are always refreshed. Instruments that have been fully
         sold continue to refresh until at least one data point exists after their final sell date.
+        Instruments due a refresh are downloaded in multi-symbol batches, fetched concurrently
+        under a shared rate limit, and only once every fetch is back is anything written, in one
+        transaction. Current prices come from one quote request made alongside.
+        """
+        end_date = date.today()
+        start_dates = self.plan_price_refresh(end_date)
+        if not start_dates:
+            return
+
+        batches, fetches = Instrument.price_refresh_fetches(start_dates, end_date)
+        *results, quotes = pricerefresh.fetch_all(fetches)
+        Instrument.store_price_refresh(start_dates, batches, results, quotes, end_date)
+
+    @marketcache.report('Price history backfill')
+    def backfill_price_history(self, now=None):
         """
-        instruments = Instrument.objects.filter(account=self, is_active=True)
+        Fetch the stretches missing from the middle or ends of each instrument's stored price history.
 
+        A regular refresh only fetches forward from the latest stored price, so holes left by a
+        failed fetch or a partial import stay. Gaps are found against each market's trading
+        calendar, and only they are fetched. Returns the number of fetches made.
+        """
+        instruments = (
+            Instrument.objects.filter(account=self, is_active=True)
+            .select_related('market', 'security')
+            .prefetch_related('market__holidays')
+        )
+
+        provider = marketdata.get_provider()
+        targets = []
+        fetches = []
         for instrument in instruments:
-            if instrument.quantity_held > 0:
-                instrument.update_price_history()
-                continue
+            for start_date, end_date in instrument.price_history_gaps(now=now):
+                targets.append(instrument)
+                fetches.append(partial(
+                    provider.get_instrument_price_history,
+                    instrument=instrument, start_date=start_date, end_date=end_date,
+                ))
+
+        if not fetches:
+            return 0
+        logger.info('Backfilling %s gaps in price history for %s', len(fetches), self)
+        results = pricerefresh.fetch_all(fetches)
 
-            last_sell_date = (
-                Sell.objects.filter(account=self, instrument=instrument)
-                .order_by('-date')
-                .values_list('date', flat=True)
-                .first()
-            )
+        with transaction.atomic():
+            for instrument, price_history in zip(targets, results):
+                if price_history is None or price_history.empty:
+                    logger.warning('No price history returned to fill a gap for %s', instrument)
+                    continue
+                try:
+                    # A savepoint each, so one gap failing does not undo the others.
+                    with transaction.atomic():
+                        instrument.security.ingest_price_history(price_history)
+                except Exception as e:
+                    logger.error(f'Error storing backfilled price history for {instrument}, {e}', exc_info=True)
+
+        return len(fetches)
+
+    def plan_price_refresh(self, end_date, now=None):
+        """{instrument: first date to fetch} for every instrument due a price refresh at now (default: the present)."""
+        instruments = (
+            Instrument.objects.filter(account=self, is_active=True)
+            .select_related('market', 'security')
+            .prefetch_related('market__holidays')
+        )
 
-            if not last_sell_date:
-                continue
+        # The last sell of each instrument, and the latest stored price of each security, in two queries.
+        last_sell_dates = latest_before(Sell.objects.filter(account=self), 'instrument_id', 'date')
+        latest_price_dates = latest_before(
+            SecurityPriceHistory.objects.filter(
+                security_id__in=Instrument.objects.filter(account=self).values('security_id'),
+            ),
+            'security_id', 'date',
+        )
 
-            has_history_after_sell = InstrumentPriceHistory.objects.filter(
-                account=self,
-                instrument=instrument,
-                date__gte=last_sell_date,
-            ).exists()
+        start_dates = {}
+        for instrument in instruments:
+            if instrument.quantity_held <= 0:
+                last_sell_date = last_sell_dates.get(instrument.pk)
 
-            if has_history_after_sell:
-                continue
+                if not last_sell_date:
+                    continue
 
-            instrument.update_price_history(end_date=date.today())
+                latest_price_date = latest_price_dates.get(instrument.security_id)
+                has_history_after_sell = latest_price_date is not None and latest_price_date >= last_sell_date
 
+                if has_history_after_sell:
+                    continue
 
-    def update_all_exchange_rate_history(self):
+            start_date = instrument.price_history_start_date(end_date, now=now)
+            if start_date is not None:
+                start_dates[instrument] = start_date
 
-        convert_to = self.currency
+        return start_dates
+
+    def foreign_currencies(self):
+        """Currencies this account has bought in, other than its own."""
         # Get distinct currencies based on the currency of  unit_price = MoneyField(max_digits=19, decimal_places=4, default_currency=DEFAULT_CURRENCY) in the Buy model
         convert_from_currencies = (
             Buy.objects.filter(account=self)
             .values_list("unit_price_currency", flat=True)
             .distinct()
         )
+        return [convert_from for convert_from in convert_from_currencies if convert_from != self.currency]
+
+    @marketcache.report('Exchange rate refresh')
+    def update_all_exchange_rate_history(self):
+
+        convert_to = self.currency
         # Update exchange rate history for each currency
-        for convert_from in convert_from_currencies:
-            if convert_from != self.currency:
-                ExchangeRate.update_exchange_rate_history(account=self, convert_from=convert_from, convert_to=self.currency)
-
-                # The staleness check in CurrentExchangeRate.get_or_create is based on updated_at,
-                # which auto_now sets whenever the row is written, not on the age of the rate itself.
-                # An import, restore or backfill therefore writes an old rate with a current timestamp
-                # and it is then treated as fresh for the next hour. Force the fetch so the current
-                # rate is genuinely current before any instrument is valued against it.
-                CurrentExchangeRate.get_or_create(
-                    account=self,
-                    convert_from=convert_from,
-                    convert_to=convert_to,
-                    force_refresh=True,
-                )
+        for convert_from in self.foreign_currencies():
+            ExchangeRate.update_exchange_rate_history(account=self, convert_from=convert_from, convert_to=self.currency)
+
+            # Request paths only ever read the stored current rate and leave refreshing it to
+            # the background. This is an explicit refresh, so fetch now: the instruments saved
+            # next are valued against whatever the current rate is at that moment.
+            CurrentExchangeRate.get_or_create(
+                account=self,
+                convert_from=convert_from,
+                convert_to=convert_to,
+                force_refresh=True,
+            )
 
     CALCULATED_FIELDS = frozenset({
         'calculated_portfolio_value_converted',
@@ -246,6 +329,13 @@ class Account(models.Model):
         update_fields = kwargs.get('update_fields')
         if update_fields is not None:
             kwargs['update_fields'] = set(update_fields) | self.CALCULATED_FIELDS
+        elif not self._state.adding:
+            # data_version only ever moves on through dashboardcache.bump's UPDATE. Writing it from
+            # an instance loaded before a bump would put the old version back.
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'data_version'
+            ]
 
         user = kwargs.pop('user', None)
         super().save(*args, **kwargs)
@@ -324,6 +414,17 @@ class AbstractExchangeRate(models.Model): # Not using BaseModel as doesn't need
     convert_from = CurrencyField(default=DEFAULT_CURRENCY, choices=CURRENCY_CHOICES)
     exchange_rate_multiplier = models.DecimalField(max_digits=16, decimal_places=6, default=Decimal('1.0'))
 
+    SOURCE_MARKET = 'MARKET'
+    SOURCE_DERIVED = 'DERIVED'
+    SOURCE_CHOICES = (
+        (SOURCE_MARKET, 'Fetched from market data'),
+        (SOURCE_DERIVED, 'Derived from other stored pairs'),
+    )
+
+    source = models.CharField(max_length=7, choices=SOURCE_CHOICES, default=SOURCE_MARKET, editable=False)
+    # For derived rates, the currencies converted through, e.g. GBP>USD>AUD.
+    derivation = models.CharField(max_length=32, blank=True, default='', editable=False)
+
     def apply(self, money):
         assert str(money.currency) == str(self.convert_from), (
             f'Invalid exchange rate applied. The convert_from currency {self.convert_from} '
@@ -355,16 +456,30 @@ class AbstractExchangeRate(models.Model): # Not using BaseModel as doesn't need
                     convert_to=self.convert_to,
                 ).first()
 
+        # A daily close carries no time of its own, so it is dated from the start of its day.
+        rate_timestamp = getattr(self, 'rate_timestamp', None)
+        if rate_timestamp is None and hasattr(self, 'date'):
+            rate_timestamp = datetime.combine(self.date, time.min, tzinfo=UTC)
+
         current, created = CurrentExchangeRate.objects.get_or_create(
             account=self.account,
             convert_from=self.convert_from,
             convert_to=self.convert_to,
-            defaults={'exchange_rate_multiplier': self.exchange_rate_multiplier},
+            defaults={
+                'exchange_rate_multiplier': self.exchange_rate_multiplier,
+                'rate_timestamp': rate_timestamp,
+                'source': self.source,
+                'derivation': self.derivation,
+            },
         )
 
-        if not created:
+        # A live quote taken since this day's close is newer than the close itself.
+        if not created and not (current.rate_timestamp and rate_timestamp and current.rate_timestamp > rate_timestamp):
             current.exchange_rate_multiplier = self.exchange_rate_multiplier
-            current.save(update_fields=["exchange_rate_multiplier", "updated_at"])
+            current.rate_timestamp = rate_timestamp
+            current.source = self.source
+            current.derivation = self.derivation
+            current.save(update_fields=["exchange_rate_multiplier", "rate_timestamp", "source", "derivation", "updated_at"])
 
         return current
     
@@ -388,45 +503,146 @@ class CurrentExchangeRate(AbstractExchangeRate):
         ]
 
 
+    # Older than this and a read schedules a background refresh. The stored rate is still served.
+    MAX_AGE = timedelta(hours=1)
+
+    # Market time of the quote. updated_at only says when the row was last written, which an
+    # import or a backfill does with rates that may be days old.
+    rate_timestamp = models.DateTimeField(null=True, blank=True, editable=False)
+
+    @property
+    def age(self):
+        if self.rate_timestamp is None:
+            return None
+        return datetime.now(UTC) - self.rate_timestamp
+
+    @property
+    def is_stale(self):
+        age = self.age
+        return age is None or age > self.MAX_AGE
+
     @classmethod
     def get_or_create(cls, account, convert_from, convert_to, force_refresh=False):
         """
-        Get the current exchange rate. If missing, stale (>1hr), or force_refresh=True,
-        update history and refresh latest value.
+        Get the current exchange rate without waiting on the network.
+
+        A stale rate is returned as it is and refreshed in the background. A missing rate is seeded
+        from the latest stored history. With no history at all there is nothing to return yet: the
+        rate is fetched in the background and None returned. force_refresh=True always fetches,
+        and is meant for explicit refreshes rather than request paths.
         """
+        if force_refresh:
+            return cls.refresh(account=account, convert_from=convert_from, convert_to=convert_to)
+
         obj = cls.objects.filter(
             account=account,
             convert_from=convert_from,
             convert_to=convert_to,
         ).first()
 
-        needs_refresh = (
-            force_refresh
-            or obj is None
-            or (obj.updated_at < datetime.now(UTC) - timedelta(hours=1))
-        )
+        if obj is None:
+            latest = fxservice.get_series(account, convert_from, convert_to).as_of(date.today())
+            if latest is None:
+                fxservice.schedule_current_rate_refresh(account, convert_from, convert_to)
+                return None
 
-        if needs_refresh:
-            exchange_rate_multiplier = yfinanceinterface.get_exchange_rate(
-                convert_from=convert_from, convert_to=convert_to, exchange_date=None
+            latest_date, multiplier = latest
+            obj, _ = cls.objects.get_or_create(
+                account=account,
+                convert_from=convert_from,
+                convert_to=convert_to,
+                defaults={
+                    'exchange_rate_multiplier': multiplier,
+                    'rate_timestamp': datetime.combine(latest_date, time.min, tzinfo=UTC),
+                },
             )
-            if exchange_rate_multiplier is not None:
-                obj, _ = cls.objects.update_or_create(
-                    account=account,
-                    convert_from=convert_from,
-                    convert_to=convert_to,
-                    defaults={"exchange_rate_multiplier": exchange_rate_multiplier},
-                )
-            else:
-                logger.warning(
-                    "Could not fetch exchange rate for %s to %s; keeping existing rate if any.",
-                    convert_from, convert_to,
-                )
-                if obj is None:
-                    return None
+
+        if obj.is_stale:
+            fxservice.schedule_current_rate_refresh(account, convert_from, convert_to)
 
         return obj
 
+    @classmethod
+    def refresh(cls, account, convert_from, convert_to):
+        """Bring the rate up to date now. Keeps and returns the existing rate if that fails.
+
+        Fresh rates already fetched for other pairs are tried first, and the quote is only fetched
+        when no pair or pivot leads to this one.
+        """
+        derived = cls.refresh_derived(account=account, convert_from=convert_from, convert_to=convert_to)
+        if derived is not None:
+            return derived
+
+        quote = marketdata.get_provider().get_current_exchange_rate(convert_from=convert_from, convert_to=convert_to)
+        return cls.store_quote(account=account, convert_from=convert_from, convert_to=convert_to, quote=quote)
+
+    @classmethod
+    def refresh_derived(cls, account, convert_from, convert_to):
+        """Update the rate from fresh rates of other pairs. Returns None, changing nothing, if none lead here."""
+        derived = fxservice.derive_current_rate(convert_from, convert_to, account=account)
+        if derived is None:
+            return None
+
+        path, exchange_rate_multiplier, rate_timestamp = derived
+        field = cls._meta.get_field('exchange_rate_multiplier')
+        obj, _ = cls.objects.update_or_create(
+            account=account,
+            convert_from=convert_from,
+            convert_to=convert_to,
+            defaults={
+                "exchange_rate_multiplier": convert_to_decimal_field(exchange_rate_multiplier, field),
+                "rate_timestamp": rate_timestamp,
+                "source": cls.SOURCE_DERIVED,
+                "derivation": fxservice.describe_path(path),
+            },
+        )
+        return obj
+
+    @classmethod
+    def store_quote(cls, account, convert_from, convert_to, quote):
+        """Store a (multiplier, quote_time) fetched quote. With no quote, keeps and returns the existing rate."""
+        if quote is not None:
+            exchange_rate_multiplier, rate_timestamp = quote
+            obj, _ = cls.objects.update_or_create(
+                account=account,
+                convert_from=convert_from,
+                convert_to=convert_to,
+                defaults={
+                    "exchange_rate_multiplier": exchange_rate_multiplier,
+                    "rate_timestamp": rate_timestamp,
+                    "source": cls.SOURCE_MARKET,
+                    "derivation": '',
+                },
+            )
+            return obj
+
+        logger.warning(
+            "Could not fetch exchange rate for %s to %s; keeping existing rate if any.",
+            convert_from, convert_to,
+        )
+        return cls.objects.filter(
+            account=account,
+            convert_from=convert_from,
+            convert_to=convert_to,
+        ).first()
+
+    @classmethod
+    def refresh_stale(cls, settled_after=None):
+        """
+        Refresh every stored rate that has gone stale. Returns how many were refreshed.
+
+        While the currency market is shut, a rate quoted after it closed (settled_after) is as new
+        as any there is, however old, and is left alone.
+        """
+        refreshed = 0
+        for current in cls.objects.select_related('account'):
+            if settled_after is not None and current.rate_timestamp and current.rate_timestamp >= settled_after:
+                continue
+            if current.is_stale:
+                cls.refresh(account=current.account, convert_from=current.convert_from, convert_to=current.convert_to)
+                refreshed += 1
+        return refreshed
+
 
 class ExchangeRate(AbstractExchangeRate):
     MODEL_DESCRIPTION = 'Exchange rates between pairs of currencies at particular dates.'
@@ -442,6 +658,10 @@ class ExchangeRate(AbstractExchangeRate):
     date = models.DateField()
     is_continuous_history = models.BooleanField(default=False, editable=False)
 
+    # Derived history ending this close to the date wanted is as current as the legs allow:
+    # a weekend and a market holiday.
+    DERIVED_HISTORY_MAX_LAG = timedelta(days=3)
+
     @classmethod
     def get_or_create(cls, account, convert_from, convert_to, exchange_date):
         try:
@@ -452,6 +672,12 @@ class ExchangeRate(AbstractExchangeRate):
                 date=exchange_date
             )
         except cls.DoesNotExist:
+            # Inside the fetched history a missing date is a day the market was shut, so the
+            # nearest prior trading day is the answer and there is nothing to download. Read it
+            # before the placeholder row below exists, or the lookup would find the placeholder.
+            series = fxservice.get_series(account, convert_from, convert_to)
+            stored_rate = series.rate_as_of(exchange_date) if series.covers(exchange_date) else None
+
             # Ensure the record is created if it does not exist
             obj, created = cls.objects.get_or_create(
                 account=account,
@@ -462,14 +688,25 @@ class ExchangeRate(AbstractExchangeRate):
             )
             if created:
                 field = cls._meta.get_field('exchange_rate_multiplier')
-                fetched_rate = yfinanceinterface.get_exchange_rate(
-                    convert_from=convert_from,
-                    convert_to=convert_to,
-                    exchange_date=exchange_date,
-                )
+
+                derived = None
+                if stored_rate is not None:
+                    fetched_rate = stored_rate
+                else:
+                    derived = fxservice.derive_rate(convert_from, convert_to, exchange_date)
+                    if derived is not None:
+                        path, fetched_rate = derived
+                        obj.source = cls.SOURCE_DERIVED
+                        obj.derivation = fxservice.describe_path(path)
+                    else:
+                        fetched_rate = marketdata.get_provider().get_exchange_rate(
+                            convert_from=convert_from,
+                            convert_to=convert_to,
+                            exchange_date=exchange_date,
+                        )
                 if fetched_rate is not None:
                     obj.exchange_rate_multiplier = convert_to_decimal_field(fetched_rate, field)
-                    obj.save(update_fields=['exchange_rate_multiplier'])
+                    obj.save(update_fields=['exchange_rate_multiplier', 'source', 'derivation'])
                 elif convert_from != convert_to:
                     # A failed cross-currency fetch must NOT keep the 1.0 default - that
                     # relabels foreign amounts as base currency (e.g. USD shown as AUD).
@@ -502,68 +739,162 @@ class ExchangeRate(AbstractExchangeRate):
     @classmethod
     def update_exchange_rate_history(cls, account, convert_from, convert_to):
 
-        if convert_from == convert_to:
+        start_date = cls.history_start_date(account=account, convert_from=convert_from, convert_to=convert_to)
+        if start_date is None:
             return
-        
-        start_date = None
+
+        return cls.load_history(account=account, convert_from=convert_from, convert_to=convert_to, start_date=start_date)
+
+    @classmethod
+    def history_start_date(cls, account, convert_from, convert_to):
+        """The date a refresh of this pair's history starts from, or None if the account needs none."""
+
+        if convert_from == convert_to:
+            return None
 
         # Fetch the latest price history entry for the related instrument
         latest_continuous_exchange_rate = ExchangeRate.objects.filter(account=account, convert_from=convert_from, convert_to=convert_to, is_continuous_history=True).order_by('-date').first()
         if latest_continuous_exchange_rate:
-            start_date = latest_continuous_exchange_rate.date
+            return latest_continuous_exchange_rate.date
 
-        if not start_date:
-            earliest_buy = Buy.objects.filter(account=account).order_by('date').first()
-            if earliest_buy:
-                start_date = earliest_buy.date
-            else:
-                return  # No buys, so no need to fetch exchange rates
-            
-        try:
+        earliest_buy = Buy.objects.filter(account=account).order_by('date').first()
+        if earliest_buy:
+            return earliest_buy.date
+        return None  # No buys, so no need to fetch exchange rates
 
-            price_history = yfinanceinterface.get_exchange_rate_history(convert_from=convert_from, convert_to=convert_to, start_date=start_date)
+    @classmethod
+    def load_history(cls, account, convert_from, convert_to, start_date, end_date=None):
+        """
+        Fetch one continuous history for a pair and bulk insert it, keeping any rows already stored.
 
-            field = cls._meta.get_field('exchange_rate_multiplier')
-            price_history['exchange_rate_multiplier'] = price_history['exchange_rate_multiplier'].apply(
-                lambda val: convert_to_decimal_field(val, field)
-            )
+        The history is derived from pairs already stored where it can be, and fetched only for
+        whatever the derivation could not reach. Returns the latest rate inserted, or None if
+        nothing could be fetched.
+        """
+        _, latest, fetch_ranges = cls.prepare_history(account, convert_from, convert_to, start_date, end_date)
 
-            price_history['account'] = account
-            price_history['id'] = price_history['date'].apply(lambda x : uuid7())
-            
-            # Bulk insert/update price history
-            price_history_entries = []
-            for _, row in price_history.iterrows():
-                price_history_entries.append(
-                    ExchangeRate(
-                        **row.to_dict()
-                    )
+        for fetch_start, fetch_end in fetch_ranges:
+            try:
+                price_history = marketdata.get_provider().get_exchange_rate_history(
+                    convert_from=convert_from,
+                    convert_to=convert_to,
+                    start_date=fetch_start,
+                    end_date=fetch_end,
                 )
+                stored = cls.store_history(account, convert_from, convert_to, price_history)
+                if stored is not None and (latest is None or stored.date >= latest.date):
+                    latest = stored
 
-            # Use bulk_create with `ignore_conflicts=True` to avoid duplicate errors
-            with transaction.atomic():
-                ExchangeRate.objects.bulk_create(price_history_entries, ignore_conflicts=True)
+            except Exception as e:
+                logger.error(f'Error getting exchange rate history for {convert_from} to {convert_to}, {e}', exc_info=True)
+        return latest
 
-            if not price_history.empty:
-                latest_row = price_history.loc[price_history['date'].idxmax()]
-                latest_multiplier = convert_to_decimal_field(
-                    latest_row['exchange_rate_multiplier'],
-                    field
-                )
-                latest = ExchangeRate(
-                    id=latest_row['id'],
-                    account=latest_row['account'],
-                    convert_from=latest_row['convert_from'],
-                    convert_to=latest_row['convert_to'],
-                    date=latest_row['date'],
-                    exchange_rate_multiplier=latest_multiplier
-                )
-                latest.update_current()
-                return latest
+    @classmethod
+    def prepare_history(cls, account, convert_from, convert_to, start_date, end_date=None):
+        """
+        Store the history that stored pairs can derive, and work out what is left to fetch.
 
+        Returns (derivation path or None, latest derived rate or None, list of (start, end) date
+        ranges still to fetch). An end of None runs to the latest rate available. Nothing is
+        fetched where the pair's history, derived or not, already reaches.
+        """
+        path, derived = cls.load_derived_history(account, convert_from, convert_to, start_date, end_date)
+        if path is None:
+            return None, None, [(start_date, end_date)]
+
+        # The stored legs may cover only part of the range wanted, so fetch either side directly.
+        series = fxservice.get_series(account, convert_from, convert_to)
+        if series.continuous_start is None:
+            return path, derived, [(start_date, end_date)]
+        fetch_ranges = []
+        if series.continuous_start > start_date + cls.DERIVED_HISTORY_MAX_LAG:
+            fetch_ranges.append((start_date, series.continuous_start - timedelta(days=1)))
+        if series.continuous_end < (end_date or date.today()) - cls.DERIVED_HISTORY_MAX_LAG:
+            fetch_ranges.append((series.continuous_end, end_date))
+        return path, derived, fetch_ranges
 
-        except Exception as e:
-            logger.error(f'Error getting exchange rate history for {convert_from} to {convert_to}, {e}', exc_info=True)
+    @classmethod
+    def store_history(cls, account, convert_from, convert_to, price_history):
+        """Bulk insert a fetched history, keeping any rows already stored. Returns the latest rate, or None if empty."""
+
+        field = cls._meta.get_field('exchange_rate_multiplier')
+        price_history = price_history.assign(
+            exchange_rate_multiplier=convert_series_to_decimal_field(price_history['exchange_rate_multiplier'], field),
+        ).dropna(subset=['exchange_rate_multiplier'])
+        if 'is_continuous_history' not in price_history.columns:
+            price_history['is_continuous_history'] = False
+
+        price_history_entries = [
+            ExchangeRate(
+                id=uuid7(),
+                account=account,
+                convert_from=row.convert_from,
+                convert_to=row.convert_to,
+                date=row.date,
+                exchange_rate_multiplier=row.exchange_rate_multiplier,
+                is_continuous_history=row.is_continuous_history,
+            )
+            for row in price_history[
+                ['convert_from', 'convert_to', 'date', 'exchange_rate_multiplier', 'is_continuous_history']
+            ].itertuples(index=False)
+        ]
+
+        # Use bulk_create with `ignore_conflicts=True` to avoid duplicate errors
+        with transaction.atomic():
+            ExchangeRate.objects.bulk_create(
+                price_history_entries, ignore_conflicts=True, batch_size=settings.PRICE_HISTORY_INSERT_BATCH_SIZE,
+            )
+        fxservice.invalidate(account=account, convert_from=convert_from, convert_to=convert_to)
+        dashboardcache.bump(account.pk)
+
+        if price_history_entries:
+            latest = max(price_history_entries, key=lambda entry: entry.date)
+            latest.update_current()
+            return latest
+
+    @classmethod
+    def load_derived_history(cls, account, convert_from, convert_to, start_date, end_date=None):
+        """
+        Derive history for a pair from stored pairs and bulk insert the dates not already held.
+
+        Returns (derivation path, latest rate inserted). The path is None if stored pairs cannot
+        derive this one, and the rate is None if the path gives no dates not already held.
+        """
+        derived = fxservice.derive_history(convert_from, convert_to, start_date, end_date)
+        if derived is None:
+            return None, None
+
+        path, rows = derived
+        held = set(fxservice.get_series(account, convert_from, convert_to).dates)
+        field = cls._meta.get_field('exchange_rate_multiplier')
+        derivation = fxservice.describe_path(path)
+
+        entries = [
+            cls(
+                account=account,
+                convert_from=convert_from,
+                convert_to=convert_to,
+                date=row_date,
+                exchange_rate_multiplier=convert_to_decimal_field(multiplier, field),
+                is_continuous_history=True,
+                source=cls.SOURCE_DERIVED,
+                derivation=derivation,
+            )
+            for row_date, multiplier in rows
+            if row_date not in held
+        ]
+        if not entries:
+            return path, None
+
+        with transaction.atomic():
+            cls.objects.bulk_create(entries, ignore_conflicts=True)
+        fxservice.invalidate(account=account, convert_from=convert_from, convert_to=convert_to)
+        dashboardcache.bump(account.pk)
+        logger.info('Derived %s exchange rates for %s to %s via %s', len(entries), convert_from, convert_to, derivation)
+
+        latest = entries[-1]
+        latest.update_current()
+        return path, latest
 
 
 
@@ -579,6 +910,187 @@ class Market(BaseModel):
 
     suffix = models.CharField(max_length=16, null=True, blank=True)
 
+    # Trading hours, in the market's own time zone. Filled in from MARKET_SESSIONS for known codes.
+    timezone = models.CharField(max_length=64, blank=True, default='', help_text='IANA time zone, eg Australia/Sydney')
+    open_time = models.TimeField(null=True, blank=True, help_text='Local time the market opens')
+    close_time = models.TimeField(null=True, blank=True, help_text='Local time the market closes')
+    trading_weekdays = models.CharField(max_length=7, default='01234', help_text='Days the market trades, Monday being 0')
+
+    def save(self, *args, **kwargs):
+        session = MARKET_SESSIONS.get((self.code or '').upper())
+        if session and not self.timezone:
+            self.timezone = session[0]
+            self.open_time = self.open_time or time.fromisoformat(session[1])
+            self.close_time = self.close_time or time.fromisoformat(session[2])
+        super().save(*args, **kwargs)
+
+    @property
+    def zone(self):
+        """The market's time zone, or UTC if it has none."""
+        return ZoneInfo(self.timezone) if self.timezone else UTC
+
+    @cached_property
+    def holiday_dates(self):
+        """Dates in the calendar on which the market is closed. Read once per instance."""
+        return {holiday.date for holiday in self.holidays.all()}
+
+    def is_trading_day(self, day):
+        return str(day.weekday()) in self.trading_weekdays and day not in self.holiday_dates
+
+    def previous_trading_day(self, day):
+        """The last trading day before day. Looks back at most a month, for a calendar with no trading days."""
+        for offset in range(1, 32):
+            candidate = day - timedelta(days=offset)
+            if self.is_trading_day(candidate):
+                return candidate
+        return day - timedelta(days=1)
+
+    def trading_days(self, start_date, end_date):
+        """Every trading day from start_date to end_date inclusive."""
+        days = []
+        day = start_date
+        while day <= end_date:
+            if self.is_trading_day(day):
+                days.append(day)
+            day += timedelta(days=1)
+        return days
+
+    def is_open(self, now=None):
+        """True during a trading session. A market without hours is taken to trade all day on trading days."""
+        local = (now or datetime.now(UTC)).astimezone(self.zone)
+        if not self.is_trading_day(local.date()):
+            return False
+        open_time = self.open_time or time.min
+        close_time = self.close_time or time.max
+        return open_time <= local.time().replace(tzinfo=None) < close_time
+
+    def latest_session(self, now=None):
+        """The date of the latest session that has closed, which is the newest complete daily bar there can be."""
+        local = (now or datetime.now(UTC)).astimezone(self.zone)
+        close_time = self.close_time or time.max
+        if self.is_trading_day(local.date()) and local.time().replace(tzinfo=None) >= close_time:
+            return local.date()
+        return self.previous_trading_day(local.date())
+
+    def is_closed_since(self, last_date, now=None):
+        """True if no session has opened or closed since the bar for last_date, so there is nothing new to fetch."""
+        return not self.is_open(now) and self.latest_session(now) <= last_date
+
+
+class MarketHoliday(BaseModel):
+    MODEL_DESCRIPTION = 'Days on which a market is closed, other than its weekends.'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['market', 'date'], name='market_holiday_keys')
+        ]
+        ordering = ['date']
+
+    market = models.ForeignKey(Market, on_delete=models.CASCADE, related_name='holidays')
+    date = models.DateField()
+
+    def __str__(self):
+        return f'{self.market.code} | {self.date.isoformat()} | {self.description or "Holiday"}'
+
+
+class Security(models.Model):
+    MODEL_DESCRIPTION = 'Market securities by Yahoo Finance ticker, with price history shared by every account holding them.'
+
+    class Meta:
+        ordering = ['ticker_code']
+
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    ticker_code = models.CharField(max_length=32, unique=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True, editable=False)
+
+    def __str__(self):
+        return self.ticker_code
+
+    @classmethod
+    def for_ticker(cls, ticker_code):
+        security, _ = cls.objects.get_or_create(ticker_code=ticker_code)
+        return security
+
+    def ingest_price_history(self, price_history, split_adjusted=True):
+        """
+        Store fetched daily bars (date plus the price columns) for this security.
+
+        Rows without a close are dropped, and a bar for a date already held replaces it, since it
+        may have been taken mid-session. split_adjusted=False is for bars already as traded, such
+        as those in an export. Returns False if there was no valid close to store.
+        """
+        # Drop rows with null close prices (yfinance sometimes returns NaN for recent dates)
+        price_history = price_history[pd.to_numeric(price_history['close'], errors='coerce').notna()]
+        if price_history.empty:
+            logger.warning('No valid close prices for %s', self)
+            return False
+
+        # Yahoo Finance divides prices before each split it knows of by the split's factor. Store
+        # them as traded, and the close adjusted for every split, ShareSplit records included.
+        reported = priceadjust.reported_stored_splits(self.pk)
+        fetched = priceadjust.reported_splits(price_history)
+        new_split = bool(fetched.keys() - reported.keys())
+        reported.update(fetched)
+        if split_adjusted:
+            price_history = priceadjust.as_traded(price_history, reported)
+        price_history = price_history.assign(adjusted_close=priceadjust.adjusted_closes(
+            price_history, {**priceadjust.recorded_splits(self.pk), **reported},
+        ))
+
+        # Quantise each column in one pass, rather than cell by cell.
+        price_history = price_history.assign(**{
+            column: convert_series_to_decimal_field(
+                price_history[column], SecurityPriceHistory._meta.get_field(column)
+            )
+            for column in ['open', 'high', 'low', 'close', 'adjusted_close', 'stock_splits']
+        }, volume=pd.to_numeric(price_history['volume'], errors='coerce').fillna(0).astype('int64'))
+
+        price_history_entries = [
+            SecurityPriceHistory(
+                id=uuid7(),
+                security=self,
+                date=row.date,
+                open=row.open,
+                high=row.high,
+                low=row.low,
+                close=row.close,
+                adjusted_close=row.adjusted_close,
+                volume=row.volume,
+                stock_splits=row.stock_splits,
+            )
+            for row in price_history[
+                ['date', 'open', 'high', 'low', 'close', 'adjusted_close', 'volume', 'stock_splits']
+            ].itertuples(index=False)
+        ]
+
+        with transaction.atomic():
+            SecurityPriceHistory.objects.bulk_create(
+                price_history_entries,
+                update_conflicts=True,
+                unique_fields=['security', 'date'],
+                update_fields=['open', 'high', 'low', 'close', 'adjusted_close', 'volume', 'stock_splits'],
+                batch_size=settings.PRICE_HISTORY_INSERT_BATCH_SIZE,
+            )
+            if new_split:
+                # Every earlier close now has a new adjusted value, and so every rollup.
+                priceadjust.rebuild(self.pk)
+                transaction.on_commit(partial(pricestore.evict, self.pk))
+            else:
+                pricerollups.update(self.pk, price_history['date'])
+                # Only once the rows are committed, so the columnar copy never holds rows the table lacks.
+                transaction.on_commit(partial(pricestore.write, self.pk, price_history))
+            dashboardcache.bump_for_securities([self.pk])
+
+        return True
+
+    def price_series(self, start_date, end_date, max_points=None, resolution=None):
+        """
+        Prices from start_date to end_date, daily, weekly or monthly: resolution, or the finest that fits within max_points.
+
+        Returns (resolution, frame), as pricerollups.read.
+        """
+        return pricerollups.read(self.pk, start_date, end_date, max_points=max_points, resolution=resolution)
+
 
 class Instrument(BaseModel):
     MODEL_DESCRIPTION = 'Share codes, eg BHP, VGS, VAS, etc'
@@ -592,7 +1104,11 @@ class Instrument(BaseModel):
     description = models.CharField(max_length=255, blank=True)
     currency = CurrencyField(default=DEFAULT_CURRENCY, choices=CURRENCY_CHOICES)
     market = models.ForeignKey(Market, on_delete=models.PROTECT)
+    # The market series behind this instrument, shared with every other account holding the ticker.
+    security = models.ForeignKey(Security, on_delete=models.PROTECT, null=True, blank=True, editable=False, related_name='instruments')
     current_unit_price = models.DecimalField(max_digits=16, decimal_places=4, blank=True, null=True)
+    # Market time of current_unit_price: the quote time, or the start of the day of a closing price.
+    current_unit_price_timestamp = models.DateTimeField(null=True, blank=True, editable=False)
 
     calculated_quantity_held = models.DecimalField(max_digits=16, decimal_places=4, blank=True, null=True, editable=False)
     
@@ -649,12 +1165,9 @@ class Instrument(BaseModel):
         )
 
         if not current_rate:
-            logger.error(f'No exchange rate available for {self.currency} to {self.account.currency}')
-            logger.error(f'Instrument: {self}, Account: {self.account}, Currency: {self.currency}')
-            
-            raise ValueError(
-                f"No exchange rate available for {self.currency} to {self.account.currency}"
-            )
+            # The rate is being fetched in the background; the value is unknown until it arrives.
+            logger.warning(f'No exchange rate yet for {self.currency} to {self.account.currency} to value {self}')
+            return None
 
         converted_value = current_rate.apply(self.value_held)
         assert isinstance(converted_value, Money), f'Converted value held is not a Money instance: {converted_value}'
@@ -663,6 +1176,9 @@ class Instrument(BaseModel):
 
     @safe_property
     def yfinance_ticker_code(self):
+        return self.ticker_code()
+
+    def ticker_code(self):
         
         suffix = self.market.suffix
         
@@ -672,47 +1188,119 @@ class Instrument(BaseModel):
         else:
             return self.name
 
+    def save(self, *args, **kwargs):
+        ticker_code = self.ticker_code()
+        if self.security_id is None or self.security.ticker_code != ticker_code:
+            self.security = Security.for_ticker(ticker_code)
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'security'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         if self.is_active:
             return f'{self.name} - {self.description} [{self.account.description}]'
         else:
             return f'{self.name} - {self.description} (INACTIVE)'
 
-    def update_price_history(self, end_date=None):
+    def price_history_start_date(self, end_date, now=None):
         """
-        Refresh price history data for this instrument up to the supplied end_date.
+        First date to fetch so that the security's stored price history runs up to end_date, or None if no fetch is due.
 
-        When no end_date is provided the current date is used. The fetch always rewinds a few days
-        from the most recent stored price to account for weekends or suspensions.
+        Another account may already hold the series: history is fetched from this instrument's
+        first buy only if the series does not reach back that far. Otherwise nothing is due while
+        the market has stayed closed since the most recent stored price, as over a weekend or
+        holiday in its calendar, and the fetch starts from that price, to replace a bar stored
+        before its session ended.
         """
-        end_date = end_date or date.today()
-
-        latest_price_history = (
-            InstrumentPriceHistory.objects.filter(instrument=self)
-            .order_by('-date')
+        stored = SecurityPriceHistory.objects.filter(security_id=self.security_id).aggregate(
+            first=models.Min('date'), latest=models.Max('date'),
+        )
+        earliest_buy = (
+            Buy.objects.filter(instrument=self)
+            .order_by('date')
+            .values_list('date', flat=True)
             .first()
         )
 
-        if latest_price_history:
-            start_date = latest_price_history.date - timedelta(days=4)
-            if start_date > end_date:
-                start_date = end_date
+        # Backfill only if the market traded between the first buy and the first stored price.
+        reaches_back = stored['latest'] and (
+            earliest_buy is None
+            or earliest_buy >= stored['first']
+            or not self.market.trading_days(earliest_buy, stored['first'] - timedelta(days=1))
+        )
+        if reaches_back:
+            if self.market.is_closed_since(stored['latest'], now=now):
+                return None
+            start_date = min(stored['latest'], end_date)
+        elif earliest_buy:
+            start_date = earliest_buy
         else:
-            earliest_buy = (
-                Buy.objects.filter(instrument=self)
-                .order_by('date')
-                .first()
-            )
-            if earliest_buy:
-                start_date = earliest_buy.date
-            else:
-                start_date = date(2020, 1, 1)
+            start_date = date(2020, 1, 1)
 
         if start_date > end_date:
+            return None
+        return start_date
+
+    def price_history_coverage(self, end_date=None, now=None):
+        """
+        Trading days the security's stored price history should cover for this instrument, and those it lacks.
+
+        Coverage runs from the first buy to the latest closed session, or to the last sell once the
+        holding is sold, against the market's calendar. Returns (trading_days, missing_days), both
+        sorted, and both empty for an instrument never bought.
+        """
+        first_buy = Buy.objects.filter(instrument=self).aggregate(first=models.Min('date'))['first']
+        if first_buy is None:
+            return [], []
+
+        end_date = min(end_date or date.today(), self.market.latest_session(now))
+        if self.quantity_held <= 0:
+            last_sell = Sell.objects.filter(instrument=self).aggregate(last=models.Max('date'))['last']
+            if last_sell:
+                end_date = min(end_date, last_sell)
+
+        trading_days = self.market.trading_days(first_buy, end_date)
+        if not trading_days:
+            return [], []
+        stored = set(
+            SecurityPriceHistory.objects.filter(
+                security_id=self.security_id, date__range=(trading_days[0], trading_days[-1]),
+            ).values_list('date', flat=True)
+        )
+        return trading_days, [day for day in trading_days if day not in stored]
+
+    def price_history_gaps(self, end_date=None, now=None):
+        """
+        The missing stretches of price history, as (start_date, end_date) pairs to fetch.
+
+        Gaps separated by no more than PRICE_BACKFILL_MERGE_DAYS stored trading days are fetched
+        as one, refetching the days between, so a patchy series takes a few requests, not one per hole.
+        """
+        trading_days, missing_days = self.price_history_coverage(end_date, now=now)
+        position = {day: index for index, day in enumerate(trading_days)}
+
+        gaps = []
+        for day in missing_days:
+            if gaps and position[day] - position[gaps[-1][1]] - 1 <= settings.PRICE_BACKFILL_MERGE_DAYS:
+                gaps[-1][1] = day
+            else:
+                gaps.append([day, day])
+        return [tuple(gap) for gap in gaps]
+
+    def update_price_history(self, end_date=None):
+        """
+        Refresh price history data for this instrument up to the supplied end_date.
+
+        When no end_date is provided the current date is used. To refresh several instruments,
+        Account.update_all_price_history fetches them all in one request.
+        """
+        end_date = end_date or date.today()
+        start_date = self.price_history_start_date(end_date)
+        if start_date is None:
             return
 
         try:
-            price_history = yfinanceinterface.get_instrument_price_history(
+            price_history = marketdata.get_provider().get_instrument_price_history(
                 instrument=self,
                 start_date=start_date,
                 end_date=end_date,
@@ -721,75 +1309,137 @@ class Instrument(BaseModel):
                 logger.warning('No price history returned for %s between %s and %s', self, start_date, end_date)
                 return
 
-            decimal_fields = {
-                field_name: InstrumentPriceHistory._meta.get_field(field_name)
-                for field_name in ['open', 'high', 'low', 'close', 'stock_splits']
-            }
-            for column, field in decimal_fields.items():
-                price_history[column] = price_history[column].apply(
-                    lambda val: convert_to_decimal_field(val, field)
-                )
-
-            price_history['account'] = self.account
-            price_history['id'] = price_history['date'].apply(lambda x: uuid7())
+            quote = marketdata.get_provider().get_current_quotes([self]).get(self.yfinance_ticker_code)
+            self.ingest_price_history(price_history, quote=quote)
 
-            # Drop rows with null close prices (yfinance sometimes returns NaN for recent dates)
-            price_history = price_history.dropna(subset=['close'])
-            if price_history.empty:
-                logger.warning('No valid close prices for %s between %s and %s', self, start_date, end_date)
-                return
+        except Exception as e:
+            logger.error(f'Error getting price history for {self} between {start_date} and {end_date}, {e}', exc_info=True)
 
-            instrument_price_field = self._meta.get_field('current_unit_price')
+    def ingest_price_history(self, price_history, quote=None):
+        """
+        Store fetched price history for this instrument's security and update its current price.
 
-            # Try current price first, fall back to last valid close
-            current_price = yfinanceinterface.get_current_price(self)
-            if current_price is not None:
-                self.current_unit_price = convert_to_decimal_field(current_price, instrument_price_field)
-            elif not price_history.empty:
-                self.current_unit_price = convert_to_decimal_field(
-                    price_history['close'].iloc[-1],
-                    instrument_price_field
-                )
-            self.save()
+        Returns False if there was no valid close to store.
+        """
+        if not self.security.ingest_price_history(price_history):
+            return False
+        self.update_current_price(price_history, quote=quote)
+        return True
 
-            price_history_entries = []
-            for _, row in price_history.iterrows():
-                price_history_entries.append(
-                    InstrumentPriceHistory(
-                        **row.to_dict()
-                    )
-                )
+    def update_current_price(self, price_history, quote=None):
+        """
+        Set the current price from quote, a (price, quote_time) pair from get_current_quotes, or
+        without one from the last valid close in price_history.
+        """
+        instrument_price_field = self._meta.get_field('current_unit_price')
 
-            with transaction.atomic():
-                InstrumentPriceHistory.objects.bulk_create(price_history_entries, ignore_conflicts=True)
+        # Try current price first, fall back to last valid close
+        if quote is not None:
+            current_price, self.current_unit_price_timestamp = quote
+            self.current_unit_price = convert_to_decimal_field(current_price, instrument_price_field)
+        else:
+            closes = price_history[pd.to_numeric(price_history['close'], errors='coerce').notna()]
+            if closes.empty:
+                return
+            latest_close = closes.loc[closes['date'].idxmax()]
+            self.current_unit_price = convert_to_decimal_field(latest_close['close'], instrument_price_field)
+            self.current_unit_price_timestamp = datetime.combine(latest_close['date'], time.min, tzinfo=UTC)
+        self.save()
 
-        except Exception as e:
-            logger.error(f'Error getting price history for {self} between {start_date} and {end_date}, {e}', exc_info=True)
+    @classmethod
+    def price_refresh_fetches(cls, start_dates, end_date):
+        """
+        Split the instruments in a plan into download batches and build the fetches for them.
 
+        The plan may span accounts. Each ticker is fetched once, for the instrument holding it
+        that needs the most history. Returns (batches, fetches): one no-argument fetch per batch,
+        then one for the current quotes of every ticker. The fetches never touch the database, so
+        they can run on any thread; everything they read (the ticker code, via market) is loaded
+        by the plan.
+        """
+        by_ticker = {}
+        for instrument in sorted(start_dates, key=start_dates.get):
+            by_ticker.setdefault(instrument.yfinance_ticker_code, instrument)
+
+        # Batch instruments with similar start dates together, so an instrument with years of
+        # history to fetch does not drag a batch of up-to-date ones back with it.
+        due = list(by_ticker.values())
+        batch_size = settings.PRICE_REFRESH_BATCH_SIZE
+        batches = [due[i:i + batch_size] for i in range(0, len(due), batch_size)]
+
+        provider = marketdata.get_provider()
+        fetches = [
+            partial(
+                provider.get_price_history_batch,
+                instruments=batch,
+                start_date=min(start_dates[instrument] for instrument in batch),
+                end_date=end_date,
+            )
+            for batch in batches
+        ]
+        # Live prices for every instrument come from one lightweight quote request alongside.
+        fetches.append(partial(provider.get_current_quotes, due))
+        return batches, fetches
 
+    @classmethod
+    def store_price_refresh(cls, start_dates, batches, results, quotes, end_date):
+        """Write the fetched batches and quotes of a price refresh, in one transaction: each security's history once, and every instrument's current price."""
+        quotes = quotes or {}
+
+        fetched = {}
+        for batch, price_history in zip(batches, results):
+            if price_history is None or price_history.empty:
+                logger.warning('No price history returned for %s instruments', len(batch))
+                continue
+            for ticker_code, rows in price_history.groupby('ticker', sort=False):
+                fetched[ticker_code] = rows.drop_duplicates('date')
 
-class InstrumentPriceHistory(models.Model):
-    MODEL_DESCRIPTION = 'Price history for instruments.'
+        stored_securities = set()
+        with transaction.atomic():
+            for instrument, start_date in start_dates.items():
+                ticker_code = instrument.yfinance_ticker_code
+                rows = fetched.get(ticker_code)
+                # The download starts at the earliest date in the batch; the rest is not new.
+                rows = None if rows is None else rows[rows['date'] >= start_date]
+                if rows is None or rows.empty:
+                    logger.warning('No price history returned for %s between %s and %s', instrument, start_date, end_date)
+                    continue
+                try:
+                    # A savepoint each, so one instrument failing does not undo the others.
+                    with transaction.atomic():
+                        if instrument.security_id in stored_securities:
+                            instrument.update_current_price(rows, quote=quotes.get(ticker_code))
+                        else:
+                            # The first instrument on a security stores its series for every account.
+                            instrument.ingest_price_history(fetched[ticker_code], quote=quotes.get(ticker_code))
+                            stored_securities.add(instrument.security_id)
+                except Exception as e:
+                    logger.error(f'Error storing price history for {instrument}, {e}', exc_info=True)
+
+
+
+class SecurityPriceHistory(models.Model):
+    MODEL_DESCRIPTION = 'Daily price history for securities, stored once per ticker and shared by every account.'
     class Meta:
         constraints = [
-            models.UniqueConstraint(fields=['account', 'instrument', 'date'], name='instrument_price_history_keys')
-        ]
-        indexes = [
-            models.Index(fields=['account', 'instrument', 'date'], name='instrument_date_idx')
+            models.UniqueConstraint(fields=['security', 'date'], name='security_price_history_keys')
         ]
         ordering = ['date'] 
 
     id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
-    account = models.ForeignKey(Account, on_delete=models.PROTECT, editable=False)
-    instrument = models.ForeignKey(Instrument, on_delete=models.CASCADE,  editable=False)
+    security = models.ForeignKey(Security, on_delete=models.CASCADE, editable=False, related_name='price_history')
     date = models.DateField(editable=False)
     open = models.DecimalField(max_digits=16, decimal_places=6, editable=False)
     high = models.DecimalField(max_digits=16, decimal_places=6, editable=False)
     low = models.DecimalField(max_digits=16, decimal_places=6, editable=False)
     close = models.DecimalField(max_digits=16, decimal_places=6, editable=False)
+    # The close divided by the factors of the splits after this date, on the same basis as today's price.
+    adjusted_close = models.DecimalField(max_digits=16, decimal_places=6, null=True, blank=True, editable=False)
     volume = models.BigIntegerField(editable=False)
     stock_splits = models.DecimalField(max_digits=16, decimal_places=6, editable=False)
 
+    def __str__(self):
+        return f'{self.security} | {self.date.isoformat()} | {self.close}'
 
     def get_absolute_url(self):
         # Redirect stuff to admin
@@ -798,6 +1448,42 @@ class InstrumentPriceHistory(models.Model):
         return reverse(f'admin:{app_label}_{model_name}_change', args=[str(self.id)])
 
 
+class SecurityPriceRollup(models.Model):
+    MODEL_DESCRIPTION = 'Weekly and monthly price history for securities, aggregated from the daily history as it is stored.'
+
+    PERIOD_WEEK = pricerollups.RESOLUTION_WEEK
+    PERIOD_MONTH = pricerollups.RESOLUTION_MONTH
+    PERIOD_CHOICES = (
+        (PERIOD_WEEK, 'Week'),
+        (PERIOD_MONTH, 'Month'),
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['security', 'period', 'start'], name='security_price_rollup_keys')
+        ]
+        indexes = [
+            models.Index(fields=['security', 'period', 'date'], name='security_rollup_date_idx')
+        ]
+        ordering = ['period', 'start']
+
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    security = models.ForeignKey(Security, on_delete=models.CASCADE, editable=False, related_name='price_rollups')
+    period = models.CharField(max_length=1, choices=PERIOD_CHOICES, editable=False)
+    start = models.DateField(editable=False, help_text='First calendar day of the period')
+    date = models.DateField(editable=False, help_text='Last trading day of the period')
+    open = models.DecimalField(max_digits=16, decimal_places=6, editable=False)
+    high = models.DecimalField(max_digits=16, decimal_places=6, editable=False)
+    low = models.DecimalField(max_digits=16, decimal_places=6, editable=False)
+    close = models.DecimalField(max_digits=16, decimal_places=6, editable=False)
+    adjusted_close = models.DecimalField(max_digits=16, decimal_places=6, null=True, blank=True, editable=False)
+    volume = models.BigIntegerField(editable=False)
+    days = models.PositiveSmallIntegerField(editable=False, help_text='Trading days in the period')
+
+    def __str__(self):
+        return f'{self.security} | {self.get_period_display()} of {self.start.isoformat()} | {self.close}'
+
+
 class Trade(BaseModel):
     MODEL_DESCRIPTION = 'A base class for trades, such as buys and sells.'
 
@@ -1316,6 +2002,39 @@ class Income(BaseModel):
         fiscal_year, _ = self.account.fiscal_year_type.classify_date(input_date=self.date)
         return fiscal_year
 
+    # The safe_property giving the income's total; subclasses name theirs.
+    TOTAL_PROPERTY = None
+
+    @classmethod
+    def totals_by_fiscal_year(cls, account, start_date=None, end_date=None):
+        """
+        An account's active income totalled by fiscal year, paid from start_date to end_date, in one query.
+
+        Returns [{'fiscal_year', 'start_year', 'name', 'total'}] ordered by start year. Totals come
+        from the persisted calculated columns: the total converted to the account's currency, or
+        as paid where there was no conversion.
+        """
+        rows = cls.objects.filter(account=account, is_active=True, calculated_fiscal_year__isnull=False)
+        if start_date is not None:
+            rows = rows.filter(date__gte=start_date)
+        if end_date is not None:
+            rows = rows.filter(date__lte=end_date)
+
+        total = Coalesce(
+            F(f'calculated_{cls.TOTAL_PROPERTY}_converted'),
+            F(f'calculated_{cls.TOTAL_PROPERTY}'),
+            output_field=models.DecimalField(max_digits=19, decimal_places=6),
+        )
+        return list(
+            rows.values(
+                fiscal_year=F('calculated_fiscal_year'),
+                start_year=F('calculated_fiscal_year__start_year'),
+                name=F('calculated_fiscal_year__name'),
+            )
+            .annotate(total=Sum(total))
+            .order_by('start_year')
+        )
+
     def save(self, *args, **kwargs):
         if self.is_active:
             # TODO include total income somehow
@@ -1330,6 +2049,7 @@ class Income(BaseModel):
 
 class Dividend(Income):
     MODEL_DESCRIPTION = 'Dividends, including local dividends and foreign dividends.'
+    TOTAL_PROPERTY = 'total_dividend'
 
     DIVIDEND_TYPE_CHOICES = (
         ('LOCAL', 'Local dividend'),
@@ -1394,6 +2114,7 @@ class Dividend(Income):
 
 class Distribution(Income):
     MODEL_DESCRIPTION = 'Distributions, such as the income received from ETFs'
+    TOTAL_PROPERTY = 'total_distribution'
     distribution_amount_per_share = MoneyField(max_digits=19, decimal_places=6, default_currency=DEFAULT_CURRENCY, default=Decimal('0'))
     total_withholding_tax = MoneyField(max_digits=19, decimal_places=6, default_currency=DEFAULT_CURRENCY, default=Decimal('0'))
 
@@ -1422,4 +2143,56 @@ class DataExport(BaseModel):
 
     def __str__(self):
         return f'{self.created_at.date().isoformat()} | Data Export - {self.account.description}'
+
+
+def default_max_attempts():
+    return settings.JOB_MAX_ATTEMPTS
+
+
+class Job(BaseModel):
+    MODEL_DESCRIPTION = 'Background jobs, such as account refreshes and data exports, with their status and progress.'
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    task = models.CharField(max_length=64, editable=False)
+    arguments = models.JSONField(default=dict, blank=True, editable=False)
+    status = models.CharField(max_length=9, choices=STATUS_CHOICES, default=STATUS_QUEUED, editable=False)
+    progress = models.PositiveSmallIntegerField(default=0, editable=False, help_text='Percent complete')
+    progress_message = models.CharField(max_length=255, blank=True, default='', editable=False)
+    attempts = models.PositiveSmallIntegerField(default=0, editable=False)
+    max_attempts = models.PositiveSmallIntegerField(default=default_max_attempts, editable=False)
+    run_after = models.DateTimeField(editable=False, help_text='Not started before this time')
+    started_at = models.DateTimeField(null=True, blank=True, editable=False)
+    finished_at = models.DateTimeField(null=True, blank=True, editable=False)
+    worker = models.CharField(max_length=255, blank=True, default='', editable=False)
+    error = models.TextField(blank=True, default='', editable=False)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return f'{self.task} | {self.get_status_display()} | {self.progress}%'
+
+    def save(self, *args, **kwargs):
+        if self.run_after is None:
+            self.run_after = datetime.now(UTC)
+        super().save(*args, **kwargs)
+
+    def set_progress(self, progress, message=''):
+        """Record how far through the job is, in percent. Written straight to the row, without signals."""
+        self.progress = max(0, min(100, int(progress)))
+        self.progress_message = message[:255]
+        Job.objects.filter(pk=self.pk).update(progress=self.progress, progress_message=self.progress_message)
     
\ No newline at end of file
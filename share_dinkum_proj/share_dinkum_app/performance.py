@@ -0,0 +1,251 @@
+"""Returns, volatility and drawdown of each instrument and of the whole account.
+
+Everything is computed from two date x instrument matrices: the daily value of each holding, from
+dashboardseries, and the daily net cash flow into it, built here from buys (money in), sells and
+income (money out), all in the account's currency. The account itself is one more column, the sum
+of the others, so every metric for every instrument and the account comes out of the same array
+operations at once, rather than a loop per instrument.
+
+- Time-weighted return chains each day's return, so it measures the holdings and not the timing
+  of money in and out. Money in counts from the start of its day, so a purchase earns that day's
+  move; money out counts at the end of its day, so a sale or payment is part of that day's return.
+- Money-weighted return is the annual rate at which the cash flows, with the value at the end as a
+  final inflow, have a net present value of zero (XIRR). It is solved by Newton's method for every
+  column together.
+- Volatility is the annualised standard deviation of daily returns over a rolling window, as at
+  the last day. Prices are carried forward over weekends and holidays, so their returns are zero
+  and a calendar-day year keeps the annualisation consistent.
+- Maximum drawdown is the largest fall of the time-weighted growth of 1 from its running peak.
+
+Prices are as traded, not lowered for later dividends, so income is counted once: as the cash flow
+it is paid as.
+
+The first day of a range is the opening position: its value is taken as invested at the start and
+its own flows are part of that value. compute() works on plain arrays so it can be tested and
+benchmarked without a database; build() loads an account's data and calls it.
+"""
+
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from share_dinkum_app import pricerollups
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+DAYS_PER_YEAR = 365
+VOLATILITY_WINDOW_DAYS = 90
+
+XIRR_GUESS = 0.1
+XIRR_ITERATIONS = 100
+XIRR_TOLERANCE = 1e-9
+
+TOTAL_LABEL = 'Total'
+
+
+class Performance:
+    """Metrics by column: one per instrument, then the account total. NaN where a metric is undefined."""
+
+    def __init__(self, labels, time_weighted, money_weighted, volatility, max_drawdown):
+        self.labels = labels
+        self.time_weighted = time_weighted
+        self.money_weighted = money_weighted
+        self.volatility = volatility
+        self.max_drawdown = max_drawdown
+
+    def rows(self):
+        """A dict per column, with None for NaN so it serialises as JSON null."""
+        metrics = {
+            'time_weighted': self.time_weighted,
+            'money_weighted': self.money_weighted,
+            'volatility': self.volatility,
+            'max_drawdown': self.max_drawdown,
+        }
+        return [
+            {
+                'label': label,
+                'is_total': column == len(self.labels) - 1,
+                **{
+                    name: None if np.isnan(values[column]) else round(float(values[column]), 6)
+                    for name, values in metrics.items()
+                },
+            }
+            for column, label in enumerate(self.labels)
+        ]
+
+
+def daily_returns(values, flows):
+    """
+    Each day's return of each column, from value and net inflow matrices. The first row is 0.
+
+    Inflows count from the start of the day and outflows at its end. A day starting with nothing
+    held and nothing put in has a return of 0.
+    """
+    opening = values[:-1] + np.maximum(flows[1:], 0)
+    closing = values[1:] - np.minimum(flows[1:], 0)
+    returns = np.divide(closing, opening, out=np.ones_like(closing), where=opening > 0) - 1
+    return np.vstack([np.zeros((1, values.shape[1])), returns])
+
+
+def time_weighted_returns(returns):
+    return np.prod(1 + returns, axis=0) - 1
+
+
+def max_drawdowns(returns):
+    """The largest fall from a running peak of each column's growth, as a negative fraction."""
+    growth = np.cumprod(1 + returns, axis=0)
+    return np.min(growth / np.maximum.accumulate(growth, axis=0) - 1, axis=0)
+
+
+def rolling_volatility(returns, window=VOLATILITY_WINDOW_DAYS):
+    """Annualised standard deviation of daily returns over each trailing window, one row per window end."""
+    if len(returns) < window:
+        return np.full((0, returns.shape[1]), np.nan)
+    windows = np.lib.stride_tricks.sliding_window_view(returns, window, axis=0)
+    return windows.std(axis=-1, ddof=1) * np.sqrt(DAYS_PER_YEAR)
+
+
+def xirr(years, cash_flows):
+    """
+    The annual rate setting each column's net present value to zero, NaN where there is none.
+
+    years is the time of each row in years from the first; cash_flows is rows x columns, money
+    paid out negative. Newton's method runs on every column together.
+    """
+    # Only days with a cash flow in some column contribute.
+    rows = np.flatnonzero(np.any(cash_flows != 0, axis=1))
+    years, cash_flows = years[rows, None], cash_flows[rows]
+
+    rate = np.full(cash_flows.shape[1], XIRR_GUESS)
+    # A column with no rate diverges; it is left to overflow and reported as NaN below.
+    with np.errstate(over='ignore', divide='ignore', invalid='ignore'):
+        for _ in range(XIRR_ITERATIONS):
+            discount = (1 + rate) ** -years
+            npv = np.sum(cash_flows * discount, axis=0)
+            slope = np.sum(-years * cash_flows * discount / (1 + rate), axis=0)
+            step = np.divide(npv, slope, out=np.zeros_like(npv), where=slope != 0)
+            rate = np.maximum(rate - step, -0.9999)
+            if np.all(np.abs(step) < XIRR_TOLERANCE):
+                break
+
+        npv = np.sum(cash_flows * (1 + rate) ** -years, axis=0)
+    # A rate exists only with money both in and out, and must have brought the NPV to zero.
+    solved = (
+        np.any(cash_flows < 0, axis=0)
+        & np.any(cash_flows > 0, axis=0)
+        & np.isfinite(rate)
+        & (np.abs(npv) <= 1e-6 * np.maximum(np.sum(np.abs(cash_flows), axis=0), 1))
+    )
+    return np.where(solved, rate, np.nan)
+
+
+def compute(dates, values, flows, labels, window=VOLATILITY_WINDOW_DAYS):
+    """
+    Performance of each column of value and net inflow matrices (dates x instruments), and of their total.
+
+    labels name the instrument columns; the total is added as the last.
+    """
+    values = np.column_stack([values, values.sum(axis=1)])
+    flows = np.column_stack([flows, flows.sum(axis=1)])
+    flows[0] = 0
+
+    returns = daily_returns(values, flows)
+    volatility = rolling_volatility(returns, window)
+
+    # The investor's side of the flows: the opening value and inflows paid, outflows and the closing value received.
+    cash_flows = -flows
+    cash_flows[0] -= values[0]
+    cash_flows[-1] += values[-1]
+    years = (dates - dates[0]).days.to_numpy() / DAYS_PER_YEAR
+
+    return Performance(
+        labels=[*labels, TOTAL_LABEL],
+        time_weighted=time_weighted_returns(returns),
+        money_weighted=xirr(years, cash_flows),
+        volatility=volatility[-1] if len(volatility) else np.full(values.shape[1], np.nan),
+        max_drawdown=max_drawdowns(returns),
+    )
+
+
+def daily_flows(dates, flows, instrument_ids):
+    """A dates x instruments matrix of net inflows, from a frame of instrument_id, date and amount."""
+    if flows.empty:
+        return np.zeros((len(dates), len(instrument_ids)))
+    totals = flows.pivot_table(index='date', columns='instrument_id', values='amount', aggfunc='sum')
+    totals.index = pd.DatetimeIndex(totals.index)
+    return totals.reindex(index=dates, columns=instrument_ids).fillna(0.0).to_numpy()
+
+
+def _amounts(frame, converted, fallback):
+    """A column in the account's currency where it was converted, as paid otherwise, as floats."""
+    return pd.to_numeric(frame[converted].fillna(frame[fallback]), errors='coerce').astype('float64')
+
+
+def cash_flows(account):
+    """
+    Net inflows into each holding as a frame of instrument_id, date and amount, in the account's currency.
+
+    Buys cost their price and brokerage; sells return their proceeds and income is paid out.
+    Amounts are the persisted calculated columns, falling back to the amounts as traded.
+    """
+    from share_dinkum_app.models import Buy, Distribution, Dividend, Sell
+
+    columns = ['instrument_id', 'date', 'amount']
+    frames = []
+
+    buys = pd.DataFrame.from_records(
+        Buy.objects.filter(account=account, is_active=True).values(
+            'instrument_id', 'date', 'quantity', 'unit_price', 'calculated_unit_price_converted',
+            'total_brokerage', 'calculated_total_brokerage_converted',
+        )
+    )
+    if not buys.empty:
+        cost = (
+            buys['quantity'].astype('float64') * _amounts(buys, 'calculated_unit_price_converted', 'unit_price')
+            + _amounts(buys, 'calculated_total_brokerage_converted', 'total_brokerage')
+        )
+        frames.append(buys.assign(amount=cost)[columns])
+
+    sells = pd.DataFrame.from_records(
+        Sell.objects.filter(account=account, is_active=True).values(
+            'instrument_id', 'date', 'quantity', 'unit_price', 'total_brokerage', 'calculated_proceeds',
+        )
+    )
+    if not sells.empty:
+        as_traded = sells['quantity'].astype('float64') * sells['unit_price'].astype('float64') - sells['total_brokerage'].astype('float64')
+        proceeds = pd.to_numeric(sells['calculated_proceeds'], errors='coerce').astype('float64').fillna(as_traded)
+        frames.append(sells.assign(amount=-proceeds)[columns])
+
+    for model in (Dividend, Distribution):
+        converted, total = f'calculated_{model.TOTAL_PROPERTY}_converted', f'calculated_{model.TOTAL_PROPERTY}'
+        income = pd.DataFrame.from_records(
+            model.objects.filter(account=account, is_active=True).values('instrument_id', 'date', converted, total)
+        )
+        if not income.empty:
+            frames.append(income.assign(amount=-_amounts(income, converted, total).fillna(0.0))[columns])
+
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+def build(account, series, start_date=None, end_date=None):
+    """
+    The performance of an account's holdings from start_date to end_date, or None with nothing to measure.
+
+    series is the account's dashboardseries.DashboardSeries. The day before start_date is the
+    opening position.
+    """
+    if series is None:
+        return None
+    window = series.window(
+        start_date - timedelta(days=1) if start_date else None, end_date, resolution=pricerollups.RESOLUTION_DAY,
+    )
+    if len(window.dates) < 2:
+        return None
+
+    flows = daily_flows(window.dates, cash_flows(account), window.instrument_ids)
+    return compute(window.dates, window.values, flows, window.labels)
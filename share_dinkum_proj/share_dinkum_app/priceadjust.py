@@ -0,0 +1,162 @@
+"""Split-adjusted prices for security price history.
+
+SecurityPriceHistory stores prices as traded: a share that split 2 for 1 halves in price on the
+split date. That is what a holding was worth on each day, but a chart or a return computed from it
+shows a cliff at every split. So each row also stores adjusted_close, its close divided by the
+factors of every split after it, which puts the whole series on today's basis.
+
+Split factors come from the stock_splits column Yahoo Finance reports on each split date, and from
+the ShareSplit records of any account holding the security. The adjusted closes are computed as
+rows are stored, and computed again for the whole series, with its rollups, only when a new split
+appears.
+
+Yahoo Finance returns history already adjusted for the splits it knows of, so fetched rows are
+put back on the as-traded basis as they are stored (see as_traded).
+"""
+
+from decimal import Decimal
+import math
+
+import numpy as np
+import pandas as pd
+
+from share_dinkum_app import pricerollups
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def later_factors(dates, splits):
+    """
+    For each date, the product of the factors of the splits after it.
+
+    splits is {date: factor}. A split's own date is already on the post-split basis, so a split
+    only counts for dates before it. Returns a float64 array.
+    """
+    dates = np.asarray(pd.to_datetime(pd.Series(list(dates))).to_numpy(dtype='datetime64[D]'))
+    if not splits:
+        return np.ones(len(dates))
+
+    split_dates = np.array(sorted(splits), dtype='datetime64[D]')
+    factors = np.array([float(splits[split_date]) for split_date in sorted(splits)])
+    # after[i] is the product of the factors of splits i onwards, with 1 for none.
+    after = np.append(np.cumprod(factors[::-1])[::-1], 1.0)
+    return after[np.searchsorted(split_dates, dates, side='right')]
+
+
+def reported_splits(price_history):
+    """{date: factor} for the split dates flagged in a frame's stock_splits column."""
+    factors = pd.to_numeric(price_history['stock_splits'], errors='coerce').fillna(0).astype('float64')
+    flagged = price_history.loc[(factors > 0) & (factors != 1), 'date']
+    return dict(zip(flagged, factors[flagged.index]))
+
+
+def as_traded(price_history, splits):
+    """
+    A fetched frame put back on the as-traded basis, undoing the adjustment for splits after each row.
+
+    splits should hold every split Yahoo Finance knows of, the frame's own and those already stored.
+    """
+    factors = later_factors(price_history['date'], splits)
+    if np.all(factors == 1):
+        return price_history
+    prices = {
+        column: pd.to_numeric(price_history[column], errors='coerce') * factors
+        for column in ['open', 'high', 'low', 'close']
+    }
+    volume = (pd.to_numeric(price_history['volume'], errors='coerce').fillna(0) / factors).round()
+    return price_history.assign(**prices, volume=volume)
+
+
+def restore_as_traded(price_history):
+    """
+    Put stored history back on the as-traded basis where it was stored as Yahoo Finance adjusted it.
+
+    A series fetched after a split has the rows before it already divided by its factor, so the
+    price barely moves across the split date, where as traded it moves by about the factor. Rows
+    before a split where the move is nearer 1 than the factor are multiplied back up. For history
+    stored before prices were kept as traded.
+    """
+    price_history = price_history.sort_values('date').reset_index(drop=True)
+    closes = pd.to_numeric(price_history['close'], errors='coerce').astype('float64').to_numpy()
+    factors = pd.to_numeric(price_history['stock_splits'], errors='coerce').fillna(0).astype('float64').to_numpy()
+
+    multiplier = np.ones(len(price_history))
+    for index in np.flatnonzero((factors > 0) & (factors != 1)):
+        if index == 0 or not closes[index] or not closes[index - 1]:
+            continue
+        move = closes[index - 1] / closes[index]
+        if abs(np.log(move)) < abs(np.log(move / factors[index])):
+            multiplier[:index] *= factors[index]
+
+    if np.all(multiplier == 1):
+        return price_history
+    prices = {
+        column: pd.to_numeric(price_history[column], errors='coerce').astype('float64') * multiplier
+        for column in ['open', 'high', 'low', 'close']
+    }
+    volume = (pd.to_numeric(price_history['volume'], errors='coerce').fillna(0) / multiplier).round()
+    return price_history.assign(**prices, volume=volume)
+
+
+def adjusted_closes(price_history, splits):
+    """The closes of a frame on the as-traded basis, adjusted for every split after each row, as floats."""
+    closes = pd.to_numeric(price_history['close'], errors='coerce').astype('float64').to_numpy()
+    return closes / later_factors(price_history['date'], splits)
+
+
+def reported_stored_splits(security_id):
+    """{date: factor} for the splits of a security flagged in its stored history, as Yahoo Finance reported them."""
+    from share_dinkum_app.models import SecurityPriceHistory
+
+    return dict(
+        SecurityPriceHistory.objects.filter(security_id=security_id)
+        .exclude(stock_splits=0)
+        .exclude(stock_splits=1)
+        .values_list('date', 'stock_splits')
+    )
+
+
+def recorded_splits(security_id):
+    """{date: factor} for the splits recorded as a ShareSplit by any account holding a security."""
+    from share_dinkum_app.models import ShareSplit
+
+    return {
+        share_split.date: share_split.quantity_after / share_split.quantity_before
+        for share_split in ShareSplit.objects.filter(instrument__security_id=security_id)
+        if share_split.quantity_before
+    }
+
+
+def stored_splits(security_id):
+    """{date: factor} for every split of a security: those Yahoo Finance reported, over any recorded as a ShareSplit."""
+    return {**recorded_splits(security_id), **reported_stored_splits(security_id)}
+
+
+def rebuild(security_id):
+    """
+    Compute adjusted_close afresh for a security's whole series, and its rollups. Returns the number of splits.
+
+    Rows between one split and the next share a factor, so this is one update per split.
+    """
+    from django.db.models import F, Value
+    from share_dinkum_app.models import SecurityPriceHistory
+
+    splits = stored_splits(security_id)
+    split_dates = sorted(splits)
+    rows = SecurityPriceHistory.objects.filter(security_id=security_id)
+
+    # Rows from each split date up to the next are divided by the factors of the splits after that.
+    bounds = [None, *split_dates]
+    for index, lower in enumerate(bounds):
+        factor = math.prod(Decimal(splits[split_date]) for split_date in split_dates[index:])
+        stretch = rows
+        if lower is not None:
+            stretch = stretch.filter(date__gte=lower)
+        if index < len(split_dates):
+            stretch = stretch.filter(date__lt=split_dates[index])
+        stretch.update(adjusted_close=F('close') / Value(factor) if factor != 1 else F('close'))
+    pricerollups.rebuild(security_id)
+
+    logger.info('Rebuilt adjusted closes for security %s with %s splits', security_id, len(splits))
+    return len(splits)
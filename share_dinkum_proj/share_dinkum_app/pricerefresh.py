@@ -0,0 +1,103 @@
+"""Concurrent, rate-limited fetching of market data.
+
+Fetches run on a bounded thread pool and share one token bucket, so a large refresh overlaps its
+network waits without bursting past what Yahoo will tolerate. Only the fetches run on the pool:
+callers write the results to the database themselves afterwards, on their own thread, where the
+connection and the transaction belong.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+from django.conf import settings
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _try_take(self):
+        """Take a token if one is available. Returns 0, or how long to wait before trying again."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Take a token, waiting until one is available."""
+        while wait := self._try_take():
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Take a token, waiting on the event loop until one is available."""
+        while wait := self._try_take():
+            await asyncio.sleep(wait)
+
+
+def fetch_all(fetches, workers=None, rate=None):
+    """
+    Call each of the no-argument callables in fetches on a thread pool and return their results in order.
+
+    Every call first takes a token from a bucket shared by the whole run. A fetch that raises gives
+    None in its place and is logged, so one bad ticker does not lose the rest of the refresh.
+    Workers and rate default to the PRICE_REFRESH_WORKERS and PRICE_REFRESH_RATE settings. The
+    callables must not touch the database.
+    """
+    fetches = list(fetches)
+    if not fetches:
+        return []
+
+    workers = workers or settings.PRICE_REFRESH_WORKERS
+    bucket = TokenBucket(rate or settings.PRICE_REFRESH_RATE)
+
+    def run(fetch):
+        bucket.acquire()
+        try:
+            return fetch()
+        except Exception as e:
+            logger.error(f'Market data fetch failed: {e}', exc_info=True)
+            return None
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(fetches)), thread_name_prefix='price-refresh') as executor:
+        return list(executor.map(run, fetches))
+
+
+async def gather_all(fetches, concurrency=None, rate=None):
+    """
+    The asyncio counterpart of fetch_all: await every fetch concurrently and return results in order.
+
+    At most `concurrency` fetches are in flight at once, each starting only when the shared bucket
+    allows. The fetches are ordinary blocking callables and run in threads, so the same rules
+    apply: they must not touch the database.
+    """
+    fetches = list(fetches)
+    semaphore = asyncio.Semaphore(concurrency or settings.PRICE_REFRESH_WORKERS)
+    bucket = TokenBucket(rate or settings.PRICE_REFRESH_RATE)
+
+    async def run(fetch):
+        async with semaphore:
+            await bucket.acquire_async()
+            try:
+                return await asyncio.to_thread(fetch)
+            except Exception as e:
+                logger.error(f'Market data fetch failed: {e}', exc_info=True)
+                return None
+
+    return await asyncio.gather(*(run(fetch) for fetch in fetches))
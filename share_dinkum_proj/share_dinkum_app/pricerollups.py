@@ -0,0 +1,165 @@
+"""Weekly and monthly OHLC rollups of security price history, for long-range reads.
+
+SecurityPriceHistory holds a row per trading day, so fifteen years of one security is nearly 4,000
+rows. SecurityPriceRollup holds the same series by week and by month: the first open, highest
+high, lowest low and last close of each period, with its total volume. The last split-adjusted
+close is kept too, so long-range charts have no cliff at a split. Rollups are kept up to date as
+history is stored, aggregating again only the periods that new or changed rows fall in, and
+rebuilt whenever the adjusted closes are (see priceadjust.rebuild).
+
+read() serves a date range at the finest of daily, weekly or monthly resolution that fits within
+a requested number of points, so a fifteen year chart reads about 180 monthly rows.
+"""
+
+from datetime import timedelta
+
+import pandas as pd
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+RESOLUTION_DAY = 'D'
+RESOLUTION_WEEK = 'W'
+RESOLUTION_MONTH = 'M'
+
+# Pandas period for each rollup. Weeks run Monday to Sunday.
+PERIODS = {
+    RESOLUTION_WEEK: 'W-SUN',
+    RESOLUTION_MONTH: 'M',
+}
+
+# Roughly how many points a year of history has at each resolution, finest first.
+POINTS_PER_YEAR = {
+    RESOLUTION_DAY: 252,
+    RESOLUTION_WEEK: 52,
+    RESOLUTION_MONTH: 12,
+}
+
+COLUMNS = ['date', 'open', 'high', 'low', 'close', 'adjusted_close', 'volume']
+
+
+def period_starts(dates, period):
+    """The first calendar day of the period each date falls in, as a Series of dates."""
+    return pd.to_datetime(pd.Series(list(dates))).dt.to_period(PERIODS[period]).dt.start_time.dt.date
+
+
+def aggregate(price_history, period):
+    """
+    Rollups of daily rows (date plus the OHLCV and adjusted_close columns) by period.
+
+    Returns a frame with one row per period: its start, the date of its last trading day, the
+    OHLCV and adjusted_close columns, and the number of trading days in it.
+    """
+    frame = price_history.sort_values('date')
+    frame = frame.assign(start=period_starts(frame['date'], period).to_numpy())
+    rollups = frame.groupby('start', sort=True).agg(
+        date=('date', 'last'),
+        open=('open', 'first'),
+        high=('high', 'max'),
+        low=('low', 'min'),
+        close=('close', 'last'),
+        adjusted_close=('adjusted_close', 'last'),
+        volume=('volume', 'sum'),
+        days=('date', 'size'),
+    )
+    return rollups.reset_index()
+
+
+def _daily(security_id, start_date=None, end_date=None):
+    from share_dinkum_app.models import SecurityPriceHistory
+
+    rows = SecurityPriceHistory.objects.filter(security_id=security_id)
+    if start_date is not None:
+        rows = rows.filter(date__gte=start_date)
+    if end_date is not None:
+        rows = rows.filter(date__lte=end_date)
+    return pd.DataFrame.from_records(rows.order_by('date').values(*COLUMNS), columns=COLUMNS)
+
+
+def _store(security_id, period, rollups, starts=None):
+    """Write rollups for a period, and remove those for starts that no longer have any daily rows."""
+    from share_dinkum_app.models import SecurityPriceRollup
+
+    stale = SecurityPriceRollup.objects.filter(security_id=security_id, period=period)
+    if starts is not None:
+        stale = stale.filter(start__in=starts)
+    stale.exclude(start__in=list(rollups['start'])).delete()
+
+    SecurityPriceRollup.objects.bulk_create(
+        [
+            SecurityPriceRollup(
+                security_id=security_id,
+                period=period,
+                start=row.start,
+                date=row.date,
+                open=row.open,
+                high=row.high,
+                low=row.low,
+                close=row.close,
+                adjusted_close=row.adjusted_close,
+                volume=row.volume,
+                days=row.days,
+            )
+            for row in rollups.itertuples(index=False)
+        ],
+        update_conflicts=True,
+        unique_fields=['security', 'period', 'start'],
+        update_fields=['date', 'open', 'high', 'low', 'close', 'adjusted_close', 'volume', 'days'],
+    )
+
+
+def update(security_id, dates):
+    """Aggregate again every weekly and monthly period containing one of dates, from the stored daily rows."""
+    if not len(dates):
+        return
+
+    for period in PERIODS:
+        starts = set(period_starts(dates, period))
+        last_period = pd.Timestamp(max(starts)).to_period(PERIODS[period])
+        daily = _daily(security_id, min(starts), last_period.end_time.date())
+        rollups = aggregate(daily, period) if not daily.empty else pd.DataFrame(columns=['start'])
+        _store(security_id, period, rollups[rollups['start'].isin(starts)], starts=starts)
+
+
+def rebuild(security_id):
+    """Aggregate every rollup for a security afresh from its daily rows. Returns the number of rollups."""
+    daily = _daily(security_id)
+    count = 0
+    for period in PERIODS:
+        rollups = aggregate(daily, period) if not daily.empty else pd.DataFrame(columns=['start'])
+        _store(security_id, period, rollups)
+        count += len(rollups)
+    return count
+
+
+def resolution_for(start_date, end_date, max_points=None):
+    """The finest resolution at which the range from start_date to end_date has no more than max_points points."""
+    years = ((end_date - start_date) + timedelta(days=1)).days / 365.25
+    for resolution, points_per_year in POINTS_PER_YEAR.items():
+        if max_points is None or years * points_per_year <= max_points:
+            return resolution
+    return RESOLUTION_MONTH
+
+
+def read(security_id, start_date, end_date, max_points=None, resolution=None):
+    """
+    A security's prices from start_date to end_date inclusive, at resolution, or else the finest that fits max_points.
+
+    Returns (resolution, frame), the frame having the COLUMNS with one row per day, week or month.
+    A weekly or monthly row is dated at the last trading day of its period.
+    """
+    from share_dinkum_app.models import SecurityPriceRollup
+
+    resolution = resolution or resolution_for(start_date, end_date, max_points)
+    if resolution == RESOLUTION_DAY:
+        return resolution, _daily(security_id, start_date, end_date)
+
+    rows = (
+        SecurityPriceRollup.objects.filter(
+            security_id=security_id, period=resolution, date__range=(start_date, end_date),
+        )
+        .order_by('date')
+        .values(*COLUMNS)
+    )
+    return resolution, pd.DataFrame.from_records(rows, columns=COLUMNS)
@@ -0,0 +1,178 @@
+"""Columnar copy of security price history on disk, for fast analytics reads.
+
+SecurityPriceHistory stays the record. Alongside it, each security's series is kept in one
+NumPy file under PRICE_STORE_DIR, a date-sorted structured array with one field per column, and
+is opened as a read-only memory map. A read for a date range finds its ends by binary search and
+returns views into the map, so a decade of closes for dozens of securities loads without
+building a Decimal or a model instance.
+
+The file is rewritten when history is ingested, and discarded whenever a row is saved or deleted
+any other way. A read that finds no file rebuilds it from the table. With PRICE_STORE off (the
+default under test) reads come straight from the table, in the same shapes.
+"""
+
+import os
+from pathlib import Path
+import threading
+
+import numpy as np
+from django.conf import settings
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+COLUMNS = ('open', 'high', 'low', 'close', 'adjusted_close', 'volume', 'stock_splits')
+
+DTYPE = np.dtype([
+    ('date', 'datetime64[D]'),
+    ('open', 'float64'),
+    ('high', 'float64'),
+    ('low', 'float64'),
+    ('close', 'float64'),
+    ('adjusted_close', 'float64'),
+    ('volume', 'int64'),
+    ('stock_splits', 'float64'),
+])
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def is_enabled():
+    return getattr(settings, 'PRICE_STORE', False)
+
+
+def _lock(security_id):
+    with _locks_lock:
+        return _locks.setdefault(str(security_id), threading.Lock())
+
+
+def _path(security_id):
+    return Path(settings.PRICE_STORE_DIR) / f'{security_id}.npy'
+
+
+def _to_records(dates, columns):
+    """A date-sorted structured array from a date sequence and {column: values}, the last of any repeated date winning."""
+    records = np.empty(len(dates), dtype=DTYPE)
+    records['date'] = np.asarray(dates, dtype='datetime64[D]')
+    for column in COLUMNS:
+        values = np.asarray(columns[column], dtype='float64')
+        records[column] = np.nan_to_num(values).astype('int64') if column == 'volume' else values
+
+    # A stable sort keeps rows for the same date in the order given, so taking the last of each keeps the newest.
+    records = records[np.argsort(records['date'], kind='stable')]
+    last_of_date = np.append(records['date'][1:] != records['date'][:-1], True)
+    return records[last_of_date]
+
+
+def _save(security_id, records):
+    path = _path(security_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to the side and rename, so a reader never maps half a file.
+    temp_path = path.with_suffix(f'.{threading.get_ident()}.tmp')
+    with open(temp_path, 'wb') as f:
+        np.save(f, records)
+    os.replace(temp_path, path)
+
+
+def _load(security_id):
+    """The stored array as a read-only memory map, or None if there is no file."""
+    try:
+        records = np.load(_path(security_id), mmap_mode='r')
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning('Discarding unreadable price store file for %s: %s', security_id, e)
+        evict(security_id)
+        return None
+    if records.dtype != DTYPE:
+        # Written before a column was added.
+        evict(security_id)
+        return None
+    return records
+
+
+def _from_table(security_id):
+    from share_dinkum_app.models import SecurityPriceHistory
+
+    rows = list(
+        SecurityPriceHistory.objects.filter(security_id=security_id)
+        .order_by('date')
+        .values_list('date', *COLUMNS)
+    )
+    if not rows:
+        return np.empty(0, dtype=DTYPE)
+    dates, *values = zip(*rows)
+    # A missing adjusted close reads as NaN.
+    return _to_records(dates, {column: np.array(column_values, dtype='float64') for column, column_values in zip(COLUMNS, values)})
+
+
+def write(security_id, price_history):
+    """
+    Merge a frame of newly stored history (date plus the COLUMNS) into the security's file.
+
+    Rows for dates already held replace them. Does nothing if the store is off, or if there is no
+    file yet: the first read builds it from the table, which then includes these rows too.
+    """
+    if not is_enabled() or price_history.empty:
+        return
+
+    with _lock(security_id):
+        existing = _load(security_id)
+        if existing is None:
+            return
+        new = _to_records(price_history['date'].tolist(), {column: price_history[column].tolist() for column in COLUMNS})
+        _save(security_id, _to_records(
+            np.concatenate([existing['date'], new['date']]),
+            {column: np.concatenate([existing[column], new[column]]) for column in COLUMNS},
+        ))
+
+
+def rebuild(security_id):
+    """Write the security's file afresh from the table. Returns the number of rows."""
+    with _lock(security_id):
+        records = _from_table(security_id)
+        _save(security_id, records)
+    return len(records)
+
+
+def evict(security_id):
+    """Discard the security's file, so the next read rebuilds it from the table."""
+    _path(security_id).unlink(missing_ok=True)
+
+
+def _records(security_id):
+    if not is_enabled():
+        return _from_table(security_id)
+
+    records = _load(security_id)
+    if records is None:
+        rebuild(security_id)
+        records = _load(security_id)
+    return records
+
+
+def read(security_id, start_date=None, end_date=None, columns=('close',)):
+    """
+    The security's series from start_date to end_date inclusive, as {'date': datetime64[D] array, column: array}.
+
+    Prices are float64 and volume int64. From the store the arrays are read-only views of the
+    memory map; copy them before changing them.
+    """
+    records = _records(security_id)
+    dates = records['date']
+
+    lower = 0 if start_date is None else np.searchsorted(dates, np.datetime64(start_date, 'D'), side='left')
+    upper = len(dates) if end_date is None else np.searchsorted(dates, np.datetime64(end_date, 'D'), side='right')
+
+    window = records[lower:upper]
+    return {'date': window['date'], **{column: window[column] for column in columns}}
+
+
+def read_many(security_ids, start_date=None, end_date=None, columns=('close',)):
+    """{security_id: read(security_id, ...)} for many securities."""
+    return {
+        security_id: read(security_id, start_date=start_date, end_date=end_date, columns=columns)
+        for security_id in security_ids
+    }
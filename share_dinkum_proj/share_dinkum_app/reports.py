@@ -1,4 +1,6 @@
-from share_dinkum_app.models import Sell, Account
+from decimal import Decimal
+
+from share_dinkum_app.models import Sell, Account, Instrument, Dividend, Distribution
 import pandas as pd
 
 class RealisedCapitalGainReport:
@@ -40,4 +42,90 @@ class RealisedCapitalGainReport:
 
         df = pd.DataFrame(report_rows, columns=report_columns)
 
-        return df
\ No newline at end of file
+        return df
+
+
+class PriceCoverageReport:
+    """Instruments whose stored price history is missing trading days, by their market's calendar."""
+
+    def __init__(self, account: Account):
+        self.account = account
+
+    def generate(self, now=None):
+        report_rows = []
+        instruments = (
+            Instrument.objects.filter(account=self.account, is_active=True)
+            .select_related('market', 'security')
+            .prefetch_related('market__holidays')
+            .order_by('name')
+        )
+
+        report_columns = [
+            "instrument", "ticker", "coverage_start", "coverage_end", "trading_days", "stored_days",
+            "missing_days", "missing_ranges",
+        ]
+
+        for instrument in instruments:
+            trading_days, missing_days = instrument.price_history_coverage(now=now)
+            if not missing_days:
+                continue
+
+            row = {
+                "instrument": instrument.name,
+                "ticker": instrument.yfinance_ticker_code,
+                "coverage_start": trading_days[0],
+                "coverage_end": trading_days[-1],
+                "trading_days": len(trading_days),
+                "stored_days": len(trading_days) - len(missing_days),
+                "missing_days": len(missing_days),
+                "missing_ranges": '; '.join(
+                    f'{start_date.isoformat()} to {end_date.isoformat()}'
+                    for start_date, end_date in instrument.price_history_gaps(now=now)
+                ),
+            }
+
+            assert list(row.keys()) == report_columns
+
+            report_rows.append(row)
+
+        df = pd.DataFrame(report_rows, columns=report_columns)
+
+        return df
+
+
+class IncomeReport:
+    """Dividends and distributions by fiscal year, in the account's currency where converted."""
+
+    def __init__(self, account: Account):
+        self.account = account
+
+    def generate(self, start_date=None, end_date=None):
+        report_columns = ["fiscal_year", "dividends", "distributions", "total_income"]
+
+        # One grouped query per model over the persisted totals.
+        income_by_year = {}
+        for column, model in [("dividends", Dividend), ("distributions", Distribution)]:
+            for totals in model.totals_by_fiscal_year(self.account, start_date=start_date, end_date=end_date):
+                entry = income_by_year.setdefault(
+                    totals['start_year'],
+                    {"fiscal_year": totals['name'], "dividends": Decimal('0'), "distributions": Decimal('0')},
+                )
+                entry[column] += totals['total'] or Decimal('0')
+
+        report_rows = []
+        for start_year in sorted(income_by_year):
+            entry = income_by_year[start_year]
+            row = {
+                "fiscal_year": entry["fiscal_year"],
+                "dividends": entry["dividends"],
+                "distributions": entry["distributions"],
+                "total_income": entry["dividends"] + entry["distributions"],
+            }
+
+            assert list(row.keys()) == report_columns
+
+            report_rows.append(row)
+
+        df = pd.DataFrame(report_rows, columns=report_columns)
+
+        return df
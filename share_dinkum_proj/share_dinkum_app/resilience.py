@@ -0,0 +1,126 @@
+"""Retries with backoff, and circuit breakers, for calls to flaky remote services.
+
+A call that fails with a transient error (a dropped connection, a timeout, a rate limit) is tried
+again after a delay that doubles each time, up to MARKET_DATA_RETRIES more attempts. Consecutive
+failed calls to one endpoint are counted, and after MARKET_DATA_BREAKER_THRESHOLD of them the
+endpoint's breaker opens: calls fail at once with CircuitOpenError for
+MARKET_DATA_BREAKER_COOLDOWN seconds, instead of each waiting out its own timeout. The next call
+after that is let through as a trial, and closes the breaker again if it succeeds or opens it for
+another cooldown if it fails. Only one trial runs at a time; other calls meanwhile still fail at
+once.
+
+Errors that are not transient, such as a bad ticker, are raised straight away and say nothing
+about the endpoint's health.
+"""
+
+import random
+import threading
+import time
+
+from django.conf import settings
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose breaker is open."""
+
+
+class CircuitBreaker:
+
+    def __init__(self, name):
+        self.name = name
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call may not go ahead. Returns True if it is the trial call."""
+        with self.lock:
+            if self.opened_at is None:
+                return False
+            remaining = self.opened_at + settings.MARKET_DATA_BREAKER_COOLDOWN - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenError(f'{self.name} is unavailable; retrying in {remaining:.0f}s')
+            if self.trial:
+                raise CircuitOpenError(f'{self.name} is unavailable; a trial call is under way')
+            # Cooled down: let this call alone through as a trial. The breaker stays open until it succeeds.
+            self.trial = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def record_failure(self, trial=False):
+        with self.lock:
+            self.failures += 1
+            # A failed trial opens the breaker for another cooldown.
+            if trial or (self.failures >= settings.MARKET_DATA_BREAKER_THRESHOLD and self.opened_at is None):
+                self.opened_at = time.monotonic()
+                self.trial = False
+                logger.warning(
+                    '%s failed %s times in a row; not calling it for %ss',
+                    self.name, self.failures, settings.MARKET_DATA_BREAKER_COOLDOWN,
+                )
+
+    def end_trial(self):
+        """Let the next call be the trial, when this one ended without saying whether the endpoint is back."""
+        with self.lock:
+            self.trial = False
+
+    @property
+    def is_open(self):
+        with self.lock:
+            return self.opened_at is not None
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    with _breakers_lock:
+        return _breakers.setdefault(name, CircuitBreaker(name))
+
+
+def reset():
+    """Close every breaker."""
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def call(endpoint, func, *args, transient_errors=(OSError,), **kwargs):
+    """
+    Call func(*args, **kwargs) through the endpoint's circuit breaker, retrying transient errors.
+
+    Raises CircuitOpenError without calling func if the breaker is open, and otherwise whatever
+    func last raised once the retries are spent.
+    """
+    breaker = get_breaker(endpoint)
+    trial = breaker.before_call()
+
+    retries = settings.MARKET_DATA_RETRIES
+    try:
+        for attempt in range(retries + 1):
+            try:
+                result = func(*args, **kwargs)
+            except transient_errors as e:
+                if attempt == retries:
+                    breaker.record_failure(trial=trial)
+                    raise
+                # Jitter keeps the pool's workers from retrying in lockstep.
+                delay = settings.MARKET_DATA_RETRY_DELAY * (2 ** attempt) * random.uniform(0.5, 1.5)
+                logger.info('%s failed (%s); retrying in %.1fs', endpoint, e, delay)
+                time.sleep(delay)
+            else:
+                breaker.record_success()
+                return result
+    finally:
+        if trial:
+            # A trial ended by an error that is not transient leaves the breaker as it was.
+            breaker.end_trial()
@@ -0,0 +1,57 @@
+"""Periodic refresh of prices and current exchange rates that follows the markets' calendars.
+
+Each run refreshes only the accounts holding an instrument whose market has had a session since
+its latest stored price, so nights, weekends and holidays in a market's calendar (see Market and
+MarketHoliday) cost no fetches for it. Current exchange rates are refreshed once stale, except
+while the currency market is shut for the weekend. Run with
+`python manage.py run_scheduler --interval 15`.
+"""
+
+from datetime import date, datetime, time, timedelta, UTC
+
+from share_dinkum_app import marketrefresh
+from share_dinkum_app.models import Account, CurrentExchangeRate
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# The currency market trades around the clock from Sunday evening to Friday evening, New York time,
+# which is close enough to 22:00 UTC for deciding whether a quote can have moved.
+FX_WEEK_CLOSE = (4, time(22, 0))  # Friday
+FX_WEEK_OPEN = (6, time(22, 0))   # Sunday
+
+
+def fx_market_closed_at(now=None):
+    """When the currency market last closed, if it is shut for the weekend at now; otherwise None."""
+    now = (now or datetime.now(UTC)).astimezone(UTC)
+    close_day, close_time = FX_WEEK_CLOSE
+    open_day, open_time = FX_WEEK_OPEN
+
+    weekday, clock = now.weekday(), now.time().replace(tzinfo=None)
+    after_close = weekday > close_day or (weekday == close_day and clock >= close_time)
+    before_open = weekday < open_day or (weekday == open_day and clock < open_time)
+    if not (after_close and before_open):
+        return None
+
+    closed_on = now.date() - timedelta(days=weekday - close_day)
+    return datetime.combine(closed_on, close_time, tzinfo=UTC)
+
+
+def due_accounts(now=None):
+    """Accounts holding an instrument due a price refresh at now."""
+    end_date = date.today()
+    return [account for account in Account.objects.all() if account.plan_price_refresh(end_date, now=now)]
+
+
+def run_once(now=None):
+    """Refresh what is due. Returns (accounts refreshed, current exchange rates refreshed)."""
+    accounts = due_accounts(now)
+    if accounts:
+        marketrefresh.refresh_accounts(accounts, now=now)
+    else:
+        logger.info('No market has traded since the last refresh; no prices fetched.')
+
+    refreshed_rates = CurrentExchangeRate.refresh_stale(settled_after=fx_market_closed_at(now))
+    logger.info('Refreshed prices for %s accounts and %s current exchange rates.', len(accounts), refreshed_rates)
+    return len(accounts), refreshed_rates
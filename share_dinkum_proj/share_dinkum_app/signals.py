@@ -1,9 +1,6 @@
 from datetime import date, timedelta
 import threading
 
-from django.apps import apps
-from django.core.files.temp import NamedTemporaryFile
-from django.core.files.base import ContentFile
 from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.db import transaction
@@ -12,12 +9,16 @@ from django.forms.models import model_to_dict
 
 from djmoney.money import Money
 
-from share_dinkum_app import excelinterface
-from share_dinkum_app import loading
-from share_dinkum_app.reports import RealisedCapitalGainReport
+from share_dinkum_app import dashboardcache
+from share_dinkum_app import fxservice
+from share_dinkum_app import jobs
+from share_dinkum_app import priceadjust
+from share_dinkum_app import pricerollups
+from share_dinkum_app import pricestore
+from share_dinkum_app.utils import convert_to_decimal_field
 from share_dinkum_app.constants import CGT_DISCOUNT_RATE, CGT_DISCOUNT_THRESHOLD_DAYS
 
-from .models import BaseModel, Sell, Buy, Parcel, SellAllocation, ShareSplit, CostBaseAdjustment, CostBaseAdjustmentAllocation, DataExport, InstrumentPriceHistory, Account, ExchangeRate
+from .models import BaseModel, Sell, Buy, Parcel, Instrument, Dividend, Distribution, SellAllocation, ShareSplit, CostBaseAdjustment, CostBaseAdjustmentAllocation, DataExport, SecurityPriceHistory, Account, ExchangeRate, CurrentExchangeRate
 
 import logging
 logger = logging.getLogger(__name__)
@@ -312,59 +313,104 @@ def update_account_price_history(sender, instance, created, **kwargs):
     assert isinstance(instance, Account)
 
     if instance.update_price_history:
-        # Ideally run this as a background task (Celery, Django-Q, etc.)
-        # Exchange rates must be refreshed first. Saving an instrument stores its value converted at
-        # whatever the current rate is at that moment, and nothing re-converts it afterwards, so
-        # refreshing the rate second leaves every holding valued at the previous rate.
-        instance.update_all_exchange_rate_history()
-        instance.update_all_price_history()
+        # The refresh runs on a job worker, which clears the flag when it is done.
+        jobs.enqueue('refresh_account', account=instance, unique=True)
 
-        # Mark flag as cleared
-        instance.update_price_history = False
-        instance.save(update_fields=['update_price_history'])
 
+@receiver([post_save, post_delete], sender=ExchangeRate)
+def invalidate_exchange_rate_series(sender, instance, **kwargs):
 
-@receiver(post_save, sender=DataExport)
-def generate_export_file(sender, instance, created, **kwargs):
+    assert isinstance(instance, ExchangeRate)
 
-    assert isinstance(instance, DataExport)
+    fxservice.invalidate(
+        account=instance.account_id,
+        convert_from=instance.convert_from,
+        convert_to=instance.convert_to,
+    )
 
 
-    if instance.file:
-        return  # already has a file
-    logger.info('Starting data export process.')
+@receiver([post_save, post_delete], sender=SecurityPriceHistory)
+def evict_price_store(sender, instance, **kwargs):
 
-    with NamedTemporaryFile(suffix='.xlsx') as temp_file:
-        gen = excelinterface.ExcelGen(title='Data Export')
-        for model in apps.get_app_config('share_dinkum_app').get_models():
+    assert isinstance(instance, SecurityPriceHistory)
 
-            if model == InstrumentPriceHistory and not instance.include_price_history:
-                continue
+    # Rows saved one at a time (imports, the admin) are not merged in; the next read rebuilds the file.
+    pricestore.evict(instance.security_id)
 
-            logger.info('    - %s', model.__name__)
 
-            if 'account' in [f.name for f in model._meta.get_fields()]:
-                queryset = loading.model_to_queryset(model=model, account=instance.account)
-            else:
-                queryset = loading.model_to_queryset(model=model)
-            
-            df = loading.queryset_to_df(queryset)
-            desc = getattr(model, 'MODEL_DESCRIPTION', 'No description available')
-            if not df.empty:
-                gen.add_table(df, table_name=model.__name__, description=desc)
+@receiver([post_save, post_delete], sender=SecurityPriceHistory)
+def update_adjusted_closes(sender, instance, **kwargs):
 
-        logger.info('    - Realised Capital Gains Report')
-        rcg_report = RealisedCapitalGainReport(account=instance.account)
-        
-        df_realised_capital_gains = rcg_report.generate()
-        
-        gen.add_table(df_realised_capital_gains, table_name="RealisedCapitalGains", description="Report of realised capital gains per sale allocation.")
+    assert isinstance(instance, SecurityPriceHistory)
+
+    # Ingestion adjusts its own rows; this covers rows saved or deleted one at a time.
+    if instance.stock_splits not in (0, 1):
+        # A split added or removed changes the adjusted close of every row before it.
+        priceadjust.rebuild(instance.security_id)
+    elif instance.adjusted_close is None and kwargs['signal'] is post_save:
+        splits = priceadjust.stored_splits(instance.security_id)
+        factor = priceadjust.later_factors([instance.date], splits)[0]
+        SecurityPriceHistory.objects.filter(pk=instance.pk).update(
+            adjusted_close=convert_to_decimal_field(float(instance.close) / factor, SecurityPriceHistory._meta.get_field('adjusted_close')),
+        )
+
+
+@receiver([post_save, post_delete], sender=ShareSplit)
+def rebuild_adjusted_closes(sender, instance, **kwargs):
+
+    assert isinstance(instance, ShareSplit)
+
+    if kwargs['signal'] is post_save and not kwargs['created']:
+        return
+
+    security_id = instance.instrument.security_id
+    if security_id is not None:
+        priceadjust.rebuild(security_id)
+        pricestore.evict(security_id)
+
+
+@receiver([post_save, post_delete], sender=SecurityPriceHistory)
+def update_price_rollups(sender, instance, **kwargs):
 
+    assert isinstance(instance, SecurityPriceHistory)
+
+    # Ingestion updates rollups for its whole batch; this covers rows saved or deleted one at a time.
+    pricerollups.update(instance.security_id, [instance.date])
+
+
+@receiver([post_save, post_delete], sender=Instrument)
+@receiver([post_save, post_delete], sender=Distribution)
+@receiver([post_save, post_delete], sender=Dividend)
+@receiver([post_save, post_delete], sender=ShareSplit)
+@receiver([post_save, post_delete], sender=Sell)
+@receiver([post_save, post_delete], sender=Buy)
+@receiver([post_save, post_delete], sender=ExchangeRate)
+@receiver([post_save, post_delete], sender=CurrentExchangeRate)
+def bump_account_data_version(sender, instance, **kwargs):
+
+    # The dashboard's cached payloads for the account are stale from here on.
+    dashboardcache.bump(instance.account_id)
+
+
+@receiver([post_save, post_delete], sender=SecurityPriceHistory)
+def bump_security_data_version(sender, instance, **kwargs):
+
+    assert isinstance(instance, SecurityPriceHistory)
+
+    # Price history is shared, so every account holding the security sees the change.
+    dashboardcache.bump_for_securities([instance.security_id])
+
+
+@receiver(post_save, sender=DataExport)
+def generate_export_file(sender, instance, created, **kwargs):
+
+    assert isinstance(instance, DataExport)
+
+    if instance.file:
+        return  # already has a file
 
-        gen.save(temp_file.name)
-        new_name = f'Export_{instance.account.description}.xlsx'
-        instance.file.save(new_name, ContentFile(open(temp_file.name, 'rb').read()))
-        logger.info('Data export process completed successfully.')
+    # Building the workbook takes a while, so it is left to a job worker.
+    jobs.enqueue('generate_export', account=instance.account, unique=True, data_export=str(instance.pk))
 
 
 
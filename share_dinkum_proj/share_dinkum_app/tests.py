@@ -3,13 +3,25 @@ Comprehensive test suite for share_dinkum_app.
 
 Run with: python manage.py test share_dinkum_app
 """
-from datetime import date
+import asyncio
+import gzip
+import json
+from datetime import date, datetime, timedelta, UTC
 from decimal import Decimal
-from unittest.mock import patch, MagicMock
+import os
+from pathlib import Path
+import tempfile
+import time
+from unittest.mock import call, patch, MagicMock
 
+import numpy as np
 import pandas as pd
 
-from django.test import TestCase, TransactionTestCase
+from django.conf import settings
+from django.core.management import call_command
+from django.http import Http404
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.views.decorators.gzip import gzip_page
 from django.db import IntegrityError
 from djmoney.money import Money
 
@@ -20,6 +32,7 @@ from share_dinkum_app.models import (
     FiscalYear,
     Account,
     Market,
+    MarketHoliday,
     Instrument,
     ExchangeRate,
     CurrentExchangeRate,
@@ -31,15 +44,38 @@ from share_dinkum_app.models import (
     CostBaseAdjustment,
     CostBaseAdjustmentAllocation,
     LogEntry,
-    InstrumentPriceHistory,
+    Security,
+    SecurityPriceHistory,
+    SecurityPriceRollup,
     Dividend,
+    Distribution,
     DataExport,
+    Job,
 )
 from share_dinkum_app.utils.currency import add_currencies
+from share_dinkum_app.utils.decimal import convert_to_decimal, convert_series_to_decimal
 from share_dinkum_app.utils.filefield_operations import user_directory_path, process_filefield
+from share_dinkum_app.utils.queries import latest_before
 from share_dinkum_app.decorators import safe_property
-from share_dinkum_app.reports import RealisedCapitalGainReport
+from share_dinkum_app.reports import IncomeReport, PriceCoverageReport, RealisedCapitalGainReport
+from share_dinkum_app.loading import DataLoader
 from share_dinkum_app import yfinanceinterface
+from share_dinkum_app import fxservice
+from share_dinkum_app import pricerefresh
+from share_dinkum_app import marketdata
+from share_dinkum_app import marketcache
+from share_dinkum_app import marketrefresh
+from share_dinkum_app import jobs
+from share_dinkum_app import scheduler
+from share_dinkum_app import admin as admin_module
+from share_dinkum_app import dashboardcache
+from share_dinkum_app import dashboardseries
+from share_dinkum_app import performance
+from share_dinkum_app import priceadjust
+from share_dinkum_app import pricerollups
+from share_dinkum_app import pricestore
+from share_dinkum_app import resilience
+from share_dinkum_app import excelinterface
 
 
 # --- Test data factories (minimal objects for isolation) ---
@@ -148,6 +184,29 @@ class AddCurrenciesTests(TestCase):
         self.assertIn('Expected Money', str(ctx.exception))
 
 
+# =============================================================================
+# Utils: decimal
+# =============================================================================
+
+
+class ConvertSeriesToDecimalTests(TestCase):
+    """Tests for share_dinkum_app.utils.decimal.convert_series_to_decimal."""
+
+    def test_matches_convert_to_decimal(self):
+        values = [2.675, 1.0000005, -3.1234565, 50.5, 0, 123456.789, 0.1 + 0.2]
+        self.assertEqual(
+            convert_series_to_decimal(values, 16, 6),
+            [convert_to_decimal(value, 16, 6) for value in values],
+        )
+
+    def test_missing_values_give_none(self):
+        self.assertEqual(convert_series_to_decimal(pd.Series([1.5, None, float('nan')]), 16, 6), [Decimal('1.5'), None, None])
+
+    def test_too_large_raises(self):
+        with self.assertRaises(ValueError):
+            convert_series_to_decimal([1e11], 16, 6)
+
+
 # =============================================================================
 # Utils: filefield_operations
 # =============================================================================
@@ -186,6 +245,39 @@ class ProcessFilefieldTests(TestCase):
         self.assertIsNone(process_filefield(''))
 
 
+# =============================================================================
+# Utils: queries
+# =============================================================================
+
+
+class LatestBeforeTests(TestCase):
+    """Tests for latest_before."""
+
+    def setUp(self):
+        acc = create_account()
+        market = create_market(account=acc)
+        self.bhp = create_instrument(account=acc, market=market, name='BHP').security
+        self.cba = create_instrument(account=acc, market=market, name='CBA').security
+        rows = [(self.bhp, 8, '40'), (self.bhp, 9, '41'), (self.bhp, 12, '42'), (self.cba, 12, '100')]
+        for security, day, close in rows:
+            SecurityPriceHistory.objects.create(
+                security=security, date=date(2024, 1, day), open=Decimal(close), high=Decimal(close),
+                low=Decimal(close), close=Decimal(close), volume=1000, stock_splits=Decimal('0'),
+            )
+
+    def test_latest_value_of_each_key_in_one_query(self):
+        with self.assertNumQueries(1):
+            closes = latest_before(SecurityPriceHistory.objects.all(), 'security_id', 'close', before=date(2024, 1, 12))
+        # CBA has nothing before the 12th.
+        self.assertEqual(closes, {self.bhp.pk: Decimal('41')})
+
+    def test_latest_date_without_a_bound(self):
+        self.assertEqual(
+            latest_before(SecurityPriceHistory.objects.all(), 'security_id', 'date'),
+            {self.bhp.pk: date(2024, 1, 12), self.cba.pk: date(2024, 1, 12)},
+        )
+
+
 # =============================================================================
 # yfinanceinterface
 # =============================================================================
@@ -299,7 +391,7 @@ class GetInstrumentPriceHistoryTests(TestCase):
         self.assertIn('open', result.columns)
         self.assertIn('volume', result.columns)
         self.assertIn('stock_splits', result.columns)
-        mock_ticker.history.assert_called_once_with(start='2024-01-01')
+        mock_ticker.history.assert_called_once_with(start='2024-01-01', auto_adjust=False)
 
 
     def test_returns_empty_dataframe_on_exception(self, mock_yf):
@@ -311,7 +403,7 @@ class GetInstrumentPriceHistoryTests(TestCase):
         result = yfinanceinterface.get_instrument_price_history(instrument, start_date=date(2024, 1, 1))
         self.assertTrue(result.empty)
         self.assertIsInstance(result, pd.DataFrame)
-        mock_ticker.history.assert_called_once_with(start='2024-01-01')
+        mock_ticker.history.assert_called_once_with(start='2024-01-01', auto_adjust=False)
 
 
 
@@ -332,60 +424,331 @@ class GetInstrumentPriceHistoryTests(TestCase):
             end_date=date(2024, 1, 31),
         )
         self.assertFalse(result.empty)
-        mock_ticker.history.assert_called_once_with(start='2024-01-01', end='2024-02-01')
+        mock_ticker.history.assert_called_once_with(start='2024-01-01', end='2024-02-01', auto_adjust=False)
 
 
 @patch('share_dinkum_app.yfinanceinterface.yf')
-class GetCurrentPriceTests(TestCase):
-    """Tests for yfinanceinterface.get_current_price."""
+class GetPriceHistoryBatchTests(TestCase):
+    """Tests for yfinanceinterface.get_price_history_batch."""
 
-    def test_returns_decimal_when_current_price_exists(self, mock_yf):
-        mock_ticker = MagicMock()
-        mock_yf.Ticker.return_value = mock_ticker
-        mock_ticker.info = {'currentPrice': 150.25}
+    def make_instrument(self, ticker_code):
         instrument = MagicMock()
-        instrument.yfinance_ticker_code = 'BHP.AX'
-        result = yfinanceinterface.get_current_price(instrument)
-        self.assertEqual(result.quantize(Decimal('0.01')), Decimal('150.25'))
+        instrument.yfinance_ticker_code = ticker_code
+        return instrument
 
-    def test_falls_back_to_regular_market_price(self, mock_yf):
-        mock_ticker = MagicMock()
-        mock_yf.Ticker.return_value = mock_ticker
-        mock_ticker.info = {'regularMarketPrice': 148.50}
-        instrument = MagicMock()
-        instrument.yfinance_ticker_code = 'BHP.AX'
-        result = yfinanceinterface.get_current_price(instrument)
-        self.assertEqual(result.quantize(Decimal('0.01')), Decimal('148.50'))
+    def test_returns_long_format_frame_from_one_download(self, mock_yf):
+        columns = pd.MultiIndex.from_product([['BHP.AX', 'AAPL'], ['Open', 'High', 'Low', 'Close', 'Volume', 'Stock Splits']])
+        downloaded = pd.DataFrame(
+            [
+                [50.0, 51.0, 49.0, 50.5, 1000, 0, 180.0, 182.0, 179.0, 181.0, 5000, 0],
+                # AAPL did not trade on the 26th (US holiday)
+                [51.0, 52.0, 50.0, 51.5, 1100, 0, None, None, None, None, None, None],
+            ],
+            index=pd.DatetimeIndex([pd.Timestamp('2024-01-25'), pd.Timestamp('2024-01-26')], name='Date'),
+            columns=columns,
+        )
+        mock_yf.download.return_value = downloaded
+        bhp, aapl = self.make_instrument('BHP.AX'), self.make_instrument('AAPL')
 
-    def test_prefers_current_price_over_regular_market_price(self, mock_yf):
-        mock_ticker = MagicMock()
-        mock_yf.Ticker.return_value = mock_ticker
-        mock_ticker.info = {'currentPrice': 150.25, 'regularMarketPrice': 148.50}
+        result = yfinanceinterface.get_price_history_batch([bhp, aapl], start_date=date(2024, 1, 25), end_date=date(2024, 1, 26))
+
+        mock_yf.download.assert_called_once()
+        self.assertEqual(mock_yf.download.call_args.kwargs['tickers'], ['BHP.AX', 'AAPL'])
+        self.assertEqual(mock_yf.download.call_args.kwargs['end'], '2024-01-27')
+        # Income is a cash flow of its own, so prices must not be lowered for dividends too.
+        self.assertIs(mock_yf.download.call_args.kwargs['auto_adjust'], False)
+        self.assertEqual(len(result), 3)
+        self.assertEqual(list(result[result['ticker'] == 'AAPL']['date']), [date(2024, 1, 25)])
+        self.assertIs(result[result['ticker'] == 'AAPL']['instrument'].iloc[0], aapl)
+        self.assertEqual(result[result['ticker'] == 'BHP.AX']['close'].tolist(), [50.5, 51.5])
+
+    def test_returns_empty_dataframe_on_exception(self, mock_yf):
+        mock_yf.download.side_effect = Exception('api error')
+        result = yfinanceinterface.get_price_history_batch([self.make_instrument('BHP.AX')], start_date=date(2024, 1, 1))
+        self.assertTrue(result.empty)
+
+
+@patch('share_dinkum_app.yfinanceinterface.YfData')
+class GetCurrentPriceTests(TestCase):
+    """Tests for yfinanceinterface.get_current_price and get_current_quotes."""
+
+    def quote_response(self, *results):
+        return {'quoteResponse': {'result': list(results), 'error': None}}
+
+    def test_returns_decimal_when_price_exists(self, mock_yfdata):
+        mock_yfdata.return_value.get_raw_json.return_value = self.quote_response(
+            {'symbol': 'BHP.AX', 'regularMarketPrice': 150.25, 'regularMarketTime': 1705287600},
+        )
         instrument = MagicMock()
         instrument.yfinance_ticker_code = 'BHP.AX'
         result = yfinanceinterface.get_current_price(instrument)
         self.assertEqual(result.quantize(Decimal('0.01')), Decimal('150.25'))
 
-    def test_returns_none_when_no_price_available(self, mock_yf):
-        mock_ticker = MagicMock()
-        mock_yf.Ticker.return_value = mock_ticker
-        mock_ticker.info = {}
+    def test_quotes_many_tickers_in_one_request(self, mock_yfdata):
+        mock_yfdata.return_value.get_raw_json.return_value = self.quote_response(
+            {'symbol': 'BHP.AX', 'regularMarketPrice': 45.10, 'regularMarketTime': 1705287600},
+            {'symbol': 'AAPL', 'regularMarketPrice': 182.50, 'regularMarketTime': 1705352400},
+        )
+        quotes = yfinanceinterface.get_current_quotes(['BHP.AX', 'AAPL', 'BHP.AX'])
+        mock_yfdata.return_value.get_raw_json.assert_called_once()
+        self.assertEqual(mock_yfdata.return_value.get_raw_json.call_args.kwargs['params']['symbols'], 'BHP.AX,AAPL')
+        self.assertEqual(quotes['AAPL'][0].quantize(Decimal('0.01')), Decimal('182.50'))
+        self.assertEqual(quotes['BHP.AX'][1], datetime(2024, 1, 15, 3, 0, tzinfo=UTC))
+
+    def test_returns_none_when_no_price_available(self, mock_yfdata):
+        mock_yfdata.return_value.get_raw_json.return_value = self.quote_response({'symbol': 'BHP.AX'})
         instrument = MagicMock()
         instrument.yfinance_ticker_code = 'BHP.AX'
         result = yfinanceinterface.get_current_price(instrument)
         self.assertIsNone(result)
 
-    def test_returns_none_on_exception(self, mock_yf):
-        mock_ticker = MagicMock()
-        mock_yf.Ticker.return_value = mock_ticker
-        mock_ticker.info = property(lambda self: (_ for _ in ()).throw(Exception('network error')))
-        type(mock_ticker).info = property(lambda self: (_ for _ in ()).throw(Exception('network error')))
+    def test_returns_none_on_exception(self, mock_yfdata):
+        mock_yfdata.return_value.get_raw_json.side_effect = Exception('network error')
         instrument = MagicMock()
         instrument.yfinance_ticker_code = 'BHP.AX'
         result = yfinanceinterface.get_current_price(instrument)
         self.assertIsNone(result)
 
 
+# =============================================================================
+# Market data providers
+# =============================================================================
+
+
+class FileProviderTests(TestCase):
+    """Tests for marketdata.FileProvider, which reads fixtures from disk with no network access."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        # As written by Ticker.history().to_csv(), with the exchange's UTC offset on each date.
+        pd.DataFrame({
+            'Date': ['2024-01-15 00:00:00+11:00', '2024-01-16 00:00:00+11:00'],
+            'Open': [50.0, 51.0], 'High': [51.0, 52.0], 'Low': [49.0, 50.0], 'Close': [50.5, 51.5],
+            'Volume': [1000, 1100], 'Stock Splits': [0, 0],
+        }).to_csv(Path(self.directory.name) / 'BHP.AX.csv', index=False)
+        pd.DataFrame({
+            'date': ['2024-01-12', '2024-01-15'], 'close': [1.49, 1.51],
+        }).to_csv(Path(self.directory.name) / 'USDAUD=X.csv', index=False)
+        self.settings_override = override_settings(MARKET_DATA_PROVIDER='file', MARKET_DATA_DIR=self.directory.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    @patch('share_dinkum_app.yfinanceinterface.yf')
+    def test_instrument_price_history_is_read_from_file(self, mock_yf):
+        acc = create_account()
+        inst = create_instrument(account=acc, market=create_market(account=acc, suffix='.AX'))
+        inst.update_price_history(end_date=date(2024, 1, 31))
+
+        mock_yf.Ticker.assert_not_called()
+        history = SecurityPriceHistory.objects.filter(security=inst.security).order_by('date')
+        self.assertEqual([h.date for h in history], [date(2024, 1, 15), date(2024, 1, 16)])
+        inst.refresh_from_db()
+        self.assertEqual(inst.current_unit_price, Decimal('51.5'))
+
+    def test_exchange_rates_are_read_from_file(self):
+        provider = marketdata.get_provider()
+        self.assertIsInstance(provider, marketdata.FileProvider)
+        history = provider.get_exchange_rate_history('USD', 'AUD', start_date=date(2024, 1, 13))
+        self.assertEqual(list(history['date']), [date(2024, 1, 15)])
+        # A Saturday resolves to the next trading day, as it does from Yahoo.
+        self.assertEqual(provider.get_exchange_rate('USD', 'AUD', date(2024, 1, 13)), Decimal('1.51'))
+        self.assertEqual(
+            provider.get_current_exchange_rate('USD', 'AUD'),
+            (Decimal('1.51'), datetime(2024, 1, 15, tzinfo=UTC)),
+        )
+        self.assertIsNone(provider.get_exchange_rate('GBP', 'AUD', date(2024, 1, 15)))
+
+    def test_provider_must_implement_every_method(self):
+        class PricesOnly(marketdata.MarketDataProvider):
+            def get_instrument_price_history(self, instrument, start_date, end_date=None):
+                return pd.DataFrame([])
+
+        with self.assertRaises(TypeError):
+            PricesOnly()
+
+
+class MarketDataCacheTests(TestCase):
+    """Tests for the on-disk market data response cache."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.settings_override = override_settings(
+            MARKET_DATA_CACHE=True, MARKET_DATA_CACHE_DIR=self.directory.name,
+            MARKET_DATA_CACHE_TTL=900, MARKET_DATA_CACHE_MAX_BYTES=10 * 1024 * 1024,
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def history_frame(self):
+        df = pd.DataFrame({'Close': [1.5]}, index=pd.DatetimeIndex([pd.Timestamp('2024-01-15')]))
+        df.index.name = 'Date'
+        return df
+
+    @patch('share_dinkum_app.yfinanceinterface.yf')
+    def test_closed_range_is_fetched_once(self, mock_yf):
+        mock_yf.Ticker.return_value.history.return_value = self.history_frame()
+        before = marketcache.stats()
+
+        for _ in range(2):
+            result = yfinanceinterface.get_exchange_rate_history('USD', 'AUD', start_date='2024-01-01', end_date='2024-01-31')
+            self.assertEqual(list(result['date']), [date(2024, 1, 15)])
+
+        mock_yf.Ticker.return_value.history.assert_called_once()
+        after = marketcache.stats()
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertGreater(after['bytes_saved'], before['bytes_saved'])
+
+    @patch('share_dinkum_app.yfinanceinterface.yf')
+    def test_date_ranges_are_cached(self, mock_yf):
+        history = pd.DataFrame({'Close': [1.5, 1.6]}, index=pd.DatetimeIndex(['2024-01-15', '2024-01-16'], name='Date'))
+        mock_yf.Ticker.return_value.history.return_value = history
+
+        for _ in range(2):
+            result = yfinanceinterface.get_exchange_rate_history('USD', 'AUD', start_date=date(2024, 1, 1), end_date=date(2024, 1, 31))
+            self.assertEqual(list(result['date']), [date(2024, 1, 15), date(2024, 1, 16)])
+
+        mock_yf.Ticker.return_value.history.assert_called_once()
+        self.assertIsNotNone(marketcache.get('USDAUD=X', '1d', '2024-01-01', '2024-02-01'))
+        self.assertEqual(list(Path(self.directory.name).glob('*.tmp')), [])
+
+    def test_failed_write_leaves_no_entry(self):
+        history = self.history_frame()
+        with patch.object(history, 'to_json', side_effect=ValueError('cannot serialise')):
+            marketcache.put('USDAUD=X', '1d', '2024-01-01', '2024-02-01', history)
+
+        self.assertEqual(list(Path(self.directory.name).iterdir()), [])
+        self.assertIsNone(marketcache.get('USDAUD=X', '1d', '2024-01-01', '2024-02-01'))
+
+    def test_range_reaching_today_expires(self):
+        marketcache.put('USDAUD=X', '1d', '2024-01-01', None, self.history_frame())
+        self.assertIsNotNone(marketcache.get('USDAUD=X', '1d', '2024-01-01', None))
+        with override_settings(MARKET_DATA_CACHE_TTL=-1):
+            marketcache.put('USDAUD=X', '1d', '2024-01-01', None, self.history_frame())
+        self.assertIsNone(marketcache.get('USDAUD=X', '1d', '2024-01-01', None))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        marketcache.put('A', '1d', '2024-01-01', '2024-02-01', self.history_frame())
+        marketcache.put('B', '1d', '2024-01-01', '2024-02-01', self.history_frame())
+        entries = sorted(Path(self.directory.name).glob('*.json'), key=lambda path: path.stat().st_size)
+        for path in entries:
+            os.utime(path, (1000, 1000))
+        marketcache.get('A', '1d', '2024-01-01', '2024-02-01')  # A is now the more recently used
+
+        with override_settings(MARKET_DATA_CACHE_MAX_BYTES=entries[-1].stat().st_size):
+            marketcache.evict()
+
+        self.assertIsNotNone(marketcache.get('A', '1d', '2024-01-01', '2024-02-01'))
+        self.assertIsNone(marketcache.get('B', '1d', '2024-01-01', '2024-02-01'))
+
+    def test_directory_is_listed_only_near_the_limit(self):
+        with patch('share_dinkum_app.marketcache.evict', wraps=marketcache.evict) as evict:
+            for ticker in ['A', 'B', 'C']:
+                marketcache.put(ticker, '1d', '2024-01-01', '2024-02-01', self.history_frame())
+            self.assertEqual(evict.call_count, 1)
+
+            with override_settings(MARKET_DATA_CACHE_MAX_BYTES=1):
+                marketcache.put('D', '1d', '2024-01-01', '2024-02-01', self.history_frame())
+            self.assertEqual(evict.call_count, 2)
+
+    def test_entries_are_json_and_keep_the_index_timezone(self):
+        history = pd.DataFrame(
+            {'Close': [1.5, 1.6], 'Volume': [100, 200]},
+            index=pd.DatetimeIndex(['2024-01-15', '2024-01-16'], name='Date').tz_localize('Australia/Sydney'),
+        )
+        marketcache.put('BHP.AX', '1d', '2024-01-01', '2024-02-01', history)
+
+        [path] = Path(self.directory.name).glob('*.json')
+        self.assertEqual(json.loads(path.read_text().splitlines()[0])['key'], ['BHP.AX', '1d', '2024-01-01', '2024-02-01'])
+        cached = marketcache.get('BHP.AX', '1d', '2024-01-01', '2024-02-01')
+        self.assertEqual(list(cached.index.date), [date(2024, 1, 15), date(2024, 1, 16)])
+        self.assertEqual(str(cached.index.tz), 'Australia/Sydney')
+        self.assertEqual(cached['Volume'].tolist(), [100, 200])
+
+
+@override_settings(MARKET_DATA_RETRIES=2, MARKET_DATA_RETRY_DELAY=0, MARKET_DATA_BREAKER_THRESHOLD=2, MARKET_DATA_BREAKER_COOLDOWN=60)
+class ResilienceTests(TestCase):
+    """Tests for retries and circuit breaking of market data calls."""
+
+    def setUp(self):
+        resilience.reset()
+        self.addCleanup(resilience.reset)
+
+    def test_transient_errors_are_retried(self):
+        func = MagicMock(side_effect=[ConnectionError('reset'), TimeoutError('slow'), 'ok'])
+        self.assertEqual(resilience.call('test', func), 'ok')
+        self.assertEqual(func.call_count, 3)
+        self.assertFalse(resilience.get_breaker('test').is_open)
+
+    def test_other_errors_are_not_retried(self):
+        func = MagicMock(side_effect=ValueError('bad ticker'))
+        with self.assertRaises(ValueError):
+            resilience.call('test', func)
+        func.assert_called_once()
+
+    def test_breaker_opens_after_repeated_failures(self):
+        func = MagicMock(side_effect=ConnectionError('down'))
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                resilience.call('test', func)
+        self.assertEqual(func.call_count, 6)
+
+        with self.assertRaises(resilience.CircuitOpenError):
+            resilience.call('test', func)
+        self.assertEqual(func.call_count, 6)
+
+    def open_breaker(self):
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                resilience.call('test', MagicMock(side_effect=ConnectionError('down')))
+        breaker = resilience.get_breaker('test')
+        breaker.opened_at -= 61  # the cooldown has passed
+        return breaker
+
+    def test_only_one_trial_call_after_the_cooldown(self):
+        breaker = self.open_breaker()
+        others = []
+
+        def trial():
+            try:
+                resilience.call('test', MagicMock(return_value='ok'))
+            except resilience.CircuitOpenError as exc:
+                others.append(exc)
+            return 'ok'
+
+        self.assertEqual(resilience.call('test', trial), 'ok')
+        self.assertEqual(len(others), 1)
+        self.assertFalse(breaker.is_open)
+
+    def test_failed_trial_reopens_the_breaker(self):
+        breaker = self.open_breaker()
+        func = MagicMock(side_effect=ConnectionError('down'))
+
+        with self.assertRaises(ConnectionError):
+            resilience.call('test', func)
+        with self.assertRaises(resilience.CircuitOpenError):
+            resilience.call('test', func)
+        self.assertEqual(func.call_count, 3)
+        self.assertTrue(breaker.is_open)
+
+    def test_trial_ended_by_other_errors_lets_the_next_call_try(self):
+        self.open_breaker()
+        with self.assertRaises(ValueError):
+            resilience.call('test', MagicMock(side_effect=ValueError('bad ticker')))
+        self.assertEqual(resilience.call('test', MagicMock(return_value='ok')), 'ok')
+
+    @patch('share_dinkum_app.yfinanceinterface.yf')
+    def test_open_breaker_skips_remaining_tickers(self, mock_yf):
+        mock_yf.Ticker.return_value.history.side_effect = ConnectionError('down')
+        for pair in ['USD', 'GBP', 'EUR', 'JPY']:
+            result = yfinanceinterface.get_exchange_rate_history(pair, 'AUD', start_date=date(2024, 1, 1))
+            self.assertTrue(result.empty)
+        # Two pairs use up their retries and open the breaker; the other two never reach Yahoo.
+        self.assertEqual(mock_yf.Ticker.return_value.history.call_count, 6)
+
+
 # =============================================================================
 # Decorators
 # =============================================================================
@@ -601,7 +964,7 @@ class AccountTests(TestCase):
 # =============================================================================
 
 
-@patch('share_dinkum_app.models.yfinanceinterface.get_exchange_rate')
+@patch('share_dinkum_app.yfinanceinterface.get_exchange_rate')
 class ExchangeRateTests(TestCase):
     """Tests for ExchangeRate and AbstractExchangeRate (with yfinance mocked)."""
 
@@ -651,6 +1014,238 @@ class ExchangeRateTests(TestCase):
         mock_get_rate.assert_called_once()
 
 
+class CurrentExchangeRateTests(TestCase):
+    """Tests for CurrentExchangeRate staleness and refresh (with yfinance mocked)."""
+
+    def create_current(self, acc, rate_timestamp):
+        return CurrentExchangeRate.objects.create(
+            account=acc, convert_from='USD', convert_to='AUD',
+            exchange_rate_multiplier=Decimal('1.5'), rate_timestamp=rate_timestamp,
+        )
+
+    @patch('share_dinkum_app.models.fxservice.schedule_current_rate_refresh')
+    @patch('share_dinkum_app.yfinanceinterface.get_current_exchange_rate')
+    def test_stale_rate_is_served_and_refreshed_in_background(self, mock_quote, mock_schedule):
+        acc = create_account()
+        self.create_current(acc, datetime.now(UTC) - timedelta(days=2))
+        current = CurrentExchangeRate.get_or_create(account=acc, convert_from='USD', convert_to='AUD')
+        self.assertEqual(current.exchange_rate_multiplier, Decimal('1.5'))
+        self.assertGreater(current.age, timedelta(days=1))
+        mock_quote.assert_not_called()
+        mock_schedule.assert_called_once_with(acc, 'USD', 'AUD')
+
+    @patch('share_dinkum_app.models.fxservice.schedule_current_rate_refresh')
+    def test_fresh_rate_is_not_refreshed(self, mock_schedule):
+        acc = create_account()
+        self.create_current(acc, datetime.now(UTC) - timedelta(minutes=5))
+        CurrentExchangeRate.get_or_create(account=acc, convert_from='USD', convert_to='AUD')
+        mock_schedule.assert_not_called()
+
+    @patch('share_dinkum_app.yfinanceinterface.get_current_exchange_rate')
+    def test_missing_rate_is_seeded_from_history_without_network(self, mock_quote):
+        acc = create_account()
+        create_exchange_rate(acc, 'USD', 'AUD', rate=Decimal('1.45'), exchange_date=date(2024, 1, 12))
+        CurrentExchangeRate.objects.all().delete()
+        current = CurrentExchangeRate.get_or_create(account=acc, convert_from='USD', convert_to='AUD')
+        self.assertEqual(current.exchange_rate_multiplier, Decimal('1.45'))
+        self.assertEqual(current.rate_timestamp, datetime(2024, 1, 12, tzinfo=UTC))
+        mock_quote.assert_not_called()
+
+    @patch('share_dinkum_app.models.fxservice.schedule_current_rate_refresh')
+    @patch('share_dinkum_app.yfinanceinterface.get_current_exchange_rate')
+    def test_missing_rate_without_history_is_fetched_in_background(self, mock_quote, mock_schedule):
+        acc = create_account()
+        self.assertIsNone(CurrentExchangeRate.get_or_create(account=acc, convert_from='USD', convert_to='AUD'))
+        mock_quote.assert_not_called()
+        mock_schedule.assert_called_once_with(acc, 'USD', 'AUD')
+
+    @patch('share_dinkum_app.yfinanceinterface.get_current_exchange_rate')
+    def test_refresh_stores_market_timestamp(self, mock_quote):
+        quote_time = datetime(2024, 1, 15, 4, 0, tzinfo=UTC)
+        mock_quote.return_value = (Decimal('1.52'), quote_time)
+        acc = create_account()
+        current = CurrentExchangeRate.get_or_create(account=acc, convert_from='USD', convert_to='AUD', force_refresh=True)
+        self.assertEqual(current.exchange_rate_multiplier, Decimal('1.52'))
+        self.assertEqual(current.rate_timestamp, quote_time)
+
+    def test_daily_close_does_not_replace_newer_live_quote(self):
+        acc = create_account()
+        self.create_current(acc, datetime.now(UTC))
+        hist = create_exchange_rate(acc, 'USD', 'AUD', rate=Decimal('1.7'), exchange_date=date.today() - timedelta(days=1))
+        current = hist.update_current()
+        self.assertEqual(current.exchange_rate_multiplier, Decimal('1.5'))
+
+
+class FxServiceTests(TestCase):
+    """Tests for the in-process as-of exchange rate lookups in fxservice."""
+
+    def test_rate_as_of_uses_nearest_prior_date(self):
+        acc = create_account()
+        create_exchange_rate(acc, 'USD', 'AUD', rate=Decimal('1.5'), exchange_date=date(2024, 1, 12))
+        create_exchange_rate(acc, 'USD', 'AUD', rate=Decimal('1.6'), exchange_date=date(2024, 1, 15))
+        # Saturday resolves to Friday's rate
+        self.assertEqual(fxservice.rate_as_of(acc, 'USD', 'AUD', date(2024, 1, 13)), Decimal('1.5'))
+        self.assertEqual(fxservice.rate_as_of(acc, 'USD', 'AUD', date(2024, 1, 15)), Decimal('1.6'))
+        self.assertIsNone(fxservice.rate_as_of(acc, 'USD', 'AUD', date(2024, 1, 11)))
+
+    def test_saving_a_rate_invalidates_the_cached_series(self):
+        acc = create_account()
+        create_exchange_rate(acc, 'USD', 'AUD', rate=Decimal('1.5'), exchange_date=date(2024, 1, 12))
+        self.assertEqual(fxservice.rate_as_of(acc, 'USD', 'AUD', date(2024, 1, 20)), Decimal('1.5'))
+        create_exchange_rate(acc, 'USD', 'AUD', rate=Decimal('1.7'), exchange_date=date(2024, 1, 19))
+        self.assertEqual(fxservice.rate_as_of(acc, 'USD', 'AUD', date(2024, 1, 20)), Decimal('1.7'))
+
+    def test_cached_series_expires_after_ttl(self):
+        acc = create_account()
+        create_exchange_rate(acc, 'USD', 'AUD', rate=Decimal('1.5'), exchange_date=date(2024, 1, 12))
+        self.assertEqual(fxservice.rate_as_of(acc, 'USD', 'AUD', date(2024, 1, 20)), Decimal('1.5'))
+        # As another process would write it: no signal reaches this process's cache.
+        ExchangeRate.objects.filter(account=acc).update(exchange_rate_multiplier=Decimal('1.8'))
+        self.assertEqual(fxservice.rate_as_of(acc, 'USD', 'AUD', date(2024, 1, 20)), Decimal('1.5'))
+        with override_settings(FX_SERIES_CACHE_TTL=0):
+            self.assertEqual(fxservice.rate_as_of(acc, 'USD', 'AUD', date(2024, 1, 20)), Decimal('1.8'))
+
+    @patch('share_dinkum_app.yfinanceinterface.get_exchange_rate')
+    def test_get_or_create_inside_continuous_history_skips_network(self, mock_get_rate):
+        acc = create_account()
+        for day, rate in [(12, '1.50'), (15, '1.60')]:
+            ExchangeRate.objects.create(
+                account=acc, convert_from='USD', convert_to='AUD', date=date(2024, 1, day),
+                exchange_rate_multiplier=Decimal(rate), is_continuous_history=True,
+            )
+        rate = ExchangeRate.get_or_create(
+            account=acc, convert_from='USD', convert_to='AUD', exchange_date=date(2024, 1, 14),
+        )
+        self.assertEqual(rate.exchange_rate_multiplier, Decimal('1.50'))
+        mock_get_rate.assert_not_called()
+
+
+class FxTriangulationTests(TestCase):
+    """Tests for deriving exchange rates from pairs already stored."""
+
+    def setUp(self):
+        fxservice.invalidate()
+        self.aud_account = create_account(currency='AUD')
+        self.usd_account = Account.objects.create(
+            owner=create_user('usd_user'), description='USD Account', currency='USD',
+            fiscal_year_type=self.aud_account.fiscal_year_type,
+        )
+
+    def store_history(self, acc, convert_from, convert_to, rates_by_date):
+        for rate_date, rate in rates_by_date.items():
+            ExchangeRate.objects.create(
+                account=acc, convert_from=convert_from, convert_to=convert_to, date=rate_date,
+                exchange_rate_multiplier=Decimal(rate), is_continuous_history=True,
+            )
+
+    @patch('share_dinkum_app.yfinanceinterface.get_exchange_rate_history')
+    def test_history_is_derived_through_pivot(self, mock_history):
+        self.store_history(self.usd_account, 'GBP', 'USD', {date(2024, 1, 8): '1.25', date(2024, 1, 9): '1.30'})
+        self.store_history(self.aud_account, 'USD', 'AUD', {date(2024, 1, 8): '1.50', date(2024, 1, 10): '1.60'})
+
+        latest = ExchangeRate.load_history(
+            account=self.aud_account, convert_from='GBP', convert_to='AUD',
+            start_date=date(2024, 1, 8), end_date=date(2024, 1, 10),
+        )
+
+        mock_history.assert_not_called()
+        # GBP history ends on the 9th, and derived history goes no further than its shortest leg.
+        self.assertEqual(latest.date, date(2024, 1, 9))
+        derived = ExchangeRate.objects.filter(account=self.aud_account, convert_from='GBP').order_by('date')
+        self.assertEqual(
+            [(r.date.day, r.exchange_rate_multiplier) for r in derived],
+            # USD/AUD has no row for the 9th, which takes the 8th rather than leaving a gap.
+            [(8, Decimal('1.875')), (9, Decimal('1.95'))],
+        )
+        self.assertTrue(all(r.source == ExchangeRate.SOURCE_DERIVED for r in derived))
+        self.assertEqual(derived[0].derivation, 'GBP>USD>AUD')
+
+    @patch('share_dinkum_app.yfinanceinterface.get_exchange_rate_history')
+    def test_history_already_derived_is_not_fetched(self, mock_history):
+        self.store_history(self.usd_account, 'GBP', 'USD', {date(2024, 1, 8): '1.25', date(2024, 1, 9): '1.30'})
+        self.store_history(self.aud_account, 'USD', 'AUD', {date(2024, 1, 8): '1.50', date(2024, 1, 9): '1.60'})
+        pair = dict(account=self.aud_account, convert_from='GBP', convert_to='AUD')
+        ExchangeRate.load_history(**pair, start_date=date(2024, 1, 8), end_date=date(2024, 1, 9))
+
+        # Nothing new to derive, but the path still covers the range, so there is nothing to fetch.
+        path, latest, fetch_ranges = ExchangeRate.prepare_history(
+            **pair, start_date=date(2024, 1, 9), end_date=date(2024, 1, 9),
+        )
+
+        mock_history.assert_not_called()
+        self.assertEqual(path, ['GBP', 'USD', 'AUD'])
+        self.assertIsNone(latest)
+        self.assertEqual(fetch_ranges, [])
+
+    @patch('share_dinkum_app.yfinanceinterface.get_exchange_rate_history')
+    def test_history_before_the_legs_is_fetched(self, mock_history):
+        mock_history.return_value = pd.DataFrame({
+            'convert_from': ['GBP'], 'convert_to': ['AUD'], 'date': [date(2024, 1, 2)],
+            'exchange_rate_multiplier': [Decimal('1.9')], 'is_continuous_history': [True],
+        })
+        self.store_history(self.usd_account, 'GBP', 'USD', {date(2024, 3, 4): '1.25', date(2024, 3, 5): '1.30'})
+        self.store_history(self.aud_account, 'USD', 'AUD', {date(2024, 3, 4): '1.50', date(2024, 3, 5): '1.60'})
+
+        latest = ExchangeRate.load_history(
+            account=self.aud_account, convert_from='GBP', convert_to='AUD',
+            start_date=date(2024, 1, 2), end_date=date(2024, 3, 5),
+        )
+
+        # Only the months before the legs begin are fetched; the rest is derived.
+        mock_history.assert_called_once_with(
+            convert_from='GBP', convert_to='AUD', start_date=date(2024, 1, 2), end_date=date(2024, 3, 3),
+        )
+        self.assertEqual(latest.date, date(2024, 3, 5))
+        stored = ExchangeRate.objects.filter(account=self.aud_account, convert_from='GBP').order_by('date')
+        self.assertEqual([r.date for r in stored], [date(2024, 1, 2), date(2024, 3, 4), date(2024, 3, 5)])
+        self.assertEqual(fxservice.get_series(self.aud_account, 'GBP', 'AUD').continuous_start, date(2024, 1, 2))
+
+    @patch('share_dinkum_app.yfinanceinterface.get_exchange_rate')
+    def test_single_date_is_derived_from_inverse_pair(self, mock_get_rate):
+        self.store_history(self.usd_account, 'AUD', 'USD', {date(2024, 1, 8): '0.80', date(2024, 1, 10): '0.64'})
+
+        rate = ExchangeRate.get_or_create(
+            account=self.aud_account, convert_from='USD', convert_to='AUD', exchange_date=date(2024, 1, 9),
+        )
+
+        mock_get_rate.assert_not_called()
+        self.assertEqual(rate.exchange_rate_multiplier, Decimal('1.25'))
+        self.assertEqual(rate.source, ExchangeRate.SOURCE_DERIVED)
+        self.assertEqual(rate.derivation, 'USD>AUD')
+
+    @patch('share_dinkum_app.yfinanceinterface.get_exchange_rate')
+    def test_fetches_when_no_path_exists(self, mock_get_rate):
+        mock_get_rate.return_value = Decimal('1.9')
+        self.store_history(self.usd_account, 'JPY', 'USD', {date(2024, 1, 8): '0.007'})
+
+        rate = ExchangeRate.get_or_create(
+            account=self.aud_account, convert_from='GBP', convert_to='AUD', exchange_date=date(2024, 1, 9),
+        )
+
+        mock_get_rate.assert_called_once()
+        self.assertEqual(rate.exchange_rate_multiplier, Decimal('1.9'))
+        self.assertEqual(rate.source, ExchangeRate.SOURCE_MARKET)
+
+    @patch('share_dinkum_app.yfinanceinterface.get_current_exchange_rate')
+    def test_current_rate_is_derived_from_fresh_legs(self, mock_quote):
+        older = datetime.now(UTC) - timedelta(minutes=20)
+        CurrentExchangeRate.objects.create(
+            account=self.usd_account, convert_from='GBP', convert_to='USD',
+            exchange_rate_multiplier=Decimal('1.25'), rate_timestamp=older,
+        )
+        CurrentExchangeRate.objects.create(
+            account=self.aud_account, convert_from='USD', convert_to='AUD',
+            exchange_rate_multiplier=Decimal('1.5'), rate_timestamp=datetime.now(UTC),
+        )
+
+        current = CurrentExchangeRate.refresh(account=self.aud_account, convert_from='GBP', convert_to='AUD')
+
+        mock_quote.assert_not_called()
+        self.assertEqual(current.exchange_rate_multiplier, Decimal('1.875'))
+        self.assertEqual(current.rate_timestamp, older)
+        self.assertEqual(current.derivation, 'GBP>USD>AUD')
+
+
 # =============================================================================
 # Models: Market, Instrument
 # =============================================================================
@@ -666,6 +1261,73 @@ class MarketTests(TestCase):
             Market.objects.create(account=acc, code='ASX')
 
 
+class MarketCalendarTests(TestCase):
+    """Tests for Market trading hours and holidays, and the refresh scheduling built on them."""
+
+    # Friday 26 January 2024 is Australia Day. Times are Sydney (UTC+11) unless marked otherwise.
+    def setUp(self):
+        self.acc = create_account()
+        self.market = create_market(account=self.acc, code='ASX')
+        MarketHoliday.objects.create(account=self.acc, market=self.market, date=date(2024, 1, 26), description='Australia Day')
+        self.market = Market.objects.get(pk=self.market.pk)
+
+    def sydney(self, day, hour):
+        return datetime(2024, 1, day, hour, 0, tzinfo=UTC) - timedelta(hours=11)
+
+    def test_known_market_gets_its_hours(self):
+        self.assertEqual(self.market.timezone, 'Australia/Sydney')
+        self.assertEqual((self.market.open_time.hour, self.market.close_time.hour), (10, 16))
+
+    def test_sessions_follow_hours_weekends_and_holidays(self):
+        self.assertTrue(self.market.is_open(self.sydney(25, 11)))
+        self.assertFalse(self.market.is_open(self.sydney(25, 17)))
+        self.assertFalse(self.market.is_open(self.sydney(26, 11)))
+        self.assertEqual(self.market.latest_session(self.sydney(25, 11)), date(2024, 1, 24))
+        self.assertEqual(self.market.latest_session(self.sydney(25, 17)), date(2024, 1, 25))
+        # Over the long weekend, Thursday's close is the latest there is.
+        self.assertEqual(self.market.latest_session(self.sydney(28, 12)), date(2024, 1, 25))
+        self.assertEqual(self.market.trading_days(date(2024, 1, 24), date(2024, 1, 30)), [
+            date(2024, 1, 24), date(2024, 1, 25), date(2024, 1, 29), date(2024, 1, 30),
+        ])
+
+    def test_price_history_is_not_due_while_market_stays_closed(self):
+        inst = create_instrument(account=self.acc, market=self.market)
+        SecurityPriceHistory.objects.create(
+            security=inst.security, date=date(2024, 1, 25), open=Decimal('10'), high=Decimal('10'),
+            low=Decimal('10'), close=Decimal('10'), volume=1000, stock_splits=Decimal('0'),
+        )
+        inst = Instrument.objects.select_related('market').get(pk=inst.pk)
+        end_date = date(2024, 1, 31)
+        self.assertIsNone(inst.price_history_start_date(end_date, now=self.sydney(28, 12)))
+        self.assertEqual(inst.price_history_start_date(end_date, now=self.sydney(29, 11)), date(2024, 1, 25))
+
+    def test_fx_market_closed_over_weekend(self):
+        self.assertIsNone(scheduler.fx_market_closed_at(datetime(2024, 1, 26, 21, 0, tzinfo=UTC)))
+        friday_close = datetime(2024, 1, 26, 22, 0, tzinfo=UTC)
+        self.assertEqual(scheduler.fx_market_closed_at(datetime(2024, 1, 27, 9, 0, tzinfo=UTC)), friday_close)
+        self.assertEqual(scheduler.fx_market_closed_at(datetime(2024, 1, 28, 21, 0, tzinfo=UTC)), friday_close)
+        self.assertIsNone(scheduler.fx_market_closed_at(datetime(2024, 1, 28, 23, 0, tzinfo=UTC)))
+
+    @patch('share_dinkum_app.scheduler.CurrentExchangeRate.refresh_stale', return_value=0)
+    @patch('share_dinkum_app.scheduler.marketrefresh.refresh_accounts')
+    def test_scheduler_skips_accounts_with_nothing_due(self, mock_refresh, mock_stale):
+        inst = create_instrument(account=self.acc, market=self.market)
+        Buy.objects.create(
+            account=self.acc, instrument=inst, date=date(2024, 1, 25), quantity=Decimal('10'),
+            unit_price=Money(50, 'AUD'), total_brokerage=Money(0, 'AUD'),
+        )
+        SecurityPriceHistory.objects.create(
+            security=inst.security, date=date(2024, 1, 25), open=Decimal('10'), high=Decimal('10'),
+            low=Decimal('10'), close=Decimal('10'), volume=1000, stock_splits=Decimal('0'),
+        )
+        self.assertEqual(scheduler.run_once(now=self.sydney(27, 12)), (0, 0))
+        mock_refresh.assert_not_called()
+        mock_stale.assert_called_once_with(settled_after=datetime(2024, 1, 26, 22, 0, tzinfo=UTC))
+
+        scheduler.run_once(now=self.sydney(29, 17))
+        mock_refresh.assert_called_once()
+
+
 class InstrumentTests(TestCase):
     """Tests for Instrument model."""
 
@@ -889,19 +1551,44 @@ class LogEntryTests(TestCase):
 
 
 # =============================================================================
-# Models: InstrumentPriceHistory
+# Models: Security, SecurityPriceHistory
 # =============================================================================
 
 
-class InstrumentPriceHistoryTests(TestCase):
-    """Tests for InstrumentPriceHistory (get_absolute_url)."""
+class SecurityPriceHistoryTests(TestCase):
+    """Tests for Security and SecurityPriceHistory (sharing by ticker, ingestion, get_absolute_url)."""
+
+    def test_instruments_on_the_same_ticker_share_a_security(self):
+        first = create_account()
+        second = Account.objects.create(
+            owner=create_user('second'), currency='AUD', description='Second', fiscal_year_type=first.fiscal_year_type,
+        )
+        held = create_instrument(account=first, market=create_market(account=first), name='BHP')
+        new = create_instrument(account=second, market=create_market(account=second), name='BHP')
+        self.assertEqual(held.security_id, new.security_id)
+        self.assertEqual(Security.objects.get().ticker_code, 'BHP.AX')
+
+        SecurityPriceHistory.objects.create(
+            security=held.security, date=date(2024, 1, 25), open=Decimal('10'), high=Decimal('10'),
+            low=Decimal('10'), close=Decimal('10'), volume=1000, stock_splits=Decimal('0'),
+        )
+        Buy.objects.create(
+            account=second, instrument=new, date=date(2024, 1, 10), quantity=Decimal('10'),
+            unit_price=Money(50, 'AUD'), total_brokerage=Money(0, 'AUD'),
+        )
+        # The shared series does not reach back to the second account's buy, so that is backfilled.
+        self.assertEqual(new.price_history_start_date(date(2024, 1, 31)), date(2024, 1, 10))
+
+        new.name = 'RIO'
+        new.save()
+        self.assertEqual(new.security.ticker_code, 'RIO.AX')
+
 
     def test_get_absolute_url(self):
         acc = create_account()
         inst = create_instrument(account=acc)
-        iph = InstrumentPriceHistory.objects.create(
-            account=acc,
-            instrument=inst,
+        iph = SecurityPriceHistory.objects.create(
+            security=inst.security,
             date=date(2024, 1, 15),
             open=Decimal('10'),
             high=Decimal('11'),
@@ -914,6 +1601,447 @@ class InstrumentPriceHistoryTests(TestCase):
         self.assertIn('admin', url)
         self.assertIn(str(iph.id), url)
 
+    @override_settings(PRICE_HISTORY_INSERT_BATCH_SIZE=100)
+    def test_ingest_stores_long_history_in_batches(self):
+        acc = create_account()
+        inst = create_instrument(account=acc)
+        days = pd.bdate_range('2020-01-01', periods=750).date
+        closes = [10 + i / 1000 for i in range(len(days))]
+        price_history = pd.DataFrame({
+            'instrument': inst, 'date': days, 'open': closes, 'high': closes, 'low': closes,
+            'close': closes, 'volume': [1000.0] * len(days), 'stock_splits': 0.0,
+        })
+        price_history.loc[5, 'close'] = float('nan')
+
+        self.assertTrue(inst.ingest_price_history(price_history))
+
+        stored = SecurityPriceHistory.objects.filter(security=inst.security)
+        self.assertEqual(stored.count(), len(days) - 1)
+        last = stored.order_by('-date').first()
+        self.assertEqual((last.date, last.close, last.volume), (days[-1], Decimal('10.749'), 1000))
+        inst.refresh_from_db()
+        self.assertEqual(inst.current_unit_price, Decimal('10.749'))
+
+        # Fetching a bar again replaces it.
+        self.assertTrue(inst.ingest_price_history(price_history.tail(1).assign(close=11.0)))
+        self.assertEqual(stored.order_by('-date').first().close, Decimal('11'))
+
+
+class PriceStoreTests(TestCase):
+    """Tests for the columnar price store in pricestore."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.settings_override = override_settings(PRICE_STORE=True, PRICE_STORE_DIR=self.directory.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.acc = create_account()
+        self.inst = create_instrument(account=self.acc)
+
+    def ingest(self, days, closes):
+        price_history = pd.DataFrame({
+            'instrument': self.inst, 'date': days, 'open': closes, 'high': closes, 'low': closes,
+            'close': closes, 'volume': 1000.0, 'stock_splits': 0.0,
+        })
+        with self.captureOnCommitCallbacks(execute=True):
+            self.inst.ingest_price_history(price_history)
+
+    def test_read_builds_store_from_table_and_slices_range(self):
+        self.ingest([date(2024, 1, 15), date(2024, 1, 16), date(2024, 1, 17)], [10.0, 11.0, 12.0])
+        self.assertFalse((Path(self.directory.name) / f'{self.inst.security_id}.npy').exists())
+
+        series = pricestore.read(self.inst.security_id, date(2024, 1, 16), date(2024, 1, 31), columns=('close', 'volume'))
+        self.assertTrue((Path(self.directory.name) / f'{self.inst.security_id}.npy').exists())
+        self.assertEqual(series['close'].dtype, np.float64)
+        self.assertEqual(series['volume'].dtype, np.int64)
+        self.assertEqual(list(series['date']), [np.datetime64('2024-01-16'), np.datetime64('2024-01-17')])
+        self.assertEqual(list(series['close']), [11.0, 12.0])
+
+    def test_ingest_merges_into_existing_store(self):
+        self.ingest([date(2024, 1, 15), date(2024, 1, 16)], [10.0, 11.0])
+        pricestore.read(self.inst.security_id)
+        self.ingest([date(2024, 1, 16), date(2024, 1, 17)], [11.5, 12.0])
+
+        series = pricestore.read(self.inst.security_id)
+        self.assertIsInstance(series['close'].base, np.memmap)
+        self.assertEqual(list(series['close']), [10.0, 11.5, 12.0])
+
+    def test_saving_a_row_discards_the_store(self):
+        self.ingest([date(2024, 1, 15)], [10.0])
+        pricestore.read(self.inst.security_id)
+        SecurityPriceHistory.objects.create(
+            security=self.inst.security, date=date(2024, 1, 12), open=Decimal('9'), high=Decimal('9'),
+            low=Decimal('9'), close=Decimal('9'), volume=1000, stock_splits=Decimal('0'),
+        )
+        self.assertFalse((Path(self.directory.name) / f'{self.inst.security_id}.npy').exists())
+        self.assertEqual(list(pricestore.read(self.inst.security_id)['close']), [9.0, 10.0])
+
+    def test_store_off_reads_table(self):
+        self.ingest([date(2024, 1, 15)], [10.0])
+        with override_settings(PRICE_STORE=False):
+            series = pricestore.read(self.inst.security_id)
+        self.assertEqual(list(series['close']), [10.0])
+        self.assertFalse((Path(self.directory.name) / f'{self.inst.security_id}.npy').exists())
+
+
+class PriceRollupTests(TestCase):
+    """Tests for the weekly and monthly rollups in pricerollups."""
+
+    def setUp(self):
+        self.acc = create_account()
+        self.inst = create_instrument(account=self.acc)
+        self.security = self.inst.security
+
+    def ingest(self, days, closes):
+        self.security.ingest_price_history(pd.DataFrame({
+            'date': days, 'open': closes, 'high': [close + 1 for close in closes], 'low': [close - 1 for close in closes],
+            'close': closes, 'volume': 100.0, 'stock_splits': 0.0,
+        }))
+
+    def rollup(self, period, start):
+        return SecurityPriceRollup.objects.get(security=self.security, period=period, start=start)
+
+    def test_ingest_maintains_weekly_and_monthly_rollups(self):
+        days = list(pd.bdate_range('2024-01-01', '2024-02-29').date)
+        self.ingest(days, [10.0 + i for i in range(len(days))])
+
+        self.assertEqual(SecurityPriceRollup.objects.filter(security=self.security, period='M').count(), 2)
+        self.assertEqual(SecurityPriceRollup.objects.filter(security=self.security, period='W').count(), 9)
+        january = self.rollup('M', date(2024, 1, 1))
+        self.assertEqual(
+            (january.date, january.open, january.high, january.low, january.close, january.volume, january.days),
+            (date(2024, 1, 31), Decimal('10'), Decimal('33'), Decimal('9'), Decimal('32'), 2300, 23),
+        )
+        week = self.rollup('W', date(2024, 1, 8))
+        self.assertEqual((week.date, week.open, week.close), (date(2024, 1, 12), Decimal('15'), Decimal('19')))
+
+        # A corrected bar updates only the periods it falls in.
+        self.ingest([date(2024, 1, 31)], [99.0])
+        self.assertEqual(self.rollup('M', date(2024, 1, 1)).high, Decimal('100'))
+        self.assertEqual(self.rollup('M', date(2024, 2, 1)).open, Decimal('33'))
+
+    def test_deleting_rows_updates_rollups(self):
+        self.ingest([date(2024, 1, 8), date(2024, 1, 9)], [10.0, 11.0])
+        SecurityPriceHistory.objects.get(security=self.security, date=date(2024, 1, 9)).delete()
+        self.assertEqual(self.rollup('W', date(2024, 1, 8)).close, Decimal('10'))
+        SecurityPriceHistory.objects.get(security=self.security, date=date(2024, 1, 8)).delete()
+        self.assertFalse(SecurityPriceRollup.objects.filter(security=self.security).exists())
+
+    def test_read_picks_finest_resolution_within_points(self):
+        days = list(pd.bdate_range('2010-01-01', '2024-12-31').date)
+        self.ingest(days, [10.0] * len(days))
+
+        resolution, frame = self.security.price_series(date(2010, 1, 1), date(2024, 12, 31), max_points=200)
+        self.assertEqual(resolution, pricerollups.RESOLUTION_MONTH)
+        self.assertEqual(len(frame), 180)
+        self.assertEqual(list(frame.columns), pricerollups.COLUMNS)
+
+        resolution, frame = self.security.price_series(date(2024, 1, 1), date(2024, 12, 31), max_points=200)
+        self.assertEqual(resolution, pricerollups.RESOLUTION_WEEK)
+
+        resolution, frame = self.security.price_series(date(2024, 12, 1), date(2024, 12, 31), max_points=200)
+        self.assertEqual((resolution, len(frame)), (pricerollups.RESOLUTION_DAY, 22))
+
+
+class AdjustedCloseTests(TestCase):
+    """Tests for as-traded storage and split-adjusted closes in priceadjust."""
+
+    def setUp(self):
+        self.acc = create_account()
+        self.inst = create_instrument(account=self.acc)
+        self.security = self.inst.security
+
+    def ingest(self, days, closes, splits=()):
+        # As Yahoo Finance returns it: closes before each split already divided by its factor.
+        self.security.ingest_price_history(pd.DataFrame({
+            'date': days, 'open': closes, 'high': closes, 'low': closes, 'close': closes, 'volume': 100.0,
+            'stock_splits': [dict(splits).get(day, 0.0) for day in days],
+        }))
+
+    def stored(self, field):
+        return [
+            getattr(row, field) for row in SecurityPriceHistory.objects.filter(security=self.security).order_by('date')
+        ]
+
+    def test_later_factors(self):
+        splits = {date(2024, 1, 10): 2, date(2024, 1, 20): 3}
+        factors = priceadjust.later_factors([date(2024, 1, 9), date(2024, 1, 10), date(2024, 1, 25)], splits)
+        self.assertEqual(list(factors), [6.0, 3.0, 1.0])
+
+    def test_ingest_stores_as_traded_and_adjusts_closes(self):
+        days = [date(2024, 1, day) for day in (8, 9, 10, 11, 12)]
+        self.ingest(days, [50.0, 51.0, 52.0, 53.0, 54.0], splits=[(date(2024, 1, 10), 2.0)])
+
+        self.assertEqual(self.stored('close'), [Decimal('100'), Decimal('102'), Decimal('52'), Decimal('53'), Decimal('54')])
+        self.assertEqual(self.stored('volume'), [50, 50, 100, 100, 100])
+        self.assertEqual(self.stored('adjusted_close'), [Decimal('50'), Decimal('51'), Decimal('52'), Decimal('53'), Decimal('54')])
+
+        # A new split adjusts every earlier close again.
+        self.ingest([date(2024, 1, 15), date(2024, 1, 16)], [20.0, 21.0], splits=[(date(2024, 1, 16), 3.0)])
+        self.assertEqual(self.stored('close')[-2:], [Decimal('60'), Decimal('21')])
+        self.assertEqual(
+            self.stored('adjusted_close'),
+            [Decimal('16.666667'), Decimal('17'), Decimal('17.333333'), Decimal('17.666667'), Decimal('18'), Decimal('20'), Decimal('21')],
+        )
+
+    def test_share_split_adjusts_closes(self):
+        self.ingest([date(2024, 1, 8), date(2024, 1, 9)], [100.0, 50.0])
+        ShareSplit.objects.create(
+            account=self.acc, instrument=self.inst, quantity_before=Decimal('1'), quantity_after=Decimal('2'),
+            date=date(2024, 1, 9),
+        )
+        self.assertEqual(self.stored('adjusted_close'), [Decimal('50'), Decimal('50')])
+
+    def test_rollups_keep_the_adjusted_close(self):
+        self.ingest([date(2024, 1, 8), date(2024, 1, 15), date(2024, 1, 16)], [40.0, 60.0, 30.0])
+        weekly = SecurityPriceRollup.objects.filter(security=self.security, period='W').order_by('start')
+        self.assertEqual([(rollup.close, rollup.adjusted_close) for rollup in weekly.all()], [(Decimal('40'), Decimal('40')), (Decimal('30'), Decimal('30'))])
+
+        # A split adjusts the rollups before it along with the daily rows.
+        ShareSplit.objects.create(
+            account=self.acc, instrument=self.inst, quantity_before=Decimal('1'), quantity_after=Decimal('2'),
+            date=date(2024, 1, 16),
+        )
+        self.assertEqual([(rollup.close, rollup.adjusted_close) for rollup in weekly.all()], [(Decimal('40'), Decimal('20')), (Decimal('30'), Decimal('30'))])
+
+    def test_restore_as_traded_undoes_adjustment_for_earlier_fetches(self):
+        stored = pd.DataFrame({
+            'date': [date(2024, 1, 8), date(2024, 1, 9), date(2024, 1, 10)],
+            'open': [50.0, 51.0, 52.0], 'high': [50.0, 51.0, 52.0], 'low': [50.0, 51.0, 52.0],
+            'close': [50.0, 51.0, 52.0], 'volume': [200, 200, 100], 'stock_splits': [0.0, 0.0, 2.0],
+        })
+        self.assertEqual(list(priceadjust.restore_as_traded(stored)['close']), [100.0, 102.0, 52.0])
+        # Already as traded: unchanged.
+        as_traded = stored.assign(close=[100.0, 102.0, 52.0])
+        self.assertEqual(list(priceadjust.restore_as_traded(as_traded)['close']), [100.0, 102.0, 52.0])
+
+
+class AccountUpdateAllPriceHistoryTests(TransactionTestCase):
+    """Tests for Account.update_all_price_history (with yfinance mocked)."""
+
+    @patch('share_dinkum_app.yfinanceinterface.get_current_quotes')
+    @patch('share_dinkum_app.yfinanceinterface.get_instrument_price_history')
+    @patch('share_dinkum_app.yfinanceinterface.get_price_history_batch')
+    def test_fetches_all_held_instruments_in_one_request(self, mock_batch, mock_single, mock_quotes):
+        acc = create_account()
+        market = create_market(account=acc)
+        bhp = create_instrument(account=acc, market=market, name='BHP')
+        cba = create_instrument(account=acc, market=market, name='CBA')
+        for inst in (bhp, cba):
+            Buy.objects.create(
+                account=acc, instrument=inst, date=date(2024, 1, 10), quantity=Decimal('10'),
+                unit_price=Money(50, 'AUD'), total_brokerage=Money(0, 'AUD'),
+            )
+
+        def batch(instruments, start_date, end_date):
+            rows = []
+            for inst in instruments:
+                for day, close in [(10, 50.0), (11, 52.0)]:
+                    rows.append({
+                        'ticker': inst.yfinance_ticker_code, 'instrument': inst, 'date': date(2024, 1, day),
+                        'open': close, 'high': close, 'low': close, 'close': close, 'volume': 100, 'stock_splits': 0.0,
+                    })
+            return pd.DataFrame(rows)
+        mock_batch.side_effect = batch
+        quote_time = datetime(2024, 1, 12, 3, 0, tzinfo=UTC)
+        mock_quotes.return_value = {'BHP.AX': (Decimal('53.25'), quote_time)}
+
+        acc.update_all_price_history()
+
+        mock_batch.assert_called_once()
+        self.assertEqual({i.pk for i in mock_batch.call_args.kwargs['instruments']}, {bhp.pk, cba.pk})
+        mock_single.assert_not_called()
+        mock_quotes.assert_called_once_with(['BHP.AX', 'CBA.AX'])
+        self.assertEqual(SecurityPriceHistory.objects.filter(security__instruments__account=acc).count(), 4)
+        bhp.refresh_from_db()
+        self.assertEqual(bhp.current_unit_price, Decimal('53.25'))
+        self.assertEqual(bhp.current_unit_price_timestamp, quote_time)
+        # No quote for CBA, so its last close stands in.
+        cba.refresh_from_db()
+        self.assertEqual(cba.current_unit_price, Decimal('52'))
+
+
+class TokenBucketTests(TestCase):
+    """Tests for pricerefresh.TokenBucket and fetch_all."""
+
+    def test_bucket_waits_once_burst_is_spent(self):
+        bucket = pricerefresh.TokenBucket(rate=20, capacity=2)
+        started = time.monotonic()
+        for _ in range(4):
+            bucket.acquire()
+        # Two tokens up front, then two more at 20 per second.
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+
+    def test_fetch_all_keeps_order_and_isolates_failures(self):
+        def fail():
+            raise RuntimeError('boom')
+
+        results = pricerefresh.fetch_all([lambda: 1, fail, lambda: 3], workers=3, rate=100)
+        self.assertEqual(results, [1, None, 3])
+
+    def test_gather_all_keeps_order_and_isolates_failures(self):
+        def fail():
+            raise RuntimeError('boom')
+
+        results = asyncio.run(pricerefresh.gather_all([lambda: 1, fail, lambda: 3], concurrency=2, rate=100))
+        self.assertEqual(results, [1, None, 3])
+
+
+class MarketRefreshTests(TransactionTestCase):
+    """Tests for marketrefresh.refresh_accounts and the refresh_market_data command, reading from files."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        for ticker in ('BHP.AX', 'IVV.AX'):
+            pd.DataFrame({
+                'date': ['2024-01-10', '2024-01-11'], 'close': [50.0, 52.0],
+            }).to_csv(Path(self.directory.name) / f'{ticker}.csv', index=False)
+        pd.DataFrame({
+            'date': ['2024-01-10', '2024-01-11'], 'close': [1.49, 1.51],
+        }).to_csv(Path(self.directory.name) / 'USDAUD=X.csv', index=False)
+        self.settings_override = override_settings(MARKET_DATA_PROVIDER='file', MARKET_DATA_DIR=self.directory.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        fxservice.invalidate()
+
+    def create_holding(self, acc, name, currency, market=None):
+        market = market or create_market(account=acc)
+        inst = create_instrument(account=acc, market=market, name=name, currency=currency)
+        Buy.objects.create(
+            account=acc, instrument=inst, date=date(2024, 1, 10), quantity=Decimal('10'),
+            unit_price=Money(50, currency), total_brokerage=Money(0, currency),
+        )
+        return inst
+
+    def test_refreshes_several_accounts_in_one_pass(self):
+        first = create_account()
+        second = Account.objects.create(
+            owner=create_user('second'), currency='AUD', description='Second', fiscal_year_type=first.fiscal_year_type,
+        )
+        bhp = self.create_holding(first, 'BHP', 'AUD')
+        ivv = self.create_holding(second, 'IVV', 'USD')
+
+        marketrefresh.refresh_accounts([first, second], concurrency=4, rate=100)
+
+        self.assertEqual(SecurityPriceHistory.objects.filter(security=bhp.security).count(), 2)
+        self.assertEqual(SecurityPriceHistory.objects.filter(security=ivv.security).count(), 2)
+        ivv.refresh_from_db()
+        self.assertEqual(ivv.current_unit_price, Decimal('52'))
+        self.assertTrue(ExchangeRate.objects.filter(account=second, convert_from='USD', date=date(2024, 1, 11)).exists())
+        current = CurrentExchangeRate.objects.get(account=second, convert_from='USD', convert_to='AUD')
+        self.assertEqual(current.exchange_rate_multiplier, Decimal('1.51'))
+        self.assertFalse(ExchangeRate.objects.filter(account=first).exists())
+
+    def test_pair_derived_through_pivot_waits_for_its_legs(self):
+        pd.DataFrame({
+            'date': ['2024-01-10', '2024-01-11'], 'close': [1.25, 1.30],
+        }).to_csv(Path(self.directory.name) / 'GBPUSD=X.csv', index=False)
+        aud = create_account()
+        usd = Account.objects.create(
+            owner=create_user('usd'), currency='USD', description='USD', fiscal_year_type=aud.fiscal_year_type,
+        )
+        ivv = self.create_holding(aud, 'IVV', 'USD')
+        self.create_holding(usd, 'BHP', 'GBP')
+        self.create_holding(aud, 'LLOY', 'GBP', market=ivv.market)
+        # Each pair has been refreshed before, up to the 10th, over what the buys looked up.
+        for acc, convert_from, convert_to, rate, source in [
+            (usd, 'GBP', 'USD', '1.25', ExchangeRate.SOURCE_MARKET),
+            (aud, 'USD', 'AUD', '1.49', ExchangeRate.SOURCE_MARKET),
+            (aud, 'GBP', 'AUD', '1.8625', ExchangeRate.SOURCE_DERIVED),
+        ]:
+            ExchangeRate.objects.update_or_create(
+                account=acc, convert_from=convert_from, convert_to=convert_to, date=date(2024, 1, 10),
+                defaults=dict(exchange_rate_multiplier=Decimal(rate), is_continuous_history=True, source=source),
+            )
+        fxservice.invalidate()
+
+        with patch.object(marketdata.FileProvider, 'get_exchange_rate_history', autospec=True,
+                          side_effect=marketdata.FileProvider.get_exchange_rate_history) as mock_history:
+            marketrefresh.refresh_accounts([aud, usd], concurrency=4, rate=100)
+
+        fetched = {(c.kwargs['convert_from'], c.kwargs['convert_to']) for c in mock_history.call_args_list}
+        self.assertEqual(fetched, {('GBP', 'USD'), ('USD', 'AUD')})
+        derived = ExchangeRate.objects.get(account=aud, convert_from='GBP', date=date(2024, 1, 11))
+        self.assertEqual(derived.source, ExchangeRate.SOURCE_DERIVED)
+        self.assertEqual(derived.exchange_rate_multiplier, Decimal('1.963'))
+
+    def test_accounts_holding_the_same_ticker_share_one_fetch(self):
+        first = create_account()
+        second = Account.objects.create(
+            owner=create_user('second'), currency='AUD', description='Second', fiscal_year_type=first.fiscal_year_type,
+        )
+        held = [self.create_holding(acc, 'BHP', 'AUD') for acc in (first, second)]
+
+        # One price history batch and one quote request, for both accounts.
+        self.assertEqual(marketrefresh.refresh_accounts([first, second], concurrency=4, rate=100), 2)
+
+        self.assertEqual(SecurityPriceHistory.objects.count(), 2)
+        for inst in held:
+            inst.refresh_from_db()
+            self.assertEqual(inst.current_unit_price, Decimal('52'))
+
+    def test_command_refreshes_given_account(self):
+        acc = create_account()
+        bhp = self.create_holding(acc, 'BHP', 'AUD')
+        call_command('refresh_market_data', '--async', '--account', str(acc.pk))
+        self.assertEqual(SecurityPriceHistory.objects.filter(security=bhp.security).count(), 2)
+
+
+class PriceBackfillTests(TestCase):
+    """Tests for price history gap detection and Account.backfill_price_history, reading from files."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        days = pd.bdate_range('2024-01-08', '2024-01-19')
+        pd.DataFrame({
+            'date': days.strftime('%Y-%m-%d'), 'close': [50.0 + i for i in range(len(days))],
+        }).to_csv(Path(self.directory.name) / 'BHP.AX.csv', index=False)
+        self.settings_override = override_settings(MARKET_DATA_PROVIDER='file', MARKET_DATA_DIR=self.directory.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        self.acc = create_account()
+        self.inst = create_instrument(account=self.acc, market=create_market(account=self.acc), name='BHP')
+        Buy.objects.create(
+            account=self.acc, instrument=self.inst, date=date(2024, 1, 8), quantity=Decimal('10'),
+            unit_price=Money(50, 'AUD'), total_brokerage=Money(0, 'AUD'),
+        )
+        for day in (8, 9, 12, 18):
+            SecurityPriceHistory.objects.create(
+                security=self.inst.security, date=date(2024, 1, day), open=Decimal('10'), high=Decimal('10'),
+                low=Decimal('10'), close=Decimal('10'), volume=1000, stock_splits=Decimal('0'),
+            )
+        # 5pm in Sydney, after Friday's close.
+        self.now = datetime(2024, 1, 19, 6, 0, tzinfo=UTC)
+
+    def test_coverage_lists_missing_trading_days(self):
+        trading_days, missing_days = self.inst.price_history_coverage(now=self.now)
+        self.assertEqual(len(trading_days), 10)
+        self.assertEqual([day.day for day in missing_days], [10, 11, 15, 16, 17, 19])
+
+    def test_gaps_are_coalesced(self):
+        with override_settings(PRICE_BACKFILL_MERGE_DAYS=0):
+            self.assertEqual(self.inst.price_history_gaps(now=self.now), [
+                (date(2024, 1, 10), date(2024, 1, 11)),
+                (date(2024, 1, 15), date(2024, 1, 17)),
+                (date(2024, 1, 19), date(2024, 1, 19)),
+            ])
+        with override_settings(PRICE_BACKFILL_MERGE_DAYS=1):
+            self.assertEqual(self.inst.price_history_gaps(now=self.now), [(date(2024, 1, 10), date(2024, 1, 19))])
+
+    @override_settings(PRICE_BACKFILL_MERGE_DAYS=0)
+    def test_backfill_fetches_only_the_gaps(self):
+        self.assertEqual(self.acc.backfill_price_history(now=self.now), 3)
+
+        self.assertEqual(self.inst.price_history_coverage(now=self.now)[1], [])
+        self.assertEqual(SecurityPriceHistory.objects.get(security=self.inst.security, date=date(2024, 1, 15)).close, Decimal('55'))
+        # Stored days between the gaps were not refetched.
+        self.assertEqual(SecurityPriceHistory.objects.get(security=self.inst.security, date=date(2024, 1, 12)).close, Decimal('10'))
+        self.assertEqual(self.acc.backfill_price_history(now=self.now), 0)
+
 
 # =============================================================================
 # Models: Dividend
@@ -943,6 +2071,36 @@ class DividendTests(TestCase):
 # =============================================================================
 
 
+class IncomeReportTests(TestCase):
+    """Tests for IncomeReport and the grouped income totals behind it."""
+
+    def setUp(self):
+        self.acc = create_account()
+        inst = create_instrument(account=self.acc)
+        for paid, franked in [(date(2023, 9, 1), '0.50'), (date(2024, 3, 1), '0.25'), (date(2024, 9, 1), '1.00')]:
+            Dividend.objects.create(
+                account=self.acc, instrument=inst, date=paid, quantity=Decimal('100'),
+                franked_amount_per_share=Money(Decimal(franked), 'AUD'), unfranked_amount_per_share=Money(0, 'AUD'),
+            )
+        Distribution.objects.create(
+            account=self.acc, instrument=inst, date=date(2024, 3, 1), quantity=Decimal('100'),
+            distribution_amount_per_share=Money(Decimal('0.10'), 'AUD'),
+        )
+
+    def test_totals_by_fiscal_year(self):
+        with self.assertNumQueries(2):
+            df = IncomeReport(account=self.acc).generate()
+
+        self.assertEqual(df['fiscal_year'].tolist(), ['FY2023/24', 'FY2024/25'])
+        self.assertEqual(df['dividends'].tolist(), [Decimal('75'), Decimal('100')])
+        self.assertEqual(df['distributions'].tolist(), [Decimal('10'), Decimal('0')])
+        self.assertEqual(df['total_income'].tolist(), [Decimal('85'), Decimal('100')])
+
+    def test_date_range(self):
+        df = IncomeReport(account=self.acc).generate(start_date=date(2024, 1, 1), end_date=date(2024, 6, 30))
+        self.assertEqual(df['total_income'].tolist(), [Decimal('35')])
+
+
 class RealisedCapitalGainReportTests(TestCase):
     """Tests for RealisedCapitalGainReport."""
 
@@ -988,6 +2146,483 @@ class RealisedCapitalGainReportTests(TestCase):
         self.assertIn('capital_gain', df.columns)
 
 
+class PriceCoverageReportTests(TestCase):
+    """Tests for PriceCoverageReport."""
+
+    def test_lists_only_incomplete_instruments(self):
+        acc = create_account()
+        market = create_market(account=acc)
+        now = datetime(2024, 1, 12, 6, 0, tzinfo=UTC)
+        for name, stored_days in [('BHP', (8, 9, 10, 11, 12)), ('CBA', (8, 12))]:
+            inst = create_instrument(account=acc, market=market, name=name)
+            Buy.objects.create(
+                account=acc, instrument=inst, date=date(2024, 1, 8), quantity=Decimal('10'),
+                unit_price=Money(50, 'AUD'), total_brokerage=Money(0, 'AUD'),
+            )
+            for day in stored_days:
+                SecurityPriceHistory.objects.create(
+                    security=inst.security, date=date(2024, 1, day), open=Decimal('10'), high=Decimal('10'),
+                    low=Decimal('10'), close=Decimal('10'), volume=1000, stock_splits=Decimal('0'),
+                )
+
+        df = PriceCoverageReport(account=acc).generate(now=now)
+        self.assertEqual(list(df['instrument']), ['CBA'])
+        row = df.iloc[0]
+        self.assertEqual((row['trading_days'], row['stored_days'], row['missing_days']), (5, 2, 3))
+        self.assertEqual(row['missing_ranges'], '2024-01-09 to 2024-01-11')
+
+
+# =============================================================================
+# Dashboard series
+# =============================================================================
+
+
+class DashboardSeriesTests(TestCase):
+    """Tests for the holdings and value matrices in dashboardseries."""
+
+    def test_compute_carries_prices_and_rates_forward(self):
+        dates = pd.date_range('2024-01-09', '2024-01-14', freq='D')
+        trades = pd.DataFrame({
+            'instrument_id': ['bhp', 'ivv', 'bhp'],
+            'date': [date(2024, 1, 10), date(2024, 1, 10), date(2024, 1, 12)],
+            'quantity': [10.0, 5.0, -4.0],
+        })
+        prices = pd.DataFrame({
+            'instrument_id': ['bhp', 'ivv', 'bhp'],
+            'date': [date(2024, 1, 11), date(2024, 1, 11), date(2024, 1, 13)],
+            'close': [51.0, 400.0, 52.0],
+        })
+        rates = {'USD': dashboardseries.exchange_rates(
+            dates, ([date(2024, 1, 12)], [Decimal('1.5')]), fallback=Decimal('1.4'),
+        )}
+
+        quantities, values = dashboardseries.compute(
+            dates, ['bhp', 'ivv'], trades, prices,
+            initial_prices={'bhp': 50.0}, currencies={'ivv': 'USD'}, rates=rates,
+        )
+
+        self.assertEqual(quantities[:, 0].tolist(), [0, 10, 10, 6, 6, 6])
+        self.assertEqual(values[:, 0].tolist(), [0, 500, 510, 306, 312, 312])
+        # No IVV price until the 11th; the stored rate applies from the 12th.
+        self.assertEqual(values[:, 1].tolist(), [0, 0, 2800, 3000, 3000, 3000])
+
+    def test_build_reads_account_data(self):
+        acc = create_account()
+        inst = create_instrument(account=acc)
+        Buy.objects.create(
+            account=acc, instrument=inst, date=date(2024, 1, 10), quantity=Decimal('10'),
+            unit_price=Money(50, 'AUD'), total_brokerage=Money(0, 'AUD'),
+        )
+        for day, close in [(9, '49'), (11, '52')]:
+            SecurityPriceHistory.objects.create(
+                security=inst.security, date=date(2024, 1, day), open=Decimal(close), high=Decimal(close),
+                low=Decimal(close), close=Decimal(close), volume=1000, stock_splits=Decimal('0'),
+            )
+
+        series = dashboardseries.build(acc, [inst], today=date(2024, 1, 12))
+
+        self.assertEqual(series.date_labels(), ['2024-01-09', '2024-01-10', '2024-01-11', '2024-01-12'])
+        self.assertEqual(series.labels, [inst.name])
+        self.assertEqual(series.datasets(series.values), [{'label': inst.name, 'data': [0.0, 490.0, 520.0, 520.0]}])
+
+    def test_build_reads_closes_through_the_price_store(self):
+        acc = create_account()
+        inst = create_instrument(account=acc)
+        Buy.objects.create(
+            account=acc, instrument=inst, date=date(2024, 1, 10), quantity=Decimal('10'),
+            unit_price=Money(50, 'AUD'), total_brokerage=Money(0, 'AUD'),
+        )
+        closes = {'date': np.array(['2024-01-09', '2024-01-11'], dtype='datetime64[D]'), 'close': np.array([49.0, 52.0])}
+
+        with patch('share_dinkum_app.dashboardseries.pricestore.read_many', return_value={inst.security.pk: closes}) as read_many:
+            series = dashboardseries.build(acc, [inst], today=date(2024, 1, 12))
+
+        read_many.assert_called_once()
+        self.assertEqual(series.datasets(series.values), [{'label': inst.name, 'data': [0.0, 490.0, 520.0, 520.0]}])
+
+    def test_ten_years_of_forty_instruments_in_under_a_second(self):
+        rng = np.random.default_rng(0)
+        dates = pd.date_range('2015-01-01', '2024-12-31', freq='D')
+        instrument_ids = [f'inst{number}' for number in range(40)]
+        trade_days = rng.choice(dates.date, size=2000)
+        trades = pd.DataFrame({
+            'instrument_id': rng.choice(instrument_ids, size=2000),
+            'date': trade_days,
+            'quantity': rng.integers(1, 100, size=2000).astype('float64'),
+        })
+        business_days = pd.bdate_range(dates[0], dates[-1]).date
+        prices = pd.DataFrame({
+            'instrument_id': np.repeat(instrument_ids, len(business_days)),
+            'date': np.tile(business_days, len(instrument_ids)),
+            'close': rng.uniform(1, 100, size=len(instrument_ids) * len(business_days)),
+        })
+
+        started = time.perf_counter()
+        rates = {'USD': dashboardseries.exchange_rates(dates, (list(business_days), rng.uniform(1.3, 1.6, len(business_days))))}
+        quantities, values = dashboardseries.compute(
+            dates, instrument_ids, trades, prices, currencies={instrument_id: 'USD' for instrument_id in instrument_ids[:10]}, rates=rates,
+        )
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(values.shape, (len(dates), 40))
+        self.assertLess(elapsed, 1.0)
+
+
+class DashboardCacheTests(TestCase):
+    """Tests for the dashboard payloads cached per account data version."""
+
+    def setUp(self):
+        self.account = create_account()
+        self.instrument = create_instrument(account=self.account)
+
+    def data_version(self, account=None):
+        return Account.objects.values_list('data_version', flat=True).get(pk=(account or self.account).pk)
+
+    def test_payload_is_computed_once_per_data_version(self):
+        compute = MagicMock(return_value={'labels': ['BHP']})
+
+        self.assertEqual(dashboardcache.get_or_compute(self.account, 'test', compute), {'labels': ['BHP']})
+        dashboardcache.get_or_compute(self.account, 'test', compute)
+        self.assertEqual(compute.call_count, 1)
+
+        dashboardcache.bump(self.account.pk)
+        self.account.refresh_from_db()
+        dashboardcache.get_or_compute(self.account, 'test', compute)
+        self.assertEqual(compute.call_count, 2)
+
+    def test_trades_bump_the_version(self):
+        version = self.data_version()
+        Buy.objects.create(
+            account=self.account, instrument=self.instrument, date=date(2024, 1, 10), quantity=Decimal('10'),
+            unit_price=Money(50, 'AUD'), total_brokerage=Money(0, 'AUD'),
+        )
+        self.assertGreater(self.data_version(), version)
+
+    def test_current_exchange_rates_bump_the_version(self):
+        version = self.data_version()
+        CurrentExchangeRate.objects.create(
+            account=self.account, convert_from='USD', convert_to='AUD', exchange_rate_multiplier=Decimal('1.5'),
+        )
+        self.assertGreater(self.data_version(), version)
+
+    def test_saving_a_stale_account_keeps_the_bumped_version(self):
+        stale = Account.objects.get(pk=self.account.pk)
+        dashboardcache.bump(self.account.pk)
+        version = self.data_version()
+
+        stale.description = 'Renamed'
+        stale.save()
+
+        self.assertEqual(self.data_version(), version)
+        self.assertEqual(Account.objects.get(pk=self.account.pk).description, 'Renamed')
+
+    def test_price_history_bumps_every_account_holding_the_security(self):
+        second = Account.objects.create(
+            owner=create_user('second'), currency='AUD', description='Second',
+            fiscal_year_type=self.account.fiscal_year_type,
+        )
+        create_instrument(account=second, market=create_market(account=second))
+        versions = (self.data_version(), self.data_version(second))
+
+        self.instrument.security.ingest_price_history(pd.DataFrame({
+            'date': [date(2024, 1, 10)], 'open': [50.0], 'high': [51.0], 'low': [49.0], 'close': [50.5],
+            'volume': [1000], 'stock_splits': [0.0],
+        }))
+
+        self.assertGreater(self.data_version(), versions[0])
+        self.assertGreater(self.data_version(second), versions[1])
+
+    def test_dashboard_is_served_from_the_cache_until_data_changes(self):
+        user = self.account.owner
+
+        with patch('share_dinkum_app.admin._dashboard_series', wraps=admin_module._dashboard_series) as build:
+            for _ in range(2):
+                user.refresh_from_db()
+                admin_module.dashboard_chart_view(MagicMock(user=user, GET={}), 'holdings')
+            self.assertEqual(build.call_count, 1)
+
+            Buy.objects.create(
+                account=self.account, instrument=self.instrument, date=date(2024, 1, 10), quantity=Decimal('10'),
+                unit_price=Money(50, 'AUD'), total_brokerage=Money(0, 'AUD'),
+            )
+            user.refresh_from_db()
+            response = admin_module.dashboard_chart_view(MagicMock(user=user, GET={}), 'holdings')
+            self.assertEqual(build.call_count, 2)
+
+        self.assertEqual(json.loads(response.content)['datasets'][0]['label'], self.instrument.name)
+
+
+class DashboardChartTests(TestCase):
+    """Tests for the dashboard's JSON chart endpoints."""
+
+    def setUp(self):
+        self.account = create_account()
+        self.instrument = create_instrument(account=self.account)
+        Buy.objects.create(
+            account=self.account, instrument=self.instrument, date=date(2023, 1, 10), quantity=Decimal('10'),
+            unit_price=Money(50, 'AUD'), total_brokerage=Money(0, 'AUD'),
+        )
+        self.factory = RequestFactory()
+
+    def get(self, chart, **params):
+        request = self.factory.get(f'/admin/dashboard/charts/{chart}/', params, HTTP_ACCEPT_ENCODING='gzip')
+        request.user = AppUser.objects.get(pk=self.account.owner.pk)
+        return gzip_page(admin_module.dashboard_chart_view)(request, chart)
+
+    def test_window_is_sampled_at_the_resolution_asked_for(self):
+        payload = json.loads(self.get('holdings', start='2024-01-01', end='2024-03-31', resolution='M').content)
+
+        self.assertEqual(payload['resolution'], 'M')
+        self.assertEqual(payload['labels'], ['2024-01-31', '2024-02-29', '2024-03-31'])
+        self.assertEqual(payload['datasets'], [{'label': self.instrument.name, 'data': [10.0, 10.0, 10.0]}])
+
+    def test_response_is_gzipped(self):
+        response = self.get('value', start='2024-01-01', end='2024-03-31')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))['labels']), 91)
+
+    def test_long_windows_are_sampled_within_the_point_limit(self):
+        series = dashboardseries.DashboardSeries(
+            dates=pd.date_range('2015-01-01', '2024-12-31', freq='D'),
+            instrument_ids=['bhp'],
+            labels=['BHP'],
+            quantities=np.ones((3653, 1)),
+            values=np.ones((3653, 1)),
+        )
+
+        self.assertEqual(series.window(date(2024, 1, 1), max_points=1000).resolution, 'D')
+        self.assertEqual(series.window(max_points=1000).resolution, 'W')
+        self.assertEqual(len(series.window(max_points=200).dates), 120)
+
+    def test_page_links_the_charts_rather_than_embedding_them(self):
+        user = AppUser.objects.get(pk=self.account.owner.pk)
+        context = admin_module._prepare_dashboard_context(MagicMock(user=user), {})
+
+        self.assertEqual(context['dashboard_chart_urls']['value'], '/admin/dashboard/charts/value/')
+        self.assertNotIn('value_chart_datasets', context)
+        self.assertIn('No active parcels', context['dashboard_message'])
+
+    def test_performance_has_a_row_per_instrument_and_a_total(self):
+        payload = json.loads(gzip.decompress(self.get('performance', start='2024-01-01', end='2024-03-31').content))
+
+        self.assertEqual([row['label'] for row in payload['rows']], [self.instrument.name, 'Total'])
+        self.assertEqual([row['is_total'] for row in payload['rows']], [False, True])
+
+    def test_weekly_prices_are_read_from_the_rollups(self):
+        days = pd.bdate_range('2024-01-01', '2024-01-19').date
+        self.instrument.security.ingest_price_history(pd.DataFrame({
+            'date': days, 'open': 1.0, 'high': 1.0, 'low': 1.0,
+            'close': [float(number) for number in range(1, len(days) + 1)], 'volume': 100, 'stock_splits': 0.0,
+        }), split_adjusted=False)
+
+        with patch('share_dinkum_app.pricerollups._daily', side_effect=AssertionError('daily history read')):
+            payload = json.loads(self.get('prices', start='2024-01-01', end='2024-01-19', resolution='W').content)
+
+        self.assertEqual(payload['resolution'], 'W')
+        self.assertEqual(payload['labels'], ['2024-01-05', '2024-01-12', '2024-01-19'])
+        self.assertEqual(payload['datasets'], [{'label': self.instrument.name, 'data': [5.0, 10.0, 15.0]}])
+
+    def test_windows_past_the_series_share_a_cache_entry(self):
+        chart = MagicMock(return_value={'labels': [], 'datasets': [], 'resolution': 'M'})
+        with patch.dict(admin_module.DASHBOARD_CHARTS, {'value': chart}):
+            self.get('value', start='2000-01-01', end='2999-12-31', resolution='M')
+            self.get('value', start='1990-06-30', end='2500-01-01', resolution='M')
+            self.get('value', start='2023-06-30', resolution='M')
+
+        self.assertEqual(chart.call_args_list, [
+            call(self.account, None, None, 'M'),
+            call(self.account, date(2023, 6, 30), None, 'M'),
+        ])
+
+    def test_invalid_parameters_are_rejected(self):
+        self.assertEqual(self.get('value', resolution='Y').status_code, 400)
+        self.assertEqual(self.get('value', start='last week').status_code, 400)
+        with self.assertRaises(Http404):
+            self.get('unknown')
+
+
+class PerformanceTests(TestCase):
+    """Tests for the returns, volatility and drawdown engine in performance."""
+
+    def test_metrics_of_a_buy_and_sale(self):
+        dates = pd.date_range('2024-01-09', '2024-01-12', freq='D')
+        values = np.array([[0.0], [110.0], [99.0], [0.0]])
+        # Bought for 100, then sold for 99.
+        flows = np.array([[0.0], [100.0], [0.0], [-99.0]])
+
+        result = performance.compute(dates, values, flows, ['BHP'], window=3)
+
+        self.assertEqual(result.labels, ['BHP', 'Total'])
+        np.testing.assert_allclose(result.time_weighted, [1.1 * 0.9 - 1] * 2)
+        np.testing.assert_allclose(result.max_drawdown, [-0.1] * 2)
+        np.testing.assert_allclose(result.volatility, [0.1 * np.sqrt(365)] * 2)
+        # 100 out and 99 back two days later.
+        np.testing.assert_allclose(result.money_weighted, [0.99 ** (365 / 2) - 1] * 2, rtol=1e-6)
+
+    def test_undefined_metrics_are_null(self):
+        dates = pd.date_range('2024-01-09', '2024-01-10', freq='D')
+        result = performance.compute(dates, np.zeros((2, 1)), np.zeros((2, 1)), ['BHP'])
+
+        row = result.rows()[0]
+        self.assertEqual(row['time_weighted'], 0.0)
+        self.assertIsNone(row['money_weighted'])
+        self.assertIsNone(row['volatility'])
+
+    def test_build_counts_income_as_return(self):
+        acc = create_account()
+        inst = create_instrument(account=acc)
+        Buy.objects.create(
+            account=acc, instrument=inst, date=date(2024, 1, 10), quantity=Decimal('10'),
+            unit_price=Money(10, 'AUD'), total_brokerage=Money(0, 'AUD'),
+        )
+        Distribution.objects.create(
+            account=acc, instrument=inst, date=date(2024, 1, 11), quantity=Decimal('10'),
+            distribution_amount_per_share=Money(Decimal('1'), 'AUD'),
+        )
+        SecurityPriceHistory.objects.create(
+            security=inst.security, date=date(2024, 1, 9), open=Decimal('10'), high=Decimal('10'),
+            low=Decimal('10'), close=Decimal('10'), volume=1000, stock_splits=Decimal('0'),
+        )
+        series = dashboardseries.build(acc, [inst], today=date(2024, 1, 12))
+
+        result = performance.build(acc, series)
+
+        # Price unchanged, and a 10% distribution paid.
+        np.testing.assert_allclose(result.time_weighted, [0.1, 0.1])
+
+    def test_ten_years_of_forty_instruments_in_under_a_second(self):
+        rng = np.random.default_rng(0)
+        dates = pd.date_range('2015-01-01', '2024-12-31', freq='D')
+        values = np.cumprod(1 + rng.normal(0, 0.01, size=(len(dates), 40)), axis=0) * 1000
+        flows = np.where(rng.random((len(dates), 40)) < 0.01, rng.normal(0, 100, size=(len(dates), 40)), 0.0)
+
+        started = time.perf_counter()
+        result = performance.compute(dates, values, flows, [f'inst{number}' for number in range(40)])
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(len(result.rows()), 41)
+        self.assertLess(elapsed, 1.0)
+
+
+# =============================================================================
+# Loading
+# =============================================================================
+
+
+def make_exchange_rate_history(convert_from, convert_to, rates_by_date):
+    return pd.DataFrame({
+        'convert_from': convert_from,
+        'convert_to': convert_to,
+        'date': list(rates_by_date.keys()),
+        'exchange_rate_multiplier': list(rates_by_date.values()),
+        'is_continuous_history': True,
+    })
+
+
+class DataLoaderExchangeRatePrefetchTests(TestCase):
+    """Tests for DataLoader.prefetch_exchange_rates."""
+
+    def make_loader(self, acc):
+        loader = DataLoader(account=acc)
+        loader.mapping = {
+            'Buy': pd.DataFrame({
+                'date': ['2024-01-12', '2024-01-13', '2024-02-01'],
+                'unit_price_currency': ['USD', 'USD', 'AUD'],
+                'total_brokerage_currency': ['USD', 'USD', 'AUD'],
+            }),
+            'Dividend': pd.DataFrame({
+                'date': ['2024-01-15'],
+                'franked_amount_per_share_currency': ['GBP'],
+            }),
+        }
+        return loader
+
+    def test_requirements_group_foreign_dates_by_currency(self):
+        acc = create_account()
+        requirements = self.make_loader(acc).get_exchange_rate_requirements()
+        self.assertEqual(requirements, {
+            'USD': {date(2024, 1, 12), date(2024, 1, 13)},
+            'GBP': {date(2024, 1, 15)},
+        })
+
+    @patch('share_dinkum_app.yfinanceinterface.get_exchange_rate')
+    @patch('share_dinkum_app.yfinanceinterface.get_exchange_rate_history')
+    def test_prefetch_fetches_each_currency_once_then_lookups_stay_local(self, mock_history, mock_get_rate):
+        mock_history.side_effect = lambda convert_from, convert_to, start_date, end_date: make_exchange_rate_history(
+            convert_from, convert_to, {date(2024, 1, 12): 1.5, date(2024, 1, 15): 1.6},
+        )
+        acc = create_account()
+        self.make_loader(acc).prefetch_exchange_rates()
+
+        self.assertEqual(mock_history.call_count, 2)
+        fetched = {call.kwargs['convert_from']: call.kwargs['start_date'] for call in mock_history.call_args_list}
+        self.assertEqual(fetched, {'USD': date(2024, 1, 12), 'GBP': date(2024, 1, 15)})
+
+        weekend_rate = ExchangeRate.get_or_create(
+            account=acc, convert_from='USD', convert_to='AUD', exchange_date=date(2024, 1, 13),
+        )
+        self.assertEqual(weekend_rate.exchange_rate_multiplier, Decimal('1.5'))
+        mock_get_rate.assert_not_called()
+
+
+class DataLoaderPriceHistoryTests(TestCase):
+    """Tests for loading the price history sheets of an export."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.directory.name)
+        self.settings_override.enable()
+        self.account = create_account()
+        self.instrument = create_instrument(account=self.account)
+        # Stored as traded, with a 2 for 1 split on the 11th.
+        self.instrument.security.ingest_price_history(pd.DataFrame({
+            'date': [date(2024, 1, 10), date(2024, 1, 11)], 'open': [100.0, 50.0], 'high': [101.0, 51.0],
+            'low': [99.0, 49.0], 'close': [100.0, 51.0], 'volume': [1000, 2000], 'stock_splits': [0.0, 2.0],
+        }), split_adjusted=False)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.directory.cleanup()
+
+    def stored_history(self):
+        return list(
+            SecurityPriceHistory.objects.filter(security=self.instrument.security)
+            .values_list('date', 'close', 'adjusted_close')
+        )
+
+    def test_export_round_trip_restores_price_history(self):
+        expected = self.stored_history()
+        export = DataExport.objects.create(account=self.account, include_price_history=True)
+        export.refresh_from_db()
+        SecurityPriceHistory.objects.all().delete()
+
+        loader = DataLoader(account=self.account)
+        loader.mapping = excelinterface.get_all_tables_in_excel(export.file.path)
+        # The exported security id is not carried over; the instrument keeps the security for its ticker.
+        loader.load_table_to_model(model=Instrument, df=loader.mapping['Instrument'])
+        loader.load_price_history()
+
+        self.assertEqual(self.stored_history(), expected)
+
+    def test_legacy_instrument_price_history_is_loaded_as_traded(self):
+        SecurityPriceHistory.objects.all().delete()
+        loader = DataLoader(account=self.account)
+        # As Yahoo Finance returned it, with the close before the split halved.
+        loader.mapping = {'InstrumentPriceHistory': pd.DataFrame({
+            'instrument__name': [self.instrument.name] * 2, 'date': ['2024-01-10', '2024-01-11'],
+            'open': [50.0, 50.0], 'high': [50.5, 51.0], 'low': [49.5, 49.0], 'close': [50.0, 51.0],
+            'volume': [2000, 2000], 'stock_splits': [0.0, 2.0],
+        })}
+
+        loader.load_price_history()
+
+        self.assertEqual(self.stored_history(), [
+            (date(2024, 1, 10), Decimal('100.000000'), Decimal('50.000000')),
+            (date(2024, 1, 11), Decimal('51.000000'), Decimal('51.000000')),
+        ])
+
+
 # =============================================================================
 # Signals: default account
 # =============================================================================
@@ -1004,6 +2639,101 @@ class AssignDefaultAccountSignalTests(TransactionTestCase):
         self.assertEqual(user.default_account_id, acc.id)
 
 
+# =============================================================================
+# Background jobs
+# =============================================================================
+
+
+@override_settings(JOBS_EAGER=False, JOB_RETRY_DELAY=0)
+class JobQueueTests(TestCase):
+    """Tests for the database job queue in jobs and its tasks."""
+
+    def test_queued_job_runs_on_worker(self):
+        acc = create_account()
+        calls = []
+
+        def record(job, value):
+            job.set_progress(40, 'Halfway')
+            calls.append(value)
+
+        with patch.dict(jobs.TASKS, {'record': record}):
+            job = jobs.enqueue('record', account=acc, value=7)
+            self.assertEqual(job.status, Job.STATUS_QUEUED)
+            self.assertEqual(calls, [])
+            self.assertEqual(jobs.work(worker='test', burst=True), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(calls, [7])
+        self.assertEqual(job.status, Job.STATUS_SUCCEEDED)
+        self.assertEqual((job.progress, job.attempts, job.worker), (100, 1, 'test'))
+
+    def test_failed_job_is_retried_then_marked_failed(self):
+        acc = create_account()
+
+        def fail(job):
+            raise RuntimeError('boom')
+
+        with patch.dict(jobs.TASKS, {'fail': fail}):
+            job = jobs.enqueue('fail', account=acc)
+            self.assertEqual(jobs.work(worker='test', burst=True), settings.JOB_MAX_ATTEMPTS)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_FAILED)
+        self.assertEqual(job.attempts, settings.JOB_MAX_ATTEMPTS)
+        self.assertIn('RuntimeError: boom', job.error)
+
+    def test_account_refresh_is_queued_once(self):
+        acc = create_account()
+        acc.update_price_history = True
+        acc.save()
+        acc.save()
+        self.assertEqual(Job.objects.filter(account=acc, task='refresh_account').count(), 1)
+
+        with patch.object(Account, 'update_all_exchange_rate_history') as mock_fx, \
+                patch.object(Account, 'update_all_price_history') as mock_prices:
+            jobs.work(worker='test', burst=True)
+        mock_fx.assert_called_once()
+        mock_prices.assert_called_once()
+        acc.refresh_from_db()
+        self.assertFalse(acc.update_price_history)
+
+    def test_abandoned_job_is_requeued(self):
+        acc = create_account()
+        job = Job.objects.create(
+            task='refresh_account', account=acc, status=Job.STATUS_RUNNING,
+            started_at=datetime.now(UTC) - timedelta(seconds=settings.JOB_TIMEOUT + 1),
+        )
+        self.assertEqual(jobs.requeue_abandoned(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_QUEUED)
+
+    @override_settings(JOBS_IN_PROCESS=True)
+    @patch('share_dinkum_app.jobs.threading.Thread')
+    def test_queueing_starts_one_background_worker(self, mock_thread):
+        acc = create_account()
+        mock_thread.return_value.is_alive.return_value = True
+
+        with patch.object(jobs, '_worker_thread', None), patch.dict(jobs.TASKS, {'noop': lambda job: None}):
+            jobs.enqueue('noop', account=acc)
+            jobs.enqueue('noop', account=acc)
+
+        mock_thread.assert_called_once()
+        self.assertTrue(mock_thread.call_args.kwargs['daemon'])
+        mock_thread.return_value.start.assert_called_once()
+
+    def test_admin_shows_the_export_job_status(self):
+        acc = create_account()
+        export = DataExport.objects.create(account=acc)
+        job = Job.objects.get(task='generate_export')
+        job.set_progress(40, 'Exporting Buy')
+        Job.objects.filter(pk=job.pk).update(status=Job.STATUS_RUNNING)
+
+        export_admin = admin_module.DataExportAdmin(DataExport, admin_module.admin.site)
+        self.assertEqual(export_admin.export_job(export), 'Running (40%) - Exporting Buy')
+        account_admin = admin_module.AccountAdmin(Account, admin_module.admin.site)
+        self.assertEqual(account_admin.price_refresh_job(acc), '-')
+
+
 # =============================================================================
 # Constants
 # =============================================================================
@@ -1,5 +1,6 @@
 
 from .filefield_operations import process_filefield, user_directory_path
-from .decimal import convert_to_decimal, convert_to_decimal_field
+from .decimal import convert_to_decimal, convert_to_decimal_field, convert_series_to_decimal, convert_series_to_decimal_field
 from .currency import add_currencies
 from .model_helpers import save_with_logging
+from .queries import latest_before
@@ -1,5 +1,8 @@
 from decimal import Decimal, ROUND_HALF_UP
 
+import numpy as np
+import pandas as pd
+
 
 def convert_to_decimal_field(value, field):
 
@@ -34,4 +37,37 @@ def convert_to_decimal(value, max_digits, decimal_places):
         return decimal_value
 
     except Exception as e:
-        raise ValueError(f"Error converting value {value} to Decimal: {e}")
\ No newline at end of file
+        raise ValueError(f"Error converting value {value} to Decimal: {e}")
+
+def convert_series_to_decimal_field(values, field):
+
+    return convert_series_to_decimal(values, field.max_digits, field.decimal_places)
+
+
+def convert_series_to_decimal(values, max_digits, decimal_places):
+    """
+    Quantise a whole column of numbers at once, as convert_to_decimal does one value.
+
+    Rounding (half up) and the max_digits check run as array operations; only the final step of
+    wrapping each scaled integer in a Decimal is per value. Missing values give None. Returns a list.
+    """
+    floats = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+
+    # Nudge by a few units in the last place, so a float stored just below a half (2.675 is
+    # 2.67499999...) rounds as its decimal representation would.
+    scaled = floats * 10.0 ** decimal_places
+    integers = np.sign(scaled) * np.floor(np.abs(scaled) * (1 + 4 * np.finfo('float64').eps) + 0.5)
+
+    missing = np.isnan(integers)
+    if np.any(np.abs(integers[~missing]) >= 10.0 ** max_digits):
+        too_large = floats[~missing][np.abs(integers[~missing]) >= 10.0 ** max_digits][0]
+        raise ValueError(
+            f"Integer part too large for max_digits={max_digits} and decimal_places={decimal_places}: {too_large}"
+        )
+
+    quantum = Decimal(1).scaleb(-decimal_places)
+    integers = np.where(missing, 0, integers).astype(np.int64)
+    return [
+        None if is_missing else Decimal(integer) * quantum
+        for integer, is_missing in zip(integers.tolist(), missing.tolist())
+    ]
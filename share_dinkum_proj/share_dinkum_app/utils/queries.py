@@ -0,0 +1,24 @@
+from django.db.models import F, Max, Window
+from django.db.models.functions import RowNumber
+
+
+def latest_before(queryset, key, value, before=None, date_field='date'):
+    """
+    {key: value} from the latest row of each key in queryset, in one query.
+
+    - Only rows dated before `before` count, if given (all rows otherwise).
+    - key and value are field names, with lookups through relations allowed, e.g.
+      latest_before(SecurityPriceHistory.objects.filter(security_id__in=ids), 'security_id', 'close', before=start_date)
+    - Keys with no qualifying row are absent.
+
+    Each key's rows are ranked newest first with a window function and the first kept, rather
+    than querying once per key. Asking for the date itself is a grouped max instead.
+    """
+    if before is not None:
+        queryset = queryset.filter(**{f'{date_field}__lt': before})
+    if value == date_field:
+        return dict(queryset.order_by().values(key).annotate(latest=Max(date_field)).values_list(key, 'latest'))
+    ranked = queryset.annotate(
+        latest_rank=Window(RowNumber(), partition_by=F(key), order_by=F(date_field).desc()),
+    ).filter(latest_rank=1)
+    return dict(ranked.values_list(key, value))
@@ -1,15 +1,23 @@
 import yfinance as yf
+from yfinance.data import YfData
+from yfinance.exceptions import YFRateLimitError
 from datetime import date, timedelta, datetime, UTC
 import pandas as pd
 import string
 
-from share_dinkum_app.utils import convert_to_decimal
+from share_dinkum_app.utils import convert_to_decimal, convert_series_to_decimal
+from share_dinkum_app import marketcache
+from share_dinkum_app import resilience
 
 
 import logging
 logger = logging.getLogger(__name__)
 
 
+# Worth retrying, and counted against the endpoint by its circuit breaker. Network errors from both
+# requests and curl_cffi are OSErrors.
+TRANSIENT_ERRORS = (OSError, YFRateLimitError)
+
 
 def to_snake_case(text):
     allowable_chars = string.ascii_letters + string.digits
@@ -17,6 +25,35 @@ def to_snake_case(text):
     return snake_case
 
 
+# Prices adjusted for later splits but not for dividends. Income is counted as the cash it pays, so
+# a close lowered for every later dividend would count it twice.
+PRICE_HISTORY_KWARGS = {'auto_adjust': False}
+
+
+def cache_interval(history_kwargs):
+    """The interval a response is cached under. Prices not adjusted for dividends are a different response."""
+    interval = history_kwargs.get('interval', '1d')
+    if history_kwargs.get('auto_adjust', True) is False:
+        return f'{interval}-unadjusted'
+    return interval
+
+
+def get_history(ticker_code, **history_kwargs):
+    """Ticker.history(), served from the on-disk response cache when it holds the same range."""
+    interval = cache_interval(history_kwargs)
+    start = history_kwargs.get('start', history_kwargs.get('period'))
+    end = history_kwargs.get('end')
+
+    cached = marketcache.get(ticker_code, interval, start, end)
+    if cached is not None:
+        return cached.copy()
+
+    history = resilience.call('Yahoo Finance history', yf.Ticker(ticker_code).history, transient_errors=TRANSIENT_ERRORS, **history_kwargs)
+    if not history.empty:
+        marketcache.put(ticker_code, interval, start, end, history)
+    return history
+
+
 def get_instrument_price_history(instrument, start_date, end_date=None):
     
     ticker_code = instrument.yfinance_ticker_code
@@ -51,19 +88,18 @@ def get_instrument_price_history(instrument, start_date, end_date=None):
                 )
                 return pd.DataFrame([])
 
-        history_kwargs = {'start': start_date.isoformat()}
+        history_kwargs = {'start': start_date.isoformat(), **PRICE_HISTORY_KWARGS}
         if end_date:
             history_kwargs['end'] = (end_date + timedelta(days=1)).isoformat()
 
-        yfinance_obj = yf.Ticker(ticker_code)
-        price_history = yfinance_obj.history(**history_kwargs)
+        price_history = get_history(ticker_code, **history_kwargs)
         price_history = price_history.reset_index() # set the date as a column
 
         price_history.columns = [to_snake_case(col) for col in price_history.columns]
 
         price_history['instrument'] = instrument
 
-        price_history['date'] = price_history['date'].apply(lambda x : x.date())
+        price_history['date'] = pd.to_datetime(price_history['date']).dt.date
 
         # Handle the case of these cols not being returned
         if 'volume' not in price_history.columns:
@@ -72,19 +108,11 @@ def get_instrument_price_history(instrument, start_date, end_date=None):
         if 'stock_splits' not in price_history.columns:
             price_history['stock_splits'] = 0
 
-        price_history['open'] = pd.to_numeric(price_history['open'], errors='coerce')
-        price_history['high'] = pd.to_numeric(price_history['high'], errors='coerce')
-        price_history['low'] = pd.to_numeric(price_history['low'], errors='coerce')
-        price_history['close'] = pd.to_numeric(price_history['close'], errors='coerce')
-        price_history['volume'] = pd.to_numeric(price_history['volume'], errors='coerce')
-        price_history['stock_splits'] = pd.to_numeric(price_history['stock_splits'], errors='coerce')
+        for col in ['open', 'high', 'low', 'close', 'volume', 'stock_splits']:
+            price_history[col] = pd.to_numeric(price_history[col], errors='coerce')
 
-        price_history = price_history[['instrument', 'date', 'open', 'high', 'low', 'close', 'volume', 'stock_splits']]
-
-        for col in ['open', 'high', 'low', 'close', 'stock_splits']:
-            price_history[col] = price_history[col].apply(lambda val: convert_to_decimal(val, 16, 6))
-            
-        return price_history
+        # Prices are left as floats: the caller quantises whole columns at once as it stores them.
+        return price_history[['instrument', 'date', 'open', 'high', 'low', 'close', 'volume', 'stock_splits']]
 
     except Exception as e:
         logger.error(f"Error fetching data for {ticker_code}: {e}", exc_info=True)
@@ -92,30 +120,170 @@ def get_instrument_price_history(instrument, start_date, end_date=None):
 
 
 
-def get_current_price(instrument):
-    """Fetch live/current price from yfinance ticker info."""
-    ticker_code = instrument.yfinance_ticker_code
+def as_date(value, name):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    if isinstance(value, date):
+        return value
+    raise TypeError(f'{name} must be a date, datetime, or ISO formatted string.')
+
+
+def get_price_history_batch(instruments, start_date, end_date=None):
+    """
+    Daily price history for many instruments from a single multi-symbol download.
+
+    Returns a long-format frame with one row per instrument and trading date, holding the columns
+    of get_instrument_price_history plus 'ticker'. Prices are left as floats for the caller to
+    quantise. Instruments that share a ticker each get their own rows, and dates on which a
+    ticker did not trade (another market's holiday) are dropped rather than returned as NaN.
+    """
+    by_ticker = {}
+    for instrument in instruments:
+        by_ticker.setdefault(instrument.yfinance_ticker_code, []).append(instrument)
+    if not by_ticker:
+        return pd.DataFrame([])
+
+    tickers = list(by_ticker)
+    logger.info('Fetching price history for %s tickers', len(tickers))
+
     try:
-        ticker = yf.Ticker(ticker_code)
-        info = ticker.info
-        price = info.get('currentPrice') or info.get('regularMarketPrice')
-        if price is not None:
-            return convert_to_decimal(price, 16, 6)
-        return None
+        start_date = as_date(start_date, 'start_date')
+        download_kwargs = {
+            'tickers': tickers,
+            'start': start_date.isoformat(),
+            'group_by': 'ticker',
+            # Match Ticker.history(), which includes the actions columns.
+            'actions': True,
+            'progress': False,
+            **PRICE_HISTORY_KWARGS,
+        }
+        if end_date is not None:
+            end_date = as_date(end_date, 'end_date')
+            if end_date < start_date:
+                logger.warning('Skipping batch price history; end_date %s is before start_date %s', end_date, start_date)
+                return pd.DataFrame([])
+            download_kwargs['end'] = (end_date + timedelta(days=1)).isoformat()
+
+        # Each ticker's slice of a download is the frame Ticker.history() gives for the same
+        # range, so the two share cache entries, and only the tickers not cached are downloaded.
+        start, end = download_kwargs['start'], download_kwargs.get('end')
+        interval = cache_interval(download_kwargs)
+        histories = {}
+        missing = []
+        for ticker in tickers:
+            cached = marketcache.get(ticker, interval, start, end)
+            if cached is not None:
+                histories[ticker] = cached
+            else:
+                missing.append(ticker)
+
+        if missing:
+            downloaded = resilience.call(
+                'Yahoo Finance download', yf.download, transient_errors=TRANSIENT_ERRORS,
+                **{**download_kwargs, 'tickers': missing},
+            )
+            if downloaded is not None and not downloaded.empty:
+                if not isinstance(downloaded.columns, pd.MultiIndex):
+                    downloaded.columns = pd.MultiIndex.from_product([[missing[0]], downloaded.columns])
+                for ticker in downloaded.columns.get_level_values(0).unique():
+                    history = downloaded[ticker].dropna(how='all')
+                    if not history.empty:
+                        marketcache.put(ticker, interval, start, end, history)
+                        histories[ticker] = history
+
+        if not histories:
+            return pd.DataFrame([])
+
+        price_history = pd.concat(histories, names=['ticker', 'date']).reset_index()
+        price_history.columns = [to_snake_case(str(col)) for col in price_history.columns]
+
+        for col in ['volume', 'stock_splits']:
+            if col not in price_history.columns:
+                price_history[col] = 0
+
+        for col in ['open', 'high', 'low', 'close', 'volume', 'stock_splits']:
+            price_history[col] = pd.to_numeric(price_history[col], errors='coerce')
+
+        price_history = price_history.dropna(subset=['close'])
+        # Element by element: tickers on different exchanges carry different UTC offsets, and each
+        # trading date is the one in its own exchange's time zone.
+        price_history['date'] = price_history['date'].apply(lambda x : x.date())
+        price_history['instrument'] = price_history['ticker'].map(by_ticker)
+        price_history = price_history.explode('instrument')
+
+        return price_history[
+            ['ticker', 'instrument', 'date', 'open', 'high', 'low', 'close', 'volume', 'stock_splits']
+        ].reset_index(drop=True)
+
     except Exception as e:
-        logger.warning('Could not fetch current price for %s: %s', ticker_code, e)
-        return None
+        logger.error(f"Error fetching batch price history for {', '.join(tickers)}: {e}", exc_info=True)
+        return pd.DataFrame([])
+
+
+# Yahoo's quote endpoint returns a few fields per symbol for many symbols at once, where
+# Ticker.info downloads a full company profile per symbol.
+QUOTE_URL = 'https://query1.finance.yahoo.com/v7/finance/quote'
+QUOTE_BATCH_SIZE = 100
+
+
+def get_current_quotes(ticker_codes):
+    """
+    Last price and quote time for many tickers, in one request per QUOTE_BATCH_SIZE tickers.
+
+    Returns {ticker_code: (price, quote_time)} with quote_time in UTC. Tickers Yahoo has no price
+    for are left out.
+    """
+    ticker_codes = list(dict.fromkeys(ticker_codes))
+    quotes = {}
+
+    for i in range(0, len(ticker_codes), QUOTE_BATCH_SIZE):
+        batch = ticker_codes[i:i + QUOTE_BATCH_SIZE]
+        params = {
+            'symbols': ','.join(batch),
+            'fields': 'regularMarketPrice,regularMarketTime',
+            'formatted': 'false',
+        }
+        try:
+            response = resilience.call(
+                'Yahoo Finance quote', YfData().get_raw_json, QUOTE_URL,
+                transient_errors=TRANSIENT_ERRORS, params=params,
+            )
+            for result in (response.get('quoteResponse') or {}).get('result') or []:
+                price = result.get('regularMarketPrice')
+                if price is None:
+                    continue
+                quote_time = result.get('regularMarketTime')
+                quotes[result['symbol']] = (
+                    convert_to_decimal(price, 16, 6),
+                    datetime.fromtimestamp(quote_time, UTC) if quote_time else None,
+                )
+        except Exception as e:
+            logger.warning('Could not fetch current quotes for %s: %s', ', '.join(batch), e)
+
+    return quotes
+
+
+def get_current_price(instrument):
+    """Fetch the live/current price of one instrument from the quote endpoint."""
+    ticker_code = instrument.yfinance_ticker_code
+    quote = get_current_quotes([ticker_code]).get(ticker_code)
+    return quote[0] if quote else None
 
 
-def get_exchange_rate_history(convert_from, convert_to, start_date):
+def get_exchange_rate_history(convert_from, convert_to, start_date, end_date=None):
     
     ticker_code = f'{convert_from}{convert_to}=X'
-    yfinance_obj = yf.Ticker(ticker_code)
     logger.info('Fetching exchange rate history for %s', ticker_code)
 
     try:
-        yfinance_obj = yf.Ticker(ticker_code)
-        price_history = yfinance_obj.history(start=start_date)
+        history_kwargs = {'start': start_date}
+        if end_date:
+            # yfinance treats end as exclusive; callers pass the last date they want.
+            history_kwargs['end'] = (date.fromisoformat(str(end_date)) + timedelta(days=1)).isoformat()
+
+        price_history = get_history(ticker_code, **history_kwargs)
         price_history = price_history.reset_index() # set the date as a column
 
         price_history.columns = [to_snake_case(col) for col in price_history.columns]
@@ -127,8 +295,8 @@ def get_exchange_rate_history(convert_from, convert_to, start_date):
         price_history = price_history[['convert_from', 'convert_to', 'date', 'exchange_rate_multiplier']]
 
         price_history['is_continuous_history'] = True
-        price_history['exchange_rate_multiplier'] = price_history['exchange_rate_multiplier'].apply(
-            lambda val: convert_to_decimal(val, 16, 6)
+        price_history['exchange_rate_multiplier'] = convert_series_to_decimal(
+            price_history['exchange_rate_multiplier'], 16, 6
         )
         
         return price_history
@@ -142,7 +310,6 @@ def get_exchange_rate_history(convert_from, convert_to, start_date):
 
 def get_exchange_rate(convert_from, convert_to, exchange_date=None):
     ticker_code = f'{convert_from}{convert_to}=X'
-    yfinance_obj = yf.Ticker(ticker_code)
 
     today = datetime.now(UTC).date()
     if not exchange_date:
@@ -166,7 +333,7 @@ def get_exchange_rate(convert_from, convert_to, exchange_date=None):
     start_date_str = exchange_date.isoformat()
     end_date_str = (exchange_date + timedelta(days=3)).isoformat()
     try:
-        exchange_rate_history = yfinance_obj.history(start=start_date_str, end=end_date_str)
+        exchange_rate_history = get_history(ticker_code, start=start_date_str, end=end_date_str)
         close_values = exchange_rate_history['Close'].values
         if len(close_values) == 0:
             logger.warning('No exchange rate data returned for %s between %s and %s', ticker_code, start_date_str, end_date_str)
@@ -176,3 +343,26 @@ def get_exchange_rate(convert_from, convert_to, exchange_date=None):
         logger.error(f"Error fetching exchange rate for {ticker_code}: {e}", exc_info=True)
         logger.error('Try to update yfinance package to latest version if the issue persists.')
         return None
+
+
+def get_current_exchange_rate(convert_from, convert_to):
+    """Latest quoted rate for a pair, with the market time of the quote.
+
+    Returns (multiplier, quote_time) with quote_time in UTC, or None if no quote is available.
+    The quote time is what lets a stored rate report its real age: when it was written says
+    nothing about how old the rate itself is.
+    """
+    ticker_code = f'{convert_from}{convert_to}=X'
+    try:
+        history = get_history(ticker_code, period='5d', interval='1h')
+        closes = history['Close'].dropna()
+        if closes.empty:
+            logger.warning('No current exchange rate returned for %s', ticker_code)
+            return None
+
+        quote_time = pd.Timestamp(closes.index[-1])
+        quote_time = quote_time.tz_localize(UTC) if quote_time.tzinfo is None else quote_time.tz_convert(UTC)
+        return convert_to_decimal(closes.iloc[-1], 16, 6), quote_time.to_pydatetime()
+    except Exception as e:
+        logger.error(f"Error fetching current exchange rate for {ticker_code}: {e}", exc_info=True)
+        return None
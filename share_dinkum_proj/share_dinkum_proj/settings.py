@@ -12,8 +12,9 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 
-from decouple import config
+from decouple import config, Csv
 import whitenoise
 # Ensure the SECRET_KEY is set in the .env file
 from share_dinkum_proj.ensure_secret_key import ensure_secret_key
@@ -51,6 +52,82 @@ LOCAL_AUTO_LOGIN = config('LOCAL_AUTO_LOGIN', default=True, cast=bool)
 
 ALLOWED_HOSTS = ['localhost', '127.0.0.1']
 
+# The test suite mocks all market data, so nothing should start fetching on its own behind it.
+TESTING = 'test' in sys.argv
+
+# Stale current exchange rates are served as they are and refreshed on a background thread, so
+# pages never wait on Yahoo. Run `python manage.py refresh_exchange_rates` to keep them warm on a
+# schedule instead of on demand.
+FX_BACKGROUND_REFRESH = config('FX_BACKGROUND_REFRESH', default=not TESTING, cast=bool)
+
+# A missing pair is derived from stored pairs through these currencies, in order, before it is
+# fetched. Comma separated, e.g. FX_PIVOT_CURRENCIES=USD,EUR
+FX_PIVOT_CURRENCIES = config('FX_PIVOT_CURRENCIES', default='USD', cast=Csv())
+
+# Exchange rate histories are held in memory for at most FX_SERIES_CACHE_TTL seconds. Writes in
+# this process clear them at once; this bounds how long a write by another process goes unseen.
+FX_SERIES_CACHE_TTL = config('FX_SERIES_CACHE_TTL', default=60, cast=int)
+
+# Price refreshes download tickers in batches of PRICE_REFRESH_BATCH_SIZE, on up to
+# PRICE_REFRESH_WORKERS threads, starting no more than PRICE_REFRESH_RATE requests per second.
+PRICE_REFRESH_WORKERS = config('PRICE_REFRESH_WORKERS', default=4, cast=int)
+PRICE_REFRESH_RATE = config('PRICE_REFRESH_RATE', default=2.0, cast=float)
+PRICE_REFRESH_BATCH_SIZE = config('PRICE_REFRESH_BATCH_SIZE', default=20, cast=int)
+
+# Fetched price and exchange rate history is inserted PRICE_HISTORY_INSERT_BATCH_SIZE rows per statement.
+PRICE_HISTORY_INSERT_BATCH_SIZE = config('PRICE_HISTORY_INSERT_BATCH_SIZE', default=500, cast=int)
+
+# Backfilling fetches gaps in stored price history separated by up to PRICE_BACKFILL_MERGE_DAYS
+# stored trading days in one request, refetching the days between.
+PRICE_BACKFILL_MERGE_DAYS = config('PRICE_BACKFILL_MERGE_DAYS', default=10, cast=int)
+
+# Where prices and exchange rates come from: 'yfinance', or 'file' to read CSV files named
+# by ticker (BHP.AX.csv, USDAUD=X.csv) from MARKET_DATA_DIR, which runs entirely offline.
+MARKET_DATA_PROVIDER = config('MARKET_DATA_PROVIDER', default='yfinance')
+MARKET_DATA_DIR = config('MARKET_DATA_DIR', default='')
+
+# Market data responses are cached on disk. Ranges ending before today are kept until evicted;
+# ranges reaching today expire after MARKET_DATA_CACHE_TTL seconds. Least recently used entries
+# are evicted beyond MARKET_DATA_CACHE_MAX_BYTES.
+MARKET_DATA_CACHE = config('MARKET_DATA_CACHE', default=not TESTING, cast=bool)
+MARKET_DATA_CACHE_DIR = config('MARKET_DATA_CACHE_DIR', default=os.path.join(BASE_DIR, 'market_data_cache'))
+MARKET_DATA_CACHE_TTL = config('MARKET_DATA_CACHE_TTL', default=900, cast=int)
+MARKET_DATA_CACHE_MAX_BYTES = config('MARKET_DATA_CACHE_MAX_BYTES', default=200 * 1024 * 1024, cast=int)
+
+# Transient market data failures are retried MARKET_DATA_RETRIES times, waiting
+# MARKET_DATA_RETRY_DELAY seconds and doubling. After MARKET_DATA_BREAKER_THRESHOLD failed calls
+# in a row an endpoint is not called again for MARKET_DATA_BREAKER_COOLDOWN seconds.
+MARKET_DATA_RETRIES = config('MARKET_DATA_RETRIES', default=2, cast=int)
+MARKET_DATA_RETRY_DELAY = config('MARKET_DATA_RETRY_DELAY', default=1.0, cast=float)
+MARKET_DATA_BREAKER_THRESHOLD = config('MARKET_DATA_BREAKER_THRESHOLD', default=5, cast=int)
+MARKET_DATA_BREAKER_COOLDOWN = config('MARKET_DATA_BREAKER_COOLDOWN', default=60, cast=int)
+
+# A columnar copy of each security's price history is kept in PRICE_STORE_DIR for fast analytics
+# reads. Rebuild it with `python manage.py rebuild_price_store`; it is also rebuilt on demand.
+PRICE_STORE = config('PRICE_STORE', default=not TESTING, cast=bool)
+PRICE_STORE_DIR = config('PRICE_STORE_DIR', default=os.path.join(BASE_DIR, 'price_store'))
+
+# Computed dashboard payloads are cached per account data version, in the default cache, for up to
+# DASHBOARD_CACHE_TTL seconds. A change to the account's data makes them stale at once.
+DASHBOARD_CACHE_TTL = config('DASHBOARD_CACHE_TTL', default=24 * 60 * 60, cast=int)
+
+# Dashboard charts over time are sampled daily, weekly or monthly: the finest with no more than
+# DASHBOARD_CHART_MAX_POINTS points, unless a resolution is asked for.
+DASHBOARD_CHART_MAX_POINTS = config('DASHBOARD_CHART_MAX_POINTS', default=1000, cast=int)
+
+# Long operations (account refreshes, data exports) are queued as jobs in the database and run by
+# `python manage.py run_jobs`. A failed job is tried JOB_MAX_ATTEMPTS times in all, waiting
+# JOB_RETRY_DELAY seconds and doubling. A job running longer than JOB_TIMEOUT seconds is taken to
+# have lost its worker and is queued again. With JOBS_EAGER, jobs run as soon as they are queued.
+# Without a `run_jobs` worker, JOBS_IN_PROCESS runs them on a background thread of the process that
+# queued them; set it False when a worker is running.
+JOBS_EAGER = config('JOBS_EAGER', default=TESTING, cast=bool)
+JOBS_IN_PROCESS = config('JOBS_IN_PROCESS', default=not TESTING, cast=bool)
+JOB_MAX_ATTEMPTS = config('JOB_MAX_ATTEMPTS', default=3, cast=int)
+JOB_RETRY_DELAY = config('JOB_RETRY_DELAY', default=60, cast=int)
+JOB_TIMEOUT = config('JOB_TIMEOUT', default=3600, cast=int)
+JOB_POLL_INTERVAL = config('JOB_POLL_INTERVAL', default=5.0, cast=float)
+
 
 
 